@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Event loop lag while a competition dispatches CPU bound forecasts
+
+Every session plans the same synthetic week, inline on the loop or through a
+thread or process executor, while a ticker measures how late the loop wakes it.
+
+    python benchmarks/forecast.py [sessions]
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vbet.game.forecast import TicketSpec, WeekSnapshot, run_plan  # noqa: E402
+from vbet.game.table import LeagueTable  # noqa: E402
+
+TEAMS = [f'T{i:02d}' for i in range(20)]
+MAX_WEEK = 38
+WEEK = 30
+TICK = 0.001
+
+
+def make_snapshot() -> WeekSnapshot:
+    rng = random.Random(1)
+    table = LeagueTable(MAX_WEEK)
+    table.setup_league(1)
+    week_games = {}
+    for week in range(1, WEEK + 1):
+        teams = TEAMS[:]
+        rng.shuffle(teams)
+        games = {week * 100 + i: {'A': teams[2 * i], 'B': teams[2 * i + 1], 'odds': [1.5] * 187} for i in range(10)}
+        if week == WEEK:
+            week_games = games
+            break
+        results = {event_id: {'A': game['A'], 'B': game['B'], 'score': [rng.randint(0, 3), rng.randint(0, 3)]}
+                   for event_id, game in games.items()}
+        table.feed_result(week, 1, week, results, {}, {})
+    teams, points = table.points_matrix()
+    return WeekSnapshot(1, 1, WEEK, MAX_WEEK, [team_data['team'] for team_data in table.table], teams, points,
+                        week_games, {})
+
+
+def heavy_plan(snapshot: WeekSnapshot, params: dict):
+    # Table pattern search of a typical player, every team over every window
+    best = None
+    for _ in range(params['rounds']):
+        for team in snapshot.standings:
+            for n in range(1, snapshot.week):
+                points, played = snapshot.form(team, n)
+                if played and (best is None or points / played > best[0]):
+                    best = (points / played, team)
+    event_id = snapshot.team_event(best[1])
+    return [TicketSpec([(event_id, snapshot.week, 0)])]
+
+
+async def ticker(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def dispatch(executor, snapshot: WeekSnapshot, sessions: int):
+    lags = []
+    stop = asyncio.Event()
+    tick_task = asyncio.create_task(ticker(stop, lags))
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    await asyncio.gather(*[run_plan(executor, heavy_plan, snapshot, {'rounds': 3}) for _ in range(sessions)])
+    total = time.perf_counter() - start
+    stop.set()
+    await tick_task
+    return total, max(lags) if lags else 0
+
+
+def main(sessions: int = 10):
+    snapshot = make_snapshot()
+    loop = asyncio.new_event_loop()
+    with ThreadPoolExecutor(max_workers=2) as threads, ProcessPoolExecutor(max_workers=2) as processes:
+        # Warm the process pool up before measuring
+        loop.run_until_complete(run_plan(processes, heavy_plan, snapshot, {'rounds': 1}))
+        for name, executor in (('loop', None), ('thread', threads), ('process', processes)):
+            total, lag = loop.run_until_complete(dispatch(executor, snapshot, sessions))
+            print(f'{name:<8} dispatch {total * 1e3:8.1f} ms  max loop lag {lag * 1e3:8.1f} ms')
+    loop.close()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Market lookup cost per ticket: linear Markets scan vs MarketRegistry
+
+    python benchmarks/markets.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vbet.game.markets import Markets, market_registry  # noqa: E402
+
+# Odd ids a typical single ticket touches: pick, sibling odds and a total
+TICKET_ODD_IDS = ['0', '1', '2', '14', '73']
+ODDS = [1.5] * 187
+
+
+def linear_market_info(market: str):
+    for market_type, market_data in Markets.items():
+        if market in market_data:
+            data = market_data.get(market)
+            if data:
+                return market_type, data.get('name'), int(data.get('key'))
+    return None, None, None
+
+
+def linear_ticket():
+    for odd_id in TICKET_ODD_IDS:
+        market_id, odd_name, odd_index = linear_market_info(odd_id)
+        float(ODDS[odd_index])
+
+
+def registry_ticket():
+    for odd_id in TICKET_ODD_IDS:
+        info = market_registry.get(odd_id)
+        float(ODDS[info.odd_index])
+
+
+def main(number: int = 100000):
+    for name, func in (('linear', linear_ticket), ('registry', registry_ticket)):
+        total = min(timeit.repeat(func, number=number, repeat=5))
+        print(f'{name:<10} {total / number * 1e6:8.3f} us/ticket')
+
+
+if __name__ == '__main__':
+    main()
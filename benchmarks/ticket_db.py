@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Ticket write latency: per row ORM saves, bulk ORM batches and asyncpg batches
+
+Needs the configured Postgres database, asyncpg and at least one Providers row.
+Rows are written under a temporary live session that is deleted afterwards.
+
+    python benchmarks/ticket_db.py [batch size] [batches]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vbet.core import vclient  # noqa: E402,F401  Django setup
+from vbet.core import orm  # noqa: E402
+from vbet.core.async_orm import AsyncDb  # noqa: E402
+from vbet.game.tickets import Ticket  # noqa: E402
+from vweb.vclient.models import LiveSession, Providers, Tickets  # noqa: E402
+
+
+def setup_session():
+    db_provider = Providers.objects.select_related('user').first()
+    if db_provider is None:
+        sys.exit('No Providers row to write tickets for')
+    session = LiveSession(user=db_provider.user, provider=db_provider, status='paused', competitions={},
+                          data={'account': {}})
+    session.save()
+    return db_provider, session
+
+
+def teardown_session(session):
+    Tickets.objects.filter(live_session=session).delete()
+    session.delete()
+
+
+def make_ticket(session) -> Ticket:
+    ticket = Ticket(0, 'bench')
+    ticket.db_live_session = session
+    ticket.content = {'ticket': {'events': [{'eventId': 1, 'odds': [{'oddId': 0, 'oddValue': 1.5}]}]}}
+    return ticket
+
+
+def touch(rows):
+    for row in rows:
+        row.ticket_status = 'LOST'
+        row.won_data = {'won': 0, 'stake': 10}
+
+
+async def per_row(db_provider, session, size: int):
+    # Former path, one thread hop and one statement per write
+    tickets = [make_ticket(session) for _ in range(size)]
+    provider = SimpleNamespace(TicketsDb=Tickets)
+    start = time.perf_counter()
+    for ticket in tickets:
+        await orm.save_ticket(provider, db_provider.user, db_provider, ticket)
+    inserted = time.perf_counter()
+    rows = [ticket.db_ticket for ticket in tickets]
+    touch(rows)
+    for row in rows:
+        await orm.update_ticket(row)
+    return inserted - start, time.perf_counter() - inserted
+
+
+async def bulk(db_provider, session, size: int, db: AsyncDb = None):
+    rows = []
+    keys = await (db.reserve_ticket_keys(Tickets, size) if db else orm.reserve_ticket_keys(Tickets, size))
+    for key in keys:
+        rows.append(orm.new_ticket(Tickets, db_provider.user, db_provider, make_ticket(session), key))
+    save = db.bulk_save_tickets if db else orm.bulk_save_tickets
+    start = time.perf_counter()
+    await save(Tickets, rows, [])
+    inserted = time.perf_counter()
+    touch(rows)
+    await save(Tickets, [], rows)
+    return inserted - start, time.perf_counter() - inserted
+
+
+async def main(size: int = 50, batches: int = 20):
+    db_provider, session = await sync_to_async(setup_session, thread_sensitive=False)()
+    db = AsyncDb()
+    await db.connect()
+    try:
+        for name, run in (('orm row', lambda: per_row(db_provider, session, size)),
+                          ('orm bulk', lambda: bulk(db_provider, session, size)),
+                          ('asyncpg', lambda: bulk(db_provider, session, size, db))):
+            inserts, updates = [], []
+            for _ in range(batches):
+                insert, update = await run()
+                inserts.append(insert)
+                updates.append(update)
+            print(f'{name:<9} insert {statistics.median(inserts) * 1e3:8.2f} ms/batch  '
+                  f'update {statistics.median(updates) * 1e3:8.2f} ms/batch')
+    finally:
+        await db.close()
+        await sync_to_async(teardown_session, thread_sensitive=False)(session)
+
+
+if __name__ == '__main__':
+    asyncio.run(main(*[int(arg) for arg in sys.argv[1:]]))
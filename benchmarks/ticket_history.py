@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Ticket history latency on a large Tickets table, without and with the model indexes
+
+`load` writes synthetic tickets server side, with one INSERT .. SELECT over
+generate_series, for the first Providers row. They belong to a fixture live
+session. `measure` times history pages, the open tickets query and the
+ticket id lookup with the Tickets indexes dropped, then with them recreated.
+Run it against a benchmark database, the fixture shares the provider's user.
+
+    python benchmarks/ticket_history.py load [count]
+    python benchmarks/ticket_history.py measure [repeat]
+    python benchmarks/ticket_history.py clean
+"""
+import json
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+from asgiref.sync import async_to_sync
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vbet.core import vclient  # noqa: E402,F401  Django setup
+from vbet.core import orm  # noqa: E402
+from django.db import connection  # noqa: E402
+from vweb.vclient.models import LiveSession, Providers, Tickets  # noqa: E402
+
+FIXTURE = 'ticket_history'
+DETAILS = {'ticket': {'events': [{'eventId': 1, 'odds': [{'oddId': 0, 'oddValue': 1.5}]}]}}
+
+
+def fixture_session():
+    return LiveSession.objects.filter(data__fixture=FIXTURE).select_related('user', 'provider').first()
+
+
+def load(count: int = 2000000):
+    db_provider = Providers.objects.select_related('user').first()
+    if db_provider is None:
+        sys.exit('No Providers row to write tickets for')
+    session = fixture_session()
+    if session is None:
+        session = LiveSession(user=db_provider.user, provider=db_provider, status='paused', competitions={},
+                              data={'fixture': FIXTURE})
+        session.save()
+    values = {
+        'user': '%(user)s',
+        'provider': '%(provider)s',
+        'live_session': '%(session)s',
+        'time_created': "now() - (i || ' seconds')::interval",
+        'demo': 'true',
+        'resolved': 'random() < 0.98',
+        'ticket_id': 'i',
+        'time_paid': "''",
+        'time_send': "''",
+        'time_register': "''",
+        'time_resolved': "''",
+        'ticket_status': "'LOST'",
+        'status': "'4'",
+        'details': '%(details)s::jsonb',
+        'won_data': '%(won)s::jsonb',
+        'payment_data': "'{}'::jsonb",
+        'server_hash': "''",
+        'ip': "''",
+    }
+    columns = ', '.join(f'"{Tickets._meta.get_field(name).column}"' for name in values)
+    sql = (f'INSERT INTO "{Tickets._meta.db_table}" ({columns}) SELECT {", ".join(values.values())} '
+           f'FROM generate_series(1, %(count)s) AS i')
+    start = time.perf_counter()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {'user': session.user_id, 'provider': session.provider_id, 'session': session.pk,
+                             'details': json.dumps(DETAILS), 'won': json.dumps({'won': 0, 'stake': 10}),
+                             'count': count})
+        cursor.execute(f'ANALYZE "{Tickets._meta.db_table}"')
+    print(f'loaded {count} tickets in {time.perf_counter() - start:.1f}s')
+
+
+def set_indexes(enabled: bool):
+    with connection.schema_editor() as editor:
+        for index in Tickets._meta.indexes:
+            editor.execute(f'DROP INDEX IF EXISTS "{index.name}"')
+            if enabled:
+                editor.add_index(Tickets, index)
+    with connection.cursor() as cursor:
+        cursor.execute(f'ANALYZE "{Tickets._meta.db_table}"')
+
+
+def timed(func, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1e3
+
+
+def measure(repeat: int = 20):
+    session = fixture_session()
+    if session is None:
+        sys.exit('No fixture, run load first')
+    provider = SimpleNamespace(TicketsDb=Tickets)
+    user, db_provider = session.user, session.provider
+    keys = Tickets.objects.filter(live_session=session).order_by('ticket_key').values_list('ticket_key', flat=True)
+    deep_key = keys[keys.count() // 2]
+    load_tickets = async_to_sync(orm.load_tickets)
+    queries = (
+        ('first page', lambda: load_tickets(provider, db_provider, user, 0, 20)),
+        ('deep page', lambda: load_tickets(provider, db_provider, user, deep_key, 20)),
+        ('open tickets', lambda: list(Tickets.objects.filter(user=user, provider=db_provider, resolved=False)
+                                      .values_list('ticket_key', flat=True))),
+        ('ticket id', lambda: Tickets.objects.filter(ticket_id=deep_key % 1000).first()),
+    )
+    results = {}
+    for enabled in (False, True):
+        set_indexes(enabled)
+        for name, query in queries:
+            results.setdefault(name, []).append(timed(query, repeat))
+    for name, (before, after) in results.items():
+        print(f'{name:<13} {before:9.2f} ms  ->  {after:9.2f} ms')
+
+
+def clean():
+    session = fixture_session()
+    if session:
+        deleted, _ = Tickets.objects.filter(live_session=session).delete()
+        session.delete()
+        print(f'deleted {deleted} rows')
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'measure'
+    args = [int(arg) for arg in sys.argv[2:]]
+    {'load': load, 'measure': measure, 'clean': clean}[command](*args)
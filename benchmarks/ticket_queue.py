@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Ready ticket selection: full active_tickets scan vs TicketQueue
+
+Tickets of several competitions arrive in bursts while the sender drains one
+ticket per step. Reports selections per second and the wait, in sends, of
+every ticket between arrival and send.
+
+    python benchmarks/ticket_queue.py [competitions] [tickets per competition]
+"""
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vbet.game.tickets import Ticket, TicketQueue, TicketStatus  # noqa: E402
+
+
+def make_tickets(competitions: int, per_competition: int) -> List[Ticket]:
+    tickets = []
+    for key in range(per_competition):
+        for game_id in range(competitions):
+            ticket = Ticket(game_id, 'bench')
+            ticket.ticket_key = key
+            tickets.append(ticket)
+    return tickets
+
+
+def scan_select(active_tickets: Dict[int, Dict[int, Ticket]]):
+    # Former ticket_listener selection, the last READY ticket found
+    ticket = None
+    for game_id, competition_tickets in active_tickets.items():
+        for ticket_key, t in competition_tickets.items():
+            if t.status == TicketStatus.READY:
+                ticket = t
+    return ticket
+
+
+def run(tickets: List[Ticket], use_queue: bool, burst: int = 4):
+    for ticket in tickets:
+        ticket.status = TicketStatus.READY
+    active_tickets: Dict[int, Dict[int, Ticket]] = {}
+    queue = TicketQueue()
+    arrived: Dict[int, int] = {}
+    waits = []
+    sends = 0
+    pending = list(tickets)
+    start = time.perf_counter()
+    while pending or (len(queue) if use_queue else scan_select(active_tickets)):
+        for ticket in pending[:burst]:
+            active_tickets.setdefault(ticket.game_id, {})[ticket.ticket_key] = ticket
+            arrived[id(ticket)] = sends
+            if use_queue:
+                queue.push(ticket)
+        del pending[:burst]
+        ticket = queue.pop() if use_queue else scan_select(active_tickets)
+        if ticket is None:
+            continue
+        ticket.status = TicketStatus.SUCCESS
+        waits.append(sends - arrived[id(ticket)])
+        sends += 1
+    elapsed = time.perf_counter() - start
+    return sends / elapsed, statistics.mean(waits), max(waits)
+
+
+def main(competitions: int = 8, per_competition: int = 250):
+    for name, use_queue in (('scan', False), ('queue', True)):
+        rate, mean_wait, max_wait = run(make_tickets(competitions, per_competition), use_queue)
+        print(f'{name:<6} {rate:12.0f} sends/s  wait mean {mean_wait:8.1f}  max {max_wait:6d} sends')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
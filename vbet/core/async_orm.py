@@ -0,0 +1,149 @@
+"""
+Async Postgres access to the hot tables, enabled by settings.ASYNC_DB.
+
+Queries run on an asyncpg pool owned by the provider process instead of the
+sync_to_async thread hops of `orm`: ticket keys and ticket batches, live
+session status and provider logins. Table and column names, value conversion
+and auto fields all come from the Django models, which stay the schema.
+Requires the asyncpg package.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Dict, List, Optional, Sequence, Type, TYPE_CHECKING
+
+from vbet.core import settings
+from vbet.utils.log import get_logger
+from .orm import TICKET_UPDATE_FIELDS
+
+if TYPE_CHECKING:
+    import asyncpg
+    from django.db.models import Field, Model
+
+logger = get_logger('async-orm')
+
+
+class ModelTable:
+    """Insert and update statements of a Django model"""
+
+    def __init__(self, model: Type[Model]):
+        self.model = model
+        meta = model._meta
+        self.table = meta.db_table
+        self.pk = meta.pk
+        self.fields: List[Field] = [field for field in meta.concrete_fields]
+        self.by_name: Dict[str, Field] = {field.name: field for field in self.fields}
+        self.insert_sql = 'INSERT INTO "{}" ({}) VALUES ({})'.format(
+            self.table, ', '.join(f'"{field.column}"' for field in self.fields),
+            ', '.join(f'${i}' for i in range(1, len(self.fields) + 1)))
+        # Rows without a reserved key, the auto field comes back from the database
+        self.create_fields: List[Field] = [field for field in self.fields if field is not meta.auto_field]
+        self.create_sql = 'INSERT INTO "{}" ({}) VALUES ({}) RETURNING "{}"'.format(
+            self.table, ', '.join(f'"{field.column}"' for field in self.create_fields),
+            ', '.join(f'${i}' for i in range(1, len(self.create_fields) + 1)), self.pk.column)
+        self.update_sql: Dict[tuple, str] = {}
+
+    def insert_values(self, instance: Model) -> List:
+        return [field.get_prep_value(field.pre_save(instance, add=True)) for field in self.fields]
+
+    def create_values(self, instance: Model) -> List:
+        return [field.get_prep_value(field.pre_save(instance, add=True)) for field in self.create_fields]
+
+    def update_statement(self, field_names: Sequence[str]) -> str:
+        key = tuple(field_names)
+        sql = self.update_sql.get(key)
+        if sql is None:
+            columns = [self.by_name[name].column for name in field_names]
+            sql = 'UPDATE "{}" SET {} WHERE "{}" = ${}'.format(
+                self.table, ', '.join(f'"{column}" = ${i}' for i, column in enumerate(columns, 1)),
+                self.pk.column, len(columns) + 1)
+            self.update_sql[key] = sql
+        return sql
+
+    def update_values(self, instance: Model, field_names: Sequence[str]) -> List:
+        values = [self.by_name[name].get_prep_value(getattr(instance, self.by_name[name].attname))
+                  for name in field_names]
+        values.append(instance.pk)
+        return values
+
+
+class AsyncDb:
+    pool: Optional[asyncpg.Pool]
+    tables: Dict[Type[Model], ModelTable]
+
+    def __init__(self, min_size: int = None, max_size: int = None):
+        self.min_size = min_size or settings.ASYNC_DB_POOL_MIN
+        self.max_size = max_size or settings.ASYNC_DB_POOL_MAX
+        self.pool = None
+        self.tables = {}
+
+    def __repr__(self):
+        return '[AsyncDb:%d-%d]' % (self.min_size, self.max_size)
+
+    async def connect(self):
+        import asyncpg
+        from django.conf import settings as django_settings
+        db = django_settings.DATABASES['default']
+        self.pool = await asyncpg.create_pool(
+            database=db.get('NAME'), user=db.get('USER'), password=db.get('PASSWORD'),
+            host=db.get('HOST') or None, port=int(db['PORT']) if db.get('PORT') else None,
+            min_size=self.min_size, max_size=self.max_size)
+        logger.info('%r Connection pool ready', self)
+
+    async def close(self):
+        if self.pool:
+            await self.pool.close()
+            self.pool = None
+
+    def table(self, model: Type[Model]) -> ModelTable:
+        table = self.tables.get(model)
+        if table is None:
+            table = self.tables[model] = ModelTable(model)
+        return table
+
+    async def create(self, instance: Model):
+        table = self.table(type(instance))
+        instance.pk = await self.pool.fetchval(table.create_sql, *table.create_values(instance))
+
+    async def save(self, instance: Model, field_names: Sequence[str]):
+        """Update some columns of a row"""
+        table = self.table(type(instance))
+        await self.pool.execute(table.update_statement(field_names), *table.update_values(instance, field_names))
+
+    async def on_start_live_session(self, db_live_session):
+        """Same contract as orm.on_start_live_session"""
+        db_live_session.status = 'running'
+        await self.save(db_live_session, ['status'])
+
+    async def save_user(self, user_id: int, username: str, provider: str, user_data: Dict):
+        """Same contract as orm.save_user, the user row itself is left as it is"""
+        from vweb.vclient.models import Providers
+        await self.create(Providers(username=username, provider=provider, token=user_data, user_id=user_id))
+
+    @staticmethod
+    def is_transient(exc: Exception) -> bool:
+        """Same contract as orm.is_transient"""
+        import asyncpg
+        return isinstance(exc, (asyncpg.exceptions.PostgresConnectionError,
+                                asyncpg.exceptions.ConnectionDoesNotExistError,
+                                asyncpg.exceptions.TooManyConnectionsError,
+                                asyncpg.exceptions.DeadlockDetectedError,
+                                asyncpg.exceptions.SerializationError,
+                                asyncio.TimeoutError, OSError))
+
+    async def reserve_ticket_keys(self, model: Type[Model], count: int) -> List[int]:
+        table = self.table(model)
+        rows = await self.pool.fetch('SELECT nextval(pg_get_serial_sequence($1, $2)) FROM generate_series(1, $3)',
+                                     table.table, table.pk.column, count)
+        return [row[0] for row in rows]
+
+    async def bulk_save_tickets(self, model: Type[Model], inserts: List[Model], updates: List[Model]):
+        """Same contract as orm.bulk_save_tickets, inserts need their reserved ticket_key"""
+        table = self.table(model)
+        async with self.pool.acquire() as con:
+            async with con.transaction():
+                if inserts:
+                    await con.executemany(table.insert_sql, [table.insert_values(row) for row in inserts])
+                if updates:
+                    await con.executemany(table.update_statement(TICKET_UPDATE_FIELDS),
+                                          [table.update_values(row, TICKET_UPDATE_FIELDS) for row in updates])
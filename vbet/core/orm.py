@@ -1,5 +1,6 @@
 from asgiref.sync import sync_to_async
-from typing import Dict, TYPE_CHECKING
+from operator import attrgetter
+from typing import Dict, List, TYPE_CHECKING
 
 
 if TYPE_CHECKING:
@@ -7,10 +8,15 @@ if TYPE_CHECKING:
     from vbet.core.socket_manager import Socket
     from vweb.vclient.models import User as UserAdmin, Providers, LiveSession as DbLiveSession
 
+from vbet.game.ticket_codec import expand_details
 from vbet.utils.log import get_logger
 
 logger = get_logger('orm')
 
+# Ticket columns of the ticket payloads
+TICKET_BODY_FIELDS = ['ticket_key', 'live_session_id', 'status', 'ticket_id', 'ticket_status', 'won_data',
+                      'time_created', 'details']
+
 
 def load_provider_data(name: str):
     from vweb.vclient.models import ProviderInstalled
@@ -38,25 +44,50 @@ def create_live_session(db_user, db_provider, player_name: str, competition_data
     return session
 
 
-def load_tickets(provider, db_p, user, ticket_key: int, n: int):
-    if ticket_key == 0:
-        last_ten = provider.TicketsDb.objects.filter(user=user).order_by('-ticket_key')[:n]
-    else:
-        last_ten = provider.TicketsDb.objects.filter(user=user,
-                                                     ticket_key__lt=ticket_key).order_by('-ticket_key')[:n]
+def ticket_body(db_ticket, data: Dict, details: Dict = None, participants: Dict[int, List[Dict]] = None) -> Dict:
+    """
+    Payload of a ticket for the web sessions, `data` is its live session data.
+    Stored details are expanded unless the full `details` are at hand.
+    """
+    return {
+        'data': {
+            'player': data,
+            'status': db_ticket.status,
+            'ticket_id': db_ticket.ticket_id,
+            'ticket_key': db_ticket.ticket_key,
+            'ticket_status': db_ticket.ticket_status,
+            'won_data': db_ticket.won_data,
+            'time_created': db_ticket.time_created.isoformat()
+        },
+        'ticket': details if details is not None else expand_details(db_ticket.details, participants)}
+
+
+def get_session_data(session_ids, session_data: Dict[int, Dict]) -> Dict[int, Dict]:
+    """Data of the sessions, `session_data` holds the user's live sessions and the rest is read in one query"""
+    from vweb.vclient.models import LiveSession
+    sessions = {pk: session_data[pk] for pk in session_ids if pk in session_data}
+    missing = [pk for pk in session_ids if pk not in sessions]
+    if missing:
+        sessions.update(LiveSession.objects.filter(pk__in=missing).values_list('pk', 'data'))
+    return sessions
+
+
+def load_tickets(provider, db_p, user, ticket_key: int, n: int, participants: Dict[int, List[Dict]] = None,
+                 session_data: Dict[int, Dict] = None):
+    from vweb.vclient.models import ArchivedTickets
+    last_ten = []
+    # Pages run across open and archived tickets, both served by their (user, -ticket_key) index
+    for model in (provider.TicketsDb, ArchivedTickets):
+        tickets = model.objects.filter(user=user).only(*TICKET_BODY_FIELDS)
+        if ticket_key != 0:
+            tickets = tickets.filter(ticket_key__lt=ticket_key)
+        last_ten.extend(tickets.order_by('-ticket_key')[:n])
+    last_ten = sorted(last_ten, key=attrgetter('ticket_key'), reverse=True)[:n]
+    # One query for the sessions not held by the user instead of one per ticket
+    sessions = get_session_data({x.live_session_id for x in last_ten}, session_data or {})
     body = {}
     for x in last_ten:
-        body[x.ticket_key] = {
-            'data': {
-                'player': x.live_session.data,
-                'status': x.status,
-                'ticket_id': x.ticket_id,
-                'ticket_key': x.ticket_key,
-                'ticket_status': x.ticket_status,
-                'won_data': x.won_data,
-                'time_created': x.time_created.isoformat()
-            },
-            'ticket': x.details}
+        body[x.ticket_key] = ticket_body(x, sessions.get(x.live_session_id), participants=participants)
     return body
 
 
@@ -87,18 +118,78 @@ def update_ticket(db_ticket):
     db_ticket.save()
 
 
-def save_ticket(provider, db_user, db_provider, ticket) -> int:
-    tick = provider.TicketsDb(user=db_user, provider=db_provider, live_session=ticket.db_live_session)
+def new_ticket(model, db_user, db_provider, ticket, ticket_key: int = None):
+    from django.utils import timezone
+    tick = model(user=db_user, provider=db_provider, live_session=ticket.db_live_session)
+    if ticket_key is not None:
+        # Reserved key, the row is written later
+        tick.ticket_key = ticket_key
+        tick.time_created = timezone.now()
     tick.demo = ticket.demo
-    tick.details = ticket.content
+    tick.details = ticket.compact or ticket.content
     tick.status = ticket.status
     tick.ticket_status = ticket.ticket_status
     tick.won_data = {'won': ticket.total_won, 'stake': ticket.stake}
+    return tick
+
+
+def save_ticket(provider, db_user, db_provider, ticket) -> int:
+    tick = new_ticket(provider.TicketsDb, db_user, db_provider, ticket)
     tick.save()
     ticket.db_ticket = tick
     return tick.ticket_key
 
 
+# Ticket columns written after the insert
+TICKET_UPDATE_FIELDS = ['demo', 'resolved', 'ticket_id', 'time_paid', 'time_send', 'time_register', 'time_resolved',
+                        'ticket_status', 'status', 'details', 'won_data', 'payment_data', 'server_hash', 'ip']
+
+
+def reserve_ticket_keys(model, count: int) -> List[int]:
+    """Draw `count` keys from the ticket_key sequence, other processes never get them"""
+    from django.db import connection
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+                       [model._meta.db_table, model._meta.pk.column, count])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def archive_tickets(model, archive_model, before, batch_size: int = 10000) -> int:
+    """Move the tickets resolved and created before `before` to the archive table, batch by batch"""
+    from django.db import connection, transaction
+    table = model._meta.db_table
+    pk = model._meta.pk.column
+    columns = ', '.join(f'"{field.column}"' for field in archive_model._meta.concrete_fields)
+    sql = (f'WITH moved AS (DELETE FROM "{table}" WHERE "{pk}" IN (SELECT "{pk}" FROM "{table}" '
+           f'WHERE "resolved" AND "time_created" < %s ORDER BY "{pk}" LIMIT %s) RETURNING {columns}) '
+           f'INSERT INTO "{archive_model._meta.db_table}" ({columns}) SELECT {columns} FROM moved')
+    moved = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, [before, batch_size])
+            count = cursor.rowcount
+        moved += count
+        logger.info('Archived %d tickets (total=%d)', count, moved)
+        if count < batch_size:
+            return moved
+
+
+def is_transient(exc: Exception) -> bool:
+    """Write errors the same batch can get past on a later attempt, lost connections or deadlocks"""
+    from django.db import InterfaceError, OperationalError
+    return isinstance(exc, (InterfaceError, OperationalError, OSError))
+
+
+def bulk_save_tickets(model, inserts: List, updates: List):
+    """One transaction for a batch of ticket writes"""
+    from django.db import transaction
+    with transaction.atomic():
+        if inserts:
+            model.objects.bulk_create(inserts)
+        if updates:
+            model.objects.bulk_update(updates, TICKET_UPDATE_FIELDS)
+
+
 load_provider_data = sync_to_async(load_provider_data, thread_sensitive=False)
 
 get_provider_data = sync_to_async(get_provider_data, thread_sensitive=False)
@@ -114,3 +205,9 @@ save_user = sync_to_async(save_user, thread_sensitive=False)
 save_ticket = sync_to_async(save_ticket, thread_sensitive=False)
 
 update_ticket = sync_to_async(update_ticket, thread_sensitive=False)
+
+archive_tickets = sync_to_async(archive_tickets, thread_sensitive=False)
+
+reserve_ticket_keys = sync_to_async(reserve_ticket_keys, thread_sensitive=False)
+
+bulk_save_tickets = sync_to_async(bulk_save_tickets, thread_sensitive=False)
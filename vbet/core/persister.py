@@ -0,0 +1,171 @@
+"""
+Write-behind ticket persistence.
+
+Ticket inserts and updates of a provider process are buffered and written by a
+single bulk_create/bulk_update transaction, TICKET_FLUSH_INTERVAL seconds after
+the first pending write or as soon as TICKET_FLUSH_SIZE writes are pending.
+
+A batch failing on a transient error, a lost connection or a deadlock, is
+requeued and retried after a doubling delay. After TICKET_FLUSH_RETRIES
+attempts, on any other error or with more than TICKET_BUFFER_MAX writes
+pending, its rows are written one by one and the ones still failing are
+logged and dropped.
+
+Ticket keys come from blocks of TICKET_KEY_BLOCK values reserved on the
+ticket_key sequence, so a ticket has its key, and can be sent, before its row
+is written. With an AsyncDb both go through its asyncpg pool instead of orm.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from typing import Deque, Dict, List, Optional, TYPE_CHECKING
+
+from vbet.core import settings
+from vbet.utils.log import get_logger
+from .orm import bulk_save_tickets, is_transient, new_ticket, reserve_ticket_keys
+
+if TYPE_CHECKING:
+    from vbet.game.tickets import Ticket
+    from .async_orm import AsyncDb
+    from vweb.vclient.models import Tickets, User as UserAdmin, Providers
+
+logger = get_logger('persister')
+
+
+class TicketPersister:
+    inserts: List[Tickets]
+    updates: Dict[int, Tickets]
+    keys: Deque[int]
+    key_lock: asyncio.Lock
+    flush_handle: Optional[asyncio.TimerHandle]
+    flush_task: Optional[asyncio.Task]
+    failures: int
+
+    def __init__(self, model, flush_interval: float = None, flush_size: int = None, key_block: int = None,
+                 db: AsyncDb = None, flush_retries: int = None, buffer_max: int = None):
+        self.model = model
+        self.db = db
+        self.flush_interval = flush_interval if flush_interval is not None else settings.TICKET_FLUSH_INTERVAL
+        self.flush_size = flush_size if flush_size is not None else settings.TICKET_FLUSH_SIZE
+        self.key_block = key_block or settings.TICKET_KEY_BLOCK
+        self.flush_retries = flush_retries if flush_retries is not None else settings.TICKET_FLUSH_RETRIES
+        self.buffer_max = buffer_max or settings.TICKET_BUFFER_MAX
+        self.keys = deque()
+        self.key_lock = asyncio.Lock()
+        self.inserts = []
+        self.updates = {}
+        self.flush_handle = None
+        self.flush_task = None
+        # Failed attempts of the pending batch
+        self.failures = 0
+
+    def __repr__(self):
+        return '[TicketPersister:%d:%d]' % (len(self.inserts), len(self.updates))
+
+    @property
+    def pending(self) -> int:
+        return len(self.inserts) + len(self.updates)
+
+    async def next_key(self) -> int:
+        # Awaits the database once per block only
+        while not self.keys:
+            async with self.key_lock:
+                if not self.keys:
+                    if self.db:
+                        keys = await self.db.reserve_ticket_keys(self.model, self.key_block)
+                    else:
+                        keys = await reserve_ticket_keys(self.model, self.key_block)
+                    self.keys.extend(keys)
+        return self.keys.popleft()
+
+    async def insert(self, ticket: Ticket, db_user: UserAdmin, db_provider: Providers) -> int:
+        ticket_key = await self.next_key()
+        ticket.db_ticket = new_ticket(self.model, db_user, db_provider, ticket, ticket_key)
+        self.inserts.append(ticket.db_ticket)
+        self.schedule()
+        return ticket_key
+
+    def update(self, db_ticket: Tickets):
+        self.updates[db_ticket.pk] = db_ticket
+        self.schedule()
+
+    def schedule(self):
+        if self.pending >= self.flush_size and not self.failures:
+            self.flush_soon()
+        elif self.flush_handle is None:
+            delay = self.flush_interval * 2 ** self.failures
+            self.flush_handle = asyncio.get_event_loop().call_later(delay, self.flush_soon)
+
+    def flush_soon(self):
+        if self.flush_handle:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.flush())
+
+    async def save(self, inserts: List[Tickets], updates: List[Tickets]):
+        if self.db:
+            await self.db.bulk_save_tickets(self.model, inserts, updates)
+        else:
+            await bulk_save_tickets(self.model, inserts, updates)
+
+    def is_transient(self, exc: Exception) -> bool:
+        return self.db.is_transient(exc) if self.db else is_transient(exc)
+
+    async def flush(self):
+        inserts, self.inserts = self.inserts, []
+        updates, self.updates = self.updates, {}
+        try:
+            await self.save(inserts, list(updates.values()))
+            self.failures = 0
+        except Exception as exc:
+            self.failures += 1
+            if self.is_transient(exc) and self.failures < self.flush_retries and \
+                    self.pending + len(inserts) + len(updates) <= self.buffer_max:
+                # Retried with the next batch, the rows still hold their latest fields
+                logger.warning('%r Ticket flush failed (inserts=%d, updates=%d, attempt=%d): %r', self,
+                               len(inserts), len(updates), self.failures, exc)
+                self.inserts[:0] = inserts
+                for pk, db_ticket in updates.items():
+                    self.updates.setdefault(pk, db_ticket)
+            else:
+                logger.error('%r Ticket flush failed (inserts=%d, updates=%d, attempt=%d): %r, writing rows one by one',
+                             self, len(inserts), len(updates), self.failures, exc)
+                self.failures = 0
+                await self.save_rows(inserts, list(updates.values()))
+        finally:
+            self.flush_task = None
+            if self.pending:
+                self.schedule()
+
+    async def save_rows(self, inserts: List[Tickets], updates: List[Tickets]):
+        for db_ticket in inserts:
+            try:
+                await self.save([db_ticket], [])
+            except Exception as exc:
+                logger.error('%r Ticket insert dropped (ticket_key=%d): %r', self, db_ticket.pk, exc)
+        for db_ticket in updates:
+            try:
+                await self.save([], [db_ticket])
+            except Exception as exc:
+                logger.error('%r Ticket update dropped (ticket_key=%d): %r', self, db_ticket.pk, exc)
+
+    async def close(self):
+        if self.flush_handle:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if self.flush_task:
+            await self.flush_task
+        # Retries run inline, a batch ends written or dropped after flush_retries attempts
+        while self.pending:
+            if self.flush_handle:
+                self.flush_handle.cancel()
+                self.flush_handle = None
+            if self.failures:
+                await asyncio.sleep(self.flush_interval * 2 ** self.failures)
+            await self.flush()
+        if self.flush_handle:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        logger.info('%r Ticket persister closed', self)
@@ -4,7 +4,6 @@ import signal
 import aioredis
 import nest_asyncio
 import asyncio
-import time
 from typing import Any, Callable, Coroutine, Dict, Optional, \
     TYPE_CHECKING, Tuple, Type, Union
 
@@ -14,13 +13,16 @@ from channels_redis.core import RedisChannelLayer
 from channels.exceptions import ChannelFull
 
 from vbet.core import settings
-from vbet.game.tickets import TicketStatus
+from vbet.game import players
 from vbet.game.api import auth
+from vbet.game.league_cache import LeagueCache, SharedLeagueCache, decode_message
 from vbet.game.user import User
 from vbet.utils import exceptions
 from vbet.utils.log import get_logger
-from vbet.utils.parser import Resource, encode_json, get_auth_class
+from vbet.utils.parser import encode_json, get_auth_class
 from .orm import get_provider_data, save_user
+from .async_orm import AsyncDb
+from .persister import TicketPersister
 from .socket_manager import SocketManager
 from .aaa import TicketManager
 from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
@@ -51,6 +53,7 @@ class Provider(multiprocessing.Process):
     db_provider: ProviderInstalled
     auth_class: auth.BasicAuth
     users: Dict[str, User]
+    league_caches: Dict[int, LeagueCache]
     user_map: Dict[int, str]
     validating_users: Dict[str, Dict]
     login_users: Dict[str, Dict]
@@ -59,7 +62,8 @@ class Provider(multiprocessing.Process):
     channel_future: Optional[asyncio.Task]
     channel_con: Optional[aioredis.RedisConnection]
     channel: Optional[aioredis.Channel]
-    scanner_future: Optional[asyncio.Task]
+    league_future: Optional[asyncio.Task]
+    players_future: Optional[asyncio.Task]
     online_future: Optional[asyncio.Task]
     TicketsDb: Type[Tickets]
     UserDb: Type[UserAdmin]
@@ -67,8 +71,9 @@ class Provider(multiprocessing.Process):
     LiveSessionDb: Type[DbLiveSession]
     ProviderInstalledDb: Type[ProviderInstalled]
     sock_manager: SocketManager
+    ticket_persister: Optional[TicketPersister]
+    async_db: Optional[AsyncDb]
     ticket_manager: TicketManager
-    scan_interval: int = 3.5
     process_executor: ProcessPoolExecutor
     thread_executor: ThreadPoolExecutor
 
@@ -85,12 +90,16 @@ class Provider(multiprocessing.Process):
         # self.ticket_manager = TicketManager(self)
         self.status = Provider.OFFLINE  # Show server status.
         self.users = {}
+        self.league_caches = {}
         self.user_map = {}
         self.validating_users = {}
         self.channel_future = None
         self.channel_con = None
         self.channel = None
-        self.scanner_future = None
+        self.league_future = None
+        self.ticket_persister = None
+        self.async_db = None
+        self.players_future = None
         self.login_users = {}
 
     @property
@@ -145,14 +154,24 @@ class Provider(multiprocessing.Process):
         # Setup socketManager  instance
         await self.sock_manager.setup()
 
+        # Buffered ticket writes of every user of the process
+        if settings.ASYNC_DB:
+            self.async_db = AsyncDb()
+            await self.async_db.connect()
+        self.ticket_persister = TicketPersister(self.TicketsDb, db=self.async_db)
+
         # Redis and channel layer setup
         await self.setup_redis()
 
         # channel_future reads and processes payloads from `provider_live` channel in redis
         self.channel_future = asyncio.create_task(self.channel_reader())
 
-        # scanner_future scans every scan_interval to manage the provider
-        self.scanner_future = asyncio.create_task(self.scanner())
+        # league_future receives league blocks published by the other workers of the backend
+        if settings.LEAGUE_CACHE and settings.LEAGUE_CACHE_SHARED:
+            self.league_future = asyncio.create_task(self.league_reader())
+
+        # players_future applies player registry commands, sessions switch on their next league
+        self.players_future = asyncio.create_task(self.players_reader())
 
     async def setup_redis(self):
         # Initialize django channels channel layer
@@ -205,63 +224,43 @@ class Provider(multiprocessing.Process):
                 self.channel_con.close()
                 logger.info('%r Channel reader offline. (name=%s)', self, name)
 
-    async def scanner(self):
-        logger.debug('%r Scanner started', self)
-        while True:
-            for user in self.users.values():
-                user_rem = []
-                async with user.ticket_manager.pool_lock:
-                    for game_id, competition_tickets in user.ticket_manager.active_tickets.items():
-                        for ticket_key, ticket in competition_tickets.items():
-                            if ticket.status == TicketStatus.DISCARD:
-                                user_rem.append(ticket)
-                            elif ticket.status == TicketStatus.VOID:
-                                user_rem.append(ticket)
-                                ticket.on_void()
-                                await ticket.save()
-                                continue
-                            elif ticket.status == TicketStatus.SENT:
-                                if time.time() - ticket.sent_time > 5:
-                                    logger.warning('%r %r Ticket Sent But status unknown :  %r', self, user, ticket)
-                                    payload = user.resource_ticket_by_id(2)
-                                    socket = await user.ticket_manager.get_available_socket()
-                                    socket, xs = user.send(Resource.TICKETS_FIND_BY_ID, payload,
-                                                           socket_id=socket.socket_id)
-                                    user.ticket_check[xs] = (ticket.game_id, ticket.ticket_key)
-                                    logger.warning('%r %r Please validate lost ticket %d %f xs : %d', self,
-                                                   user, ticket.ticket_id, ticket.total_won, xs)
-                                pass
-                            elif ticket.status == TicketStatus.SUCCESS and ticket.resolved and\
-                                    ticket.status != TicketStatus.DISCARD:
-                                if ticket.demo:
-                                    if ticket.total_won > 0:
-                                        ticket.ticket_status = 'PAIDOUT'
-                                        ticket.db_ticket.won_data = {'won': ticket.total_won, 'stake': ticket.stake}
-                                    else:
-                                        ticket.ticket_status = 'LOST'
-                                        ticket.db_ticket.won_data = {'won': ticket.total_won, 'stake': ticket.stake}
-                                    await ticket.save()
-                                    ticket.status = TicketStatus.DISCARD
-                                    user_rem.append(ticket)
-                                else:
-                                    if ticket.total_won > 0:
-                                        payload = user.resource_ticket_by_id(1, ticket.ticket_id)
-                                        socket = await user.ticket_manager.get_available_socket()
-                                        socket, xs = user.send(Resource.TICKETS_FIND_BY_ID, payload,
-                                                               socket_id=socket.socket_id)
-                                        logger.warning('%r Please validate ticket %d %f xs : %d',
-                                                       user, ticket.ticket_id, ticket.total_won, xs)
-                                    else:
-                                        ticket.on_lost()
-                                        await ticket.save()
-                                        ticket.status = TicketStatus.DISCARD
-                                        if time.time() - ticket.sent_time > 5:
-                                            user_rem.append(ticket)
-                # Discard marked tickets
-                for t in user_rem:
-                    await user.ticket_manager.remove_ticket(t)
-
-            await asyncio.sleep(self.scan_interval)
+    async def league_reader(self):
+        with await self.redis as con:
+            name = SharedLeagueCache.channel_name(self.provider_name)
+            try:
+                res = await con.subscribe(name)
+                channel = res[0]  # type: aioredis.Channel
+                logger.info('%r League reader online. (name=%s)', self, name)
+                while await channel.wait_message():
+                    message = await channel.get()
+                    try:
+                        gid, odd_settings_id, block = decode_message(message)
+                    except ValueError:
+                        continue
+                    if gid != self.gid:
+                        cache = self.get_league_cache(odd_settings_id)
+                        if cache is not None:
+                            kind, competition_id, league, week, data = block
+                            cache.put(kind, competition_id, league, week, data, publish=False)
+            except asyncio.CancelledError:
+                logger.info('%r League reader offline. (name=%s)', self, name)
+
+    async def players_reader(self):
+        with await self.redis as con:
+            name = settings.PLAYERS_CHANNEL
+            try:
+                res = await con.subscribe(name)
+                channel = res[0]  # type: aioredis.Channel
+                logger.info('%r Players reader online. (name=%s)', self, name)
+                while await channel.wait_message():
+                    try:
+                        command = await channel.get_json()  # type: Dict
+                    except ValueError:
+                        continue
+                    if isinstance(command, dict) and not players.registry.handle(command):
+                        logger.warning('%r Invalid players command %s', self, command)
+            except asyncio.CancelledError:
+                logger.info('%r Players reader offline. (name=%s)', self, name)
 
     async def online_updater(self):
         with await self.redis as con:
@@ -364,8 +363,9 @@ class Provider(multiprocessing.Process):
             usr_key = f'login_{self.name}_{username}'
             login_payload = self.login_users.pop(username)
             user_id = login_payload.get('body', {}).get('user_id', {})
+            db_save_user = self.async_db.save_user if self.async_db else save_user
             asyncio.create_task(
-                save_user(user_id, username, self.name, user_data))
+                db_save_user(user_id, username, self.name, user_data))
             logger.info('%r User cached (username=%s)', self, username)
             session_key = login_payload.get('session_key')  # type: str
             channel_name = login_payload.get('channel_name')  # type: str
@@ -389,6 +389,21 @@ class Provider(multiprocessing.Process):
         del self.user_map[user.user_id]
         user.offline()
 
+    def get_league_cache(self, odd_settings_id: int) -> Optional[LeagueCache]:
+        # Odds depend on the odd settings, only users sharing them share league blocks
+        if not settings.LEAGUE_CACHE:
+            return None
+        cache = self.league_caches.get(odd_settings_id)
+        if cache is None:
+            if settings.LEAGUE_CACHE_SHARED:
+                # Shared with the other workers of the backend
+                cache = SharedLeagueCache(settings.LEAGUE_CACHE_LEAGUES, settings.LEAGUE_CACHE_WAIT, self.redis,
+                                          self.provider_name, self.gid, odd_settings_id, settings.LEAGUE_CACHE_TTL)
+            else:
+                cache = LeagueCache(settings.LEAGUE_CACHE_LEAGUES, settings.LEAGUE_CACHE_WAIT)
+            self.league_caches[odd_settings_id] = cache
+        return cache
+
     def get_user(self, username: str = '', user_id: int = None):
         if user_id:
             username = self.user_map.get(user_id)
@@ -460,10 +475,10 @@ class Provider(multiprocessing.Process):
             state = self.channel_future.cancel()
             while not state:
                 state = self.channel_future.cancel()
-        if self.scanner_future:
-            state = self.scanner_future.cancel()
-            while not state:
-                state = self.channel_future.cancel()
+        if self.league_future:
+            self.league_future.cancel()
+        if self.players_future:
+            self.players_future.cancel()
         for username in self.users:
             pipe = self.redis.pipeline()
             key = f'{self.name}_{username}_live'
@@ -475,6 +490,10 @@ class Provider(multiprocessing.Process):
         logger.info('%r Closing provider %s', self, multiprocessing.current_process().name)
         # Close redis pool
         await self.clean_up_scanners()
+        if self.ticket_persister:
+            await self.ticket_persister.close()
+        if self.async_db:
+            await self.async_db.close()
         self.redis.close()
         await self.redis.wait_closed()
         # Close django channels_layer
@@ -18,6 +18,50 @@ PROCESS_POOL_WORKERS = 2
 
 THREAD_POOL_WORKERS = 2
 
+# Write-behind ticket persistence, seconds between flushes and pending writes forcing one
+TICKET_FLUSH_INTERVAL = 0.2
+
+TICKET_FLUSH_SIZE = 50
+
+# Failed flushes retried with a doubling delay, then written row by row and the failing rows dropped
+TICKET_FLUSH_RETRIES = 5
+
+# Pending writes kept for a retry at most
+TICKET_BUFFER_MAX = 10000
+
+# Ticket keys reserved per sequence round trip
+TICKET_KEY_BLOCK = 1000
+
+# Ticket, live session and login writes through an asyncpg pool of each provider process instead of the ORM threads,
+# requires asyncpg
+ASYNC_DB = False
+
+ASYNC_DB_POOL_MIN = 2
+
+ASYNC_DB_POOL_MAX = 10
+
+# Resolved tickets older than this many days are moved to the archive table by `vtickets archive`
+TICKET_ARCHIVE_DAYS = 30
+
+TABLE_ARRAY_STORE = False
+
+# Executor of offloaded player forecasts: None (event loop), 'thread' or 'process'
+FORECAST_EXECUTOR = None
+
+HISTORY_PREFETCH = False
+
+HISTORY_PREFETCH_ROUNDS = 3
+
+LEAGUE_CACHE = False
+
+LEAGUE_CACHE_LEAGUES = 2
+
+LEAGUE_CACHE_WAIT = 10
+
+LEAGUE_CACHE_SHARED = False
+
+LEAGUE_CACHE_TTL = 10800
+
 API_BACKENDS = [BETIKA, MOZZART]
 
 DEBUG = True
@@ -41,3 +85,13 @@ DATA_DIR = f'{BASE_DIR}/data'
 LOG_DIR = f'/var/log'
 
 DUMP_DIR = f'{BASE_DIR}/data'
+
+SEASON_ARCHIVE = True
+
+ARCHIVE_DIR = f'{BASE_DIR}/data/archive'
+
+# JSON strategy definitions registered as players
+STRATEGY_DIR = f'{BASE_DIR}/data/strategies'
+
+# Redis channel of player load, reload and unload commands, shared by every provider
+PLAYERS_CHANNEL = 'vbet_players'
@@ -0,0 +1,276 @@
+"""
+Append only columnar season archive.
+
+One archive per competition and odd settings holds every archived league as
+fixed width records readable in place through `numpy.memmap`:
+
+    <odd_settings_id>/<competition_id>.vsa    header followed by RECORD_DTYPE records
+    <odd_settings_id>/<competition_id>.vsi    header followed by INDEX_DTYPE entries, one per league
+    <odd_settings_id>/<competition_id>.vss    week stats, one JSON line per league
+
+A league is written once per archive, later writers of the same league are
+ignored, so users with the same odd settings and provider workers share one copy.
+"""
+import fcntl
+import json
+import os
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy
+
+from vbet.utils.exceptions import InvalidArchive
+from .markets import Markets, decode_won_markets, market_registry
+
+VERSION = 1
+RECORDS_MAGIC = b'VSAR'
+INDEX_MAGIC = b'VSAI'
+RECORDS_EXT = '.vsa'
+INDEX_EXT = '.vsi'
+STATS_EXT = '.vss'
+
+# magic, version, record size, reserved
+HEADER = struct.Struct('<4sHHQ')
+
+ODDS_WIDTH = max(market_registry.get(odd_id).odd_index for market in Markets.values() for odd_id in market) + 1
+WON_BITS = max(int(odd_id) for market in Markets.values() for odd_id in market) + 1
+WON_BYTES = (WON_BITS + 7) // 8
+NO_HALF_TIME = -1
+
+RECORD_DTYPE = numpy.dtype([
+    ('league', '<u4'),
+    ('week', 'u1'),
+    ('index', 'u1'),
+    ('event', '<u8'),
+    ('team_a', 'S4'),
+    ('team_b', 'S4'),
+    ('odds', '<f4', (ODDS_WIDTH,)),
+    ('score', 'u1', (2,)),
+    ('half_time', '<i2'),
+    ('won', 'u1', (WON_BYTES,)),
+])
+
+INDEX_DTYPE = numpy.dtype([
+    ('league', '<u4'),
+    ('start', '<u8'),
+    ('count', '<u4'),
+])
+
+# week, event index, event id, team a, team b, odds, score, half time odd id, won odd ids
+ArchiveRow = Tuple[int, int, int, str, str, List[float], Tuple[int, int], Optional[int], Iterable[int]]
+
+# week -> event id -> event stats
+WeekStats = Dict[int, Dict[int, Dict]]
+
+
+def archive_directory(archive_dir: str, provider_name: str, odd_settings_id: int) -> str:
+    """Archives of the provider leagues played with the odd settings, odds differ between settings"""
+    return os.path.join(archive_dir, provider_name, str(odd_settings_id))
+
+
+def won_bitmap(won_ids: Iterable[int]) -> numpy.ndarray:
+    bits = numpy.zeros(WON_BYTES * 8, dtype=numpy.uint8)
+    bits[[odd_id for odd_id in won_ids if 0 <= odd_id < WON_BITS]] = 1
+    return numpy.packbits(bits, bitorder='little')
+
+
+def won_ids(bitmap: numpy.ndarray) -> List[int]:
+    return numpy.flatnonzero(numpy.unpackbits(bitmap, bitorder='little')).tolist()
+
+
+def build_records(league: int, rows: List[ArchiveRow]) -> numpy.ndarray:
+    records = numpy.zeros(len(rows), dtype=RECORD_DTYPE)
+    records['league'] = league
+    records['odds'] = numpy.nan
+    records['half_time'] = NO_HALF_TIME
+    for i, (week, index, event_id, team_a, team_b, odds, score, half_time, won) in enumerate(rows):
+        record = records[i]
+        record['week'] = week
+        record['index'] = index
+        record['event'] = event_id
+        record['team_a'] = team_a.encode('ascii')
+        record['team_b'] = team_b.encode('ascii')
+        odds = odds[:ODDS_WIDTH]
+        record['odds'][:len(odds)] = odds
+        record['score'] = score
+        if half_time is not None:
+            record['half_time'] = half_time
+        record['won'] = won_bitmap(won)
+    return records
+
+
+class SeasonArchive:
+    def __init__(self, directory: str, competition_id: int):
+        self.competition_id = competition_id
+        self.records_path = os.path.join(directory, f'{competition_id}{RECORDS_EXT}')
+        self.index_path = os.path.join(directory, f'{competition_id}{INDEX_EXT}')
+        self.stats_path = os.path.join(directory, f'{competition_id}{STATS_EXT}')
+
+    def __repr__(self):
+        return '[SeasonArchive:%d]' % self.competition_id
+
+    @staticmethod
+    def check_header(path: str, header: bytes, magic: bytes, dtype: numpy.dtype):
+        if len(header) < HEADER.size:
+            raise InvalidArchive(path, 'truncated header')
+        file_magic, version, item_size, _ = HEADER.unpack(header[:HEADER.size])
+        if file_magic != magic:
+            raise InvalidArchive(path, 'bad magic')
+        if version != VERSION or item_size != dtype.itemsize:
+            raise InvalidArchive(path, f'version {version} record size {item_size}')
+
+    def read_array(self, path: str, magic: bytes, dtype: numpy.dtype) -> numpy.ndarray:
+        if not os.path.exists(path) or os.path.getsize(path) <= HEADER.size:
+            return numpy.zeros(0, dtype=dtype)
+        with open(path, 'rb') as f:
+            self.check_header(path, f.read(HEADER.size), magic, dtype)
+        count = (os.path.getsize(path) - HEADER.size) // dtype.itemsize
+        return numpy.memmap(path, dtype=dtype, mode='r', offset=HEADER.size, shape=(count,))
+
+    def index(self) -> numpy.ndarray:
+        return self.read_array(self.index_path, INDEX_MAGIC, INDEX_DTYPE)
+
+    def records(self) -> numpy.ndarray:
+        """Every archived record, memory mapped"""
+        return self.read_array(self.records_path, RECORDS_MAGIC, RECORD_DTYPE)
+
+    def leagues(self) -> List[int]:
+        return self.index()['league'].tolist()
+
+    def has_league(self, league: int) -> bool:
+        return bool((self.index()['league'] == league).any())
+
+    def league(self, league: int) -> Optional[numpy.ndarray]:
+        index = self.index()
+        entries = index[index['league'] == league]
+        if not len(entries):
+            return None
+        start = int(entries[0]['start'])
+        return self.records()[start:start + int(entries[0]['count'])]
+
+    def stats(self) -> Dict[int, WeekStats]:
+        """Week stats of every archived league"""
+        stats = {}
+        if not os.path.exists(self.stats_path):
+            return stats
+        leagues = set(self.leagues())
+        with open(self.stats_path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Cut short by an interrupted append
+                    continue
+                if entry['league'] in leagues:
+                    # The last line of a league is the one written with its index entry
+                    stats[entry['league']] = {int(week): {int(event_id): event_stats
+                                                          for event_id, event_stats in week_stats.items()}
+                                              for week, week_stats in entry['stats'].items()}
+        return stats
+
+    def append(self, league: int, records: numpy.ndarray, stats: Optional[WeekStats] = None) -> bool:
+        """Append the league records and week stats, False when the league is already archived"""
+        os.makedirs(os.path.dirname(self.records_path), exist_ok=True)
+        with open(self.index_path, 'a+b') as index_file:
+            # Writers in other processes wait here, the index decides who archives a league
+            fcntl.flock(index_file, fcntl.LOCK_EX)
+            try:
+                if self.has_league(league):
+                    return False
+                with open(self.records_path, 'a+b') as records_file:
+                    size = records_file.seek(0, os.SEEK_END)
+                    if size == 0:
+                        records_file.write(HEADER.pack(RECORDS_MAGIC, VERSION, RECORD_DTYPE.itemsize, 0))
+                        size = HEADER.size
+                    else:
+                        records_file.seek(0)
+                        self.check_header(self.records_path, records_file.read(HEADER.size), RECORDS_MAGIC,
+                                          RECORD_DTYPE)
+                        records_file.seek(0, os.SEEK_END)
+                    # Records left by an interrupted append are skipped, they were never indexed
+                    start = (size - HEADER.size) // RECORD_DTYPE.itemsize
+                    records_file.truncate(HEADER.size + start * RECORD_DTYPE.itemsize)
+                    records_file.seek(0, os.SEEK_END)
+                    records_file.write(records.astype(RECORD_DTYPE, copy=False).tobytes())
+                    records_file.flush()
+                    os.fsync(records_file.fileno())
+                if stats:
+                    with open(self.stats_path, 'a+b') as stats_file:
+                        if stats_file.seek(0, os.SEEK_END):
+                            stats_file.seek(-1, os.SEEK_END)
+                            if stats_file.read(1) != b'\n':
+                                # Ends a line cut short by an interrupted append
+                                stats_file.write(b'\n')
+                        stats_file.write(json.dumps({'league': league, 'stats': stats}).encode() + b'\n')
+                        stats_file.flush()
+                        os.fsync(stats_file.fileno())
+                entry = numpy.array([(league, start, len(records))], dtype=INDEX_DTYPE)
+                if index_file.seek(0, os.SEEK_END) == 0:
+                    index_file.write(HEADER.pack(INDEX_MAGIC, VERSION, INDEX_DTYPE.itemsize, 0))
+                index_file.write(entry.tobytes())
+                index_file.flush()
+                return True
+            finally:
+                fcntl.flock(index_file, fcntl.LOCK_UN)
+
+
+def json_dump_rows(data: Dict) -> List[ArchiveRow]:
+    """Rows of a league written by `dump_data`, without won markets and full odds"""
+    rows = []
+    for week, week_info in sorted(data.items(), key=lambda item: int(item[0])):
+        for index, (event_id, event) in enumerate(week_info.items()):
+            score = tuple(event.get('score'))
+            h_score = event.get('h_score')
+            rows.append((int(week), index, int(event_id), event.get('t_a'), event.get('t_b'), event.get('odds'),
+                         score, h_score, []))
+    return rows
+
+
+def json_dump_stats(data: Dict) -> WeekStats:
+    stats = {}
+    for week, week_info in data.items():
+        week_stats = {int(event_id): event.get('stats') for event_id, event in week_info.items() if event.get('stats')}
+        if week_stats:
+            stats[int(week)] = week_stats
+    return stats
+
+
+def convert_json_dumps(dump_dir: str, archive_dir: str, odd_settings_id: int = 0) -> Dict[str, int]:
+    """
+    Archive every `{provider}/{username}/{competition}/{league}.json` dump found in
+    `dump_dir` into the `archive_dir` archives of the provider and odd settings, the
+    dumps do not record theirs. Returns league counts per archive.
+    """
+    converted = {}
+    for root, _, files in os.walk(dump_dir):
+        parts = os.path.relpath(root, dump_dir).split(os.sep)
+        if len(parts) != 3 or not parts[2].isdigit():
+            continue
+        provider, _, competition_id = parts
+        archive = SeasonArchive(archive_directory(archive_dir, provider, odd_settings_id), int(competition_id))
+        for file_name in sorted(files):
+            league, ext = os.path.splitext(file_name)
+            if ext != '.json' or not league.isdigit() or archive.has_league(int(league)):
+                continue
+            with open(os.path.join(root, file_name)) as f:
+                data = json.load(f)
+            if archive.append(int(league), build_records(int(league), json_dump_rows(data)), json_dump_stats(data)):
+                converted[archive.records_path] = converted.get(archive.records_path, 0) + 1
+    return converted
+
+
+def competition_rows(league_games: Dict[int, Dict], results_pool: Dict[int, Dict],
+                     results_ids_pool: Dict[int, Dict]) -> List[ArchiveRow]:
+    rows = []
+    for week in sorted(league_games):
+        week_results = results_pool.get(week, {})
+        week_result_ids = results_ids_pool.get(week, {})
+        for event_id, event_data in sorted(league_games[week].items(), key=lambda item: item[1].get('index')):
+            event_result = week_results.get(event_id)
+            if not event_result:
+                continue
+            won = week_result_ids.get(event_id, frozenset())
+            rows.append((week, event_data.get('index'), event_id, event_data.get('A'), event_data.get('B'),
+                         event_data.get('odds'), tuple(event_result.get('score')),
+                         decode_won_markets(won).half_time, won))
+    return rows
@@ -0,0 +1,421 @@
+"""
+Offline backtests.
+
+Archived seasons are replayed week by week through the unmodified players. The
+competition, user and session stand ins expose what players read from their live
+counterparts, tickets are settled with `Ticket.can_resolve`/`Ticket.resolve` and
+staked through the configured `SessionAccount`. Nothing touches sockets, redis or
+the database.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import os
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from vbet.core import settings
+from vbet.core.mixin import StatusMap
+from vbet.utils.log import get_logger
+from .accounts.manager import AccountManager
+from .archive import SeasonArchive, WeekStats, won_ids
+from .features import FeatureCache, WeekFeatures
+from .markets import score_won_ids
+from .provider_settings import ProviderSettings
+from .session import LiveSession
+from .table import LeagueTable
+from .tickets import Ticket, TicketStatus
+
+logger = get_logger('backtest')
+
+NO_WINNINGS = {'half_lost': [], 'half_won': [], 'refund_stake': []}
+
+
+class Season(NamedTuple):
+    competition_id: int
+    league: int
+    # week -> event id -> {'A', 'B', 'index', 'odds', 'score', 'won'} and 'stats' when recorded
+    weeks: Dict[int, Dict[int, Dict]]
+
+    @property
+    def max_week(self) -> int:
+        return max(self.weeks) if self.weeks else 0
+
+    @property
+    def teams(self) -> List[str]:
+        teams = set()
+        for week_events in self.weeks.values():
+            for event in week_events.values():
+                teams.add(event.get('A'))
+                teams.add(event.get('B'))
+        return sorted(teams)
+
+
+class BacktestReport(NamedTuple):
+    player: str
+    seasons: int
+    tickets: int
+    won_tickets: int
+    stake: float
+    won: float
+    max_drawdown: float = 0
+    losing_run: int = 0
+
+    @property
+    def profit(self) -> float:
+        return round(self.won - self.stake, 2)
+
+    @property
+    def roi(self) -> float:
+        return round(self.profit / self.stake * 100, 2) if self.stake else 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        return round(self.won_tickets / self.tickets * 100, 2) if self.tickets else 0.0
+
+
+# Season loaders
+def archive_seasons(directory: str, competition_id: int) -> List[Season]:
+    archive = SeasonArchive(directory, competition_id)
+    stats = archive.stats()
+    return [season_from_records(competition_id, league, archive.league(league), stats.get(league, {}))
+            for league in archive.leagues()]
+
+
+def archive_season_count(directory: str, competition_id: int) -> int:
+    """Archived seasons of the competition, from the archive index alone"""
+    return len(SeasonArchive(directory, competition_id).leagues())
+
+
+def season_from_records(competition_id: int, league: int, records, stats: Optional[WeekStats] = None) -> Season:
+    weeks: Dict[int, Dict[int, Dict]] = {}
+    for record in records:
+        score = tuple(record['score'].tolist())
+        half_time = int(record['half_time'])
+        half_time = half_time if half_time >= 0 else None
+        won = won_ids(record['won']) or score_won_ids(score, half_time)
+        odds = [odd if not math.isnan(odd) else 0.0 for odd in record['odds'].tolist()]
+        week, event_id = int(record['week']), int(record['event'])
+        weeks.setdefault(week, {})[event_id] = {
+            'A': record['team_a'].decode('ascii'), 'B': record['team_b'].decode('ascii'),
+            'index': int(record['index']), 'odds': odds, 'score': score, 'won': frozenset(won),
+            'stats': (stats or {}).get(week, {}).get(event_id)}
+    return Season(competition_id, league, weeks)
+
+
+def json_dump_paths(directory: str, competition_id: int) -> Dict[int, str]:
+    """League -> first `{directory}/{username}/{competition_id}/{league}.json` dump of it"""
+    paths: Dict[int, str] = {}
+    for username in sorted(os.listdir(directory)):
+        path = os.path.join(directory, username, str(competition_id))
+        if not os.path.isdir(path):
+            continue
+        for file_name in sorted(os.listdir(path)):
+            league, ext = os.path.splitext(file_name)
+            if ext == '.json' and league.isdigit():
+                paths.setdefault(int(league), os.path.join(path, file_name))
+    return paths
+
+
+def json_seasons(directory: str, competition_id: int) -> List[Season]:
+    """Seasons of the JSON dumps, one per league"""
+    seasons = []
+    for league, path in sorted(json_dump_paths(directory, competition_id).items()):
+        with open(path) as f:
+            data = json.load(f)
+        seasons.append(season_from_dump(competition_id, league, data))
+    return seasons
+
+
+def season_from_dump(competition_id: int, league: int, data: Dict) -> Season:
+    weeks: Dict[int, Dict[int, Dict]] = {}
+    for week, week_info in data.items():
+        events = weeks.setdefault(int(week), {})
+        for index, (event_id, event) in enumerate(week_info.items()):
+            score = tuple(event.get('score'))
+            events[int(event_id)] = {
+                'A': event.get('t_a'), 'B': event.get('t_b'), 'index': index, 'odds': event.get('odds'),
+                'score': score, 'won': score_won_ids(score, event.get('h_score')), 'stats': event.get('stats')}
+    return Season(competition_id, league, weeks)
+
+
+# Live object stand ins
+class BacktestUser:
+    def __init__(self, min_stake: float = 0, max_stake: float = 0):
+        self.username = 'backtest'
+        self.provider = None
+        self.settings = ProviderSettings()
+        self.settings.game_settings = {'GL': {'min_stake': min_stake, 'max_stake': max_stake or math.inf}}
+        self.account_manager = AccountManager(self)
+        self.competitions: Dict[int, BacktestCompetition] = {}
+        self.live_sessions: Dict[int, BacktestSession] = {}
+        self.ticket_key = 0
+
+    def __repr__(self):
+        return '[%s]' % self.username
+
+    def get_competition(self, competition_id: int) -> Optional[BacktestCompetition]:
+        return self.competitions.get(competition_id)
+
+    def get_live_session(self, live_session_id: int) -> Optional[BacktestSession]:
+        return self.live_sessions.get(live_session_id)
+
+    def next_ticket_key(self) -> int:
+        self.ticket_key += 1
+        return self.ticket_key
+
+
+class BacktestSession(LiveSession):
+    def __init__(self, user: BacktestUser, session_id: int, competitions: Iterable[int], account_data: Dict):
+        # LiveSession setup without the database session and ticket locks
+        self.user = user
+        self.demo = True
+        self.session_id = session_id
+        self.db_live_session = None
+        self.competitions = {}
+        self.ticket_maps = {}
+        for competition_id in competitions:
+            self.add_competition(competition_id)
+            self.ticket_maps[competition_id] = {}
+        self.play_events = {}
+        self.status = self.RUNNING
+        self.player = None
+        self.players = {}
+        self.stake = 0
+        self.won = 0
+        self.tickets = 0
+        self.won_tickets = 0
+        self.peak = 0
+        self.max_drawdown = 0
+        self.losing_run = 0
+        self.max_losing_run = 0
+        self.target_amount = account_data.get('target_amount')
+        self.setup_account(account_data)
+
+    async def play(self, competition_id: int, week: int) -> List[Ticket]:
+        tickets = await self.get_player(competition_id).on_event(competition_id, week)
+        for ticket in tickets:
+            ticket.live_session_id = self.session_id
+            ticket.demo = True
+            ticket.ticket_key = self.user.next_ticket_key()
+            await self.account.account.borrow(ticket.stake)
+            self.user.account_manager.total_stake = ticket.stake
+            ticket.status = TicketStatus.SUCCESS
+        return tickets
+
+    async def settle(self, ticket: Ticket):
+        self.stake += ticket.stake
+        self.won += ticket.total_won
+        self.tickets += 1
+        if ticket.total_won > 0:
+            self.won_tickets += 1
+        balance = self.won - self.stake
+        self.peak = max(self.peak, balance)
+        self.max_drawdown = max(self.max_drawdown, self.peak - balance)
+        if ticket.total_won < ticket.stake:
+            self.losing_run += 1
+            self.max_losing_run = max(self.max_losing_run, self.losing_run)
+        else:
+            self.losing_run = 0
+        await self.get_player(ticket.game_id).on_ticket(ticket)
+
+
+class BacktestCompetition(StatusMap):
+    """LeagueCompetition stand in replaying one archived season at a time"""
+
+    def __init__(self, user: BacktestUser, competition_id: int, max_week: int):
+        self.user = user
+        self.competition_id = competition_id
+        self.max_week = max_week
+        self.league = None
+        self.week = None
+        self.status = self.RUNNING
+        self.table = LeagueTable(max_week, array_store=settings.TABLE_ARRAY_STORE)
+        self.league_games: Dict[int, Dict] = {}
+        self.sessions: List[int] = []
+        self.required_weeks: List[int] = []
+        self.features = FeatureCache()
+        self.wait_event = False
+        self.dispatching = False
+        self.completed = False
+        self.season: Optional[Season] = None
+
+    def __repr__(self):
+        return '[%s:%d]' % (self.user.username, self.competition_id)
+
+    def setup_season(self, season: Season):
+        self.season = season
+        self.league = season.league
+        self.week = 1
+        self.completed = False
+        self.wait_event = False
+        self.features.clear()
+        self.table = LeagueTable(self.max_week, array_store=settings.TABLE_ARRAY_STORE)
+        self.table.setup_league(season.league)
+        self.table.setup_participants(season.teams)
+        self.league_games = {
+            week: {event_id: {'A': event.get('A'), 'B': event.get('B'), 'odds': event.get('odds'),
+                              'index': event.get('index'),
+                              'participants': [{'fifaCode': event.get('A')}, {'fifaCode': event.get('B')}]}
+                   for event_id, event in week_events.items()}
+            for week, week_events in season.weeks.items()}
+        self.required_weeks = self.get_required_weeks()
+
+    def feed_week(self, week: int):
+        week_events = self.season.weeks.get(week)
+        if not week_events or week in self.table.event_block_map:
+            return
+        results = {event_id: {'id': event_id, 'A': event.get('A'), 'B': event.get('B'), 'score': event.get('score')}
+                   for event_id, event in week_events.items()}
+        result_ids = {event_id: event.get('won') for event_id, event in week_events.items()}
+        winning_ids = {event_id: NO_WINNINGS for event_id in week_events}
+        self.table.feed_result(self.get_block_by_week(week), self.league, week, results, result_ids, winning_ids)
+
+    def feed_stats(self, week: int):
+        week_events = self.season.weeks.get(week, {})
+        stats = {event_id: event.get('stats') for event_id, event in week_events.items() if event.get('stats')}
+        if stats:
+            self.table.feed_stats(week, stats)
+
+    def next_week(self) -> Optional[int]:
+        for week in range(1, self.season.max_week + 1):
+            if week not in self.table.event_block_map:
+                return week
+        return None
+
+    async def dispatch_events(self):
+        if self.wait_event or self.dispatching or self.completed:
+            return
+        self.dispatching = True
+        try:
+            while not self.wait_event:
+                # Results the live competition fetches ahead of dispatching
+                for week in self.required_weeks:
+                    self.feed_week(week)
+                week = self.next_week()
+                if week is None:
+                    self.completed = True
+                    break
+                self.week = week
+                self.feed_stats(week)
+                tickets: List[Ticket] = []
+                for live_session_id in self.sessions:
+                    live_session = self.user.get_live_session(live_session_id)
+                    tickets.extend(await live_session.play(self.competition_id, week))
+                if self.wait_event:
+                    break
+                self.feed_week(week)
+                for ticket in tickets:
+                    for event in ticket.events:
+                        self.feed_week(event.week)
+                for live_session_id in self.sessions:
+                    live_session = self.user.get_live_session(live_session_id)
+                    await live_session.get_player(self.competition_id).on_result(self.competition_id)
+                await self.resolve_tickets(tickets)
+        finally:
+            self.dispatching = False
+
+    async def resolve_tickets(self, tickets: List[Ticket]):
+        results, winning_ids = self.get_ticket_validation_data()
+        for ticket in tickets:
+            validation_data = ticket.can_resolve(results, winning_ids)
+            if validation_data:
+                ticket.resolve(validation_data)
+                ticket.resolved = True
+                await self.user.get_live_session(ticket.live_session_id).settle(ticket)
+
+    def get_ticket_validation_data(self) -> Tuple[Dict, Dict]:
+        return self.table.results_ids_pool, self.table.winning_ids_pool
+
+    def get_required_weeks(self) -> List[int]:
+        used_weeks = []
+        for live_session_id in self.sessions:
+            player = self.user.get_live_session(live_session_id).get_player(self.competition_id)
+            player.get_required_weeks(self.competition_id)
+            used_weeks.extend(player.required_weeks(self.competition_id))
+        all_weeks = set(i for i in range(1, self.max_week + 1))
+        return list(all_weeks - set(used_weeks))
+
+    def extend_required_weeks(self, weeks: List[int]):
+        self.required_weeks.extend(set(weeks))
+
+    def get_features(self, week: int) -> WeekFeatures:
+        return self.features.get(self.competition_id, self.league, week, self.table, self.league_games.get(week, {}))
+
+    def get_block_by_week(self, week: int) -> int:
+        # Blocks are consecutive within a league
+        return self.league * 100 + week
+
+    def get_week_by_block(self, e_block_id: int) -> int:
+        return e_block_id % 100
+
+
+class Backtest:
+    """
+    Replays seasons through one player.
+
+    `seasons` maps competition id to its seasons, round `i` plays season `i` of
+    every competition side by side like the live sessions do.
+    """
+
+    def __init__(self, player_name: str, seasons: Dict[int, List[Season]], account_data: Dict,
+                 min_stake: float = 0, max_stake: float = 0, player_params: Optional[Dict] = None):
+        self.player_name = player_name
+        self.seasons = seasons
+        self.user = BacktestUser(min_stake, max_stake)
+        competition_ids = list(seasons)
+        for competition_id, competition_seasons in seasons.items():
+            max_week = max((season.max_week for season in competition_seasons), default=38)
+            self.user.competitions[competition_id] = BacktestCompetition(self.user, competition_id, max_week)
+        self.session = BacktestSession(self.user, 1, competition_ids, dict(account_data))
+        self.user.live_sessions[self.session.session_id] = self.session
+        self.session.set_player(player_name)
+        for name, value in (player_params or {}).items():
+            # Only tunables the player already defines can be overridden
+            if not hasattr(self.session.player, name):
+                raise ValueError(f'Player {player_name} has no parameter {name}')
+            setattr(self.session.player, name, value)
+        for competition in self.user.competitions.values():
+            competition.sessions.append(self.session.session_id)
+
+    @property
+    def rounds(self) -> int:
+        return min((len(competition_seasons) for competition_seasons in self.seasons.values()), default=0)
+
+    async def run_round(self, index: int):
+        competitions = list(self.user.competitions.values())
+        for competition in competitions:
+            competition.setup_season(self.seasons[competition.competition_id][index])
+            await self.session.on_new_league(competition.competition_id)
+        await asyncio.gather(*[competition.dispatch_events() for competition in competitions])
+        # Players resume competitions from their own tasks, the round ends once none is left
+        current = asyncio.current_task()
+        while True:
+            pending = [task for task in asyncio.all_tasks() if task is not current and not task.done()]
+            if not pending:
+                break
+            await asyncio.wait(pending)
+        stalled = [competition for competition in competitions if not competition.completed]
+        if stalled:
+            logger.debug('%r Round %d stalled competitions %s', self.user, index, stalled)
+
+    async def run(self) -> BacktestReport:
+        for index in range(self.rounds):
+            await self.run_round(index)
+        return self.report()
+
+    def report(self) -> BacktestReport:
+        return BacktestReport(self.player_name, self.rounds, self.session.tickets, self.session.won_tickets,
+                              round(self.session.stake, 2), round(self.session.won, 2),
+                              round(self.session.max_drawdown, 2), self.session.max_losing_run)
+
+
+def run_backtest(player_name: str, seasons: Dict[int, List[Season]], account_data: Dict,
+                 min_stake: float = 0, max_stake: float = 0, player_params: Optional[Dict] = None) -> BacktestReport:
+    loop = asyncio.new_event_loop()
+    try:
+        backtest = Backtest(player_name, seasons, account_data, min_stake, max_stake, player_params)
+        return loop.run_until_complete(backtest.run())
+    finally:
+        loop.close()
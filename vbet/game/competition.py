@@ -13,10 +13,15 @@ from vbet.utils.log import get_logger
 from vbet.utils.parser import Resource, dump_data
 from vbet.utils.parser import map_resource_to_name
 from . import players
-from .markets import Markets
+from .archive import SeasonArchive, archive_directory, build_records, competition_rows
+from .features import FeatureCache, WeekFeatures
+from .league_cache import LeagueCache
+from .markets import decode_won_markets
 from .session import LiveSession
 from .table import LeagueTable
+from .ticket_codec import compact_details
 from .tickets import Ticket
+from .weeks import WeekIndex
 
 if TYPE_CHECKING:
     from vbet.game.user import User
@@ -92,11 +97,13 @@ class LeagueCompetition(BaseCompetition):
     event_time_interval: int
     profile: str = 'MOBILE'
     result_future: Optional[asyncio.Task]
+    participants: List[Dict]
     team_labels: Dict[int, str]
     team_ids: Dict[str, int]
     active_tickets: List[int]
     session_events: Dict[int, asyncio.Event]
-    blocks: Dict[int, int]
+    week_index: WeekIndex
+    features: FeatureCache
     result_blocks: List[int]
     league_games: Dict[int, Dict]
     socket_closed: bool
@@ -106,6 +113,11 @@ class LeagueCompetition(BaseCompetition):
     future_block_count: int
     previous_block_count: int
     wait_event: bool
+    prefetching: bool
+    prefetch_pending: int
+    prefetch_rounds: int
+    cache_start_time: Optional[float]
+    cold_start_latency: Optional[float]
 
     def __init__(self, user: User, competition_id: int, mode: str, participants: List[Dict]):
         super().__init__(user, competition_id)
@@ -131,7 +143,8 @@ class LeagueCompetition(BaseCompetition):
         self.last_result_block = 0
         self.last_history_n = 0
         self.last_history_block = 0
-        self.table = LeagueTable(self.max_week)
+        self.table = LeagueTable(self.max_week, array_store=settings.TABLE_ARRAY_STORE)
+        self.table.setup_participants(list(self.team_labels.values()))
         self.phase = self.SLEEPING
         self.restoring = False
         self.caching = False
@@ -142,6 +155,11 @@ class LeagueCompetition(BaseCompetition):
         self.future_results = True
         self.fetching_future = False
         self.auto_skip = False
+        self.prefetching = False
+        self.prefetch_pending = 0
+        self.prefetch_rounds = 0
+        self.cache_start_time = None
+        self.cold_start_latency = None
 
         self.required_weeks = []
         self.event_time_enabled = True
@@ -151,7 +169,8 @@ class LeagueCompetition(BaseCompetition):
         self.result_future = None
         self.team_ids = {}
         self.active_tickets = []
-        self.blocks = {}
+        self.week_index = WeekIndex(self.max_week)
+        self.features = FeatureCache()
         self.session_events = {}
         self.result_blocks = []
         self.league_games = {}
@@ -161,6 +180,10 @@ class LeagueCompetition(BaseCompetition):
     def __repr__(self):
         return '[%s:%d]' % (self.user.username, self.competition_id)
 
+    @property
+    def league_cache(self) -> Optional[LeagueCache]:
+        return self.user.provider.get_league_cache(self.user.settings.odd_settings_id)
+
     def init(self):
         logger.info('%r Competition installed', self)
 
@@ -175,6 +198,13 @@ class LeagueCompetition(BaseCompetition):
             await self.next_block_event()
         elif self.phase == self.RESULTS or self.phase == self.RESULT_TICKETS:
             await self.fetch_result(self.result_blocks[0], 1)
+        elif self.prefetching:
+            self.prefetch_rounds = 0
+            missing = self.get_prefetch_missing()
+            if missing:
+                await self.prefetch_weeks(missing)
+            else:
+                await self.prefetch_complete()
         elif self.phase == self.HISTORY:
             await self.fetch_history(self.last_history_block, self.last_history_n)
         elif self.phase == self.FUTURE:
@@ -190,6 +220,7 @@ class LeagueCompetition(BaseCompetition):
             logger.warning('%r Resumed with phase: %s', self, self.phase)
 
     def setup_participants(self, participants: List[Dict]):
+        self.participants = participants
         self.team_labels.clear()
         for team_data in participants:
             self.team_labels[int(team_data.get('id'))] = team_data.get('fifaCode')
@@ -276,6 +307,8 @@ class LeagueCompetition(BaseCompetition):
     async def fetch_result(self, e_block_id: int, n: int):
         self.last_result_block = e_block_id
         self.last_result_n = n
+        if n == 1 and await self.fetch_cached_result(e_block_id):
+            return
         options = dict()
         options.setdefault('e_block_id', e_block_id)
         options.setdefault('n', n)
@@ -298,6 +331,25 @@ class LeagueCompetition(BaseCompetition):
         payload = self.resource_stats(options)
         self.send(Resource.STATS, payload)
 
+    async def fetch_cached_result(self, e_block_id: int) -> bool:
+        cache = self.league_cache
+        week = self.get_week_by_block(e_block_id)
+        if cache is None or week is None:
+            return False
+        data, future = await cache.acquire((LeagueCache.RESULTS,), self.competition_id, self.league, week)
+        if data is not None:
+            asyncio.create_task(self.receive(True, Resource.RESULTS, [data], from_cache=True))
+            return True
+        if future is None:
+            return False
+        asyncio.create_task(self.receive_in_flight(Resource.RESULTS, [future]))
+        return True
+
+    async def receive_in_flight(self, resource: str, futures: List[asyncio.Future]):
+        # Blocks not delivered in time are reported as invalid and fetched again by the callback
+        data = await self.league_cache.wait(futures)
+        await self.receive(True, resource, data, from_cache=True)
+
     # Event blocks
     async def next_block_result(self, e_block_id: int, block: int = 1):
         await self.await_event_time()
@@ -316,7 +368,7 @@ class LeagueCompetition(BaseCompetition):
         await self.fetch_result(self.result_blocks[0], 1)
 
     # Resources callbacks
-    async def events_callback(self, valid_response: bool, body: Any):
+    async def events_callback(self, valid_response: bool, body: Any, from_cache: bool = False):
         try:
             if valid_response and isinstance(body, list):
                 try:
@@ -326,7 +378,7 @@ class LeagueCompetition(BaseCompetition):
                 except IndexError as exc:
                     raise exceptions.InvalidEvents() from exc
                 else:
-                    await self.resource_events_process(data)
+                    await self.resource_events_process(data, from_cache)
             else:
                 raise exceptions.InvalidEvents()
         except exceptions.InvalidEvents as err:
@@ -334,7 +386,7 @@ class LeagueCompetition(BaseCompetition):
             await asyncio.sleep(2)
             await self.fetch_event(1)
 
-    async def results_callback(self, valid_response: bool, body: Any):
+    async def results_callback(self, valid_response: bool, body: Any, from_cache: bool = False):
         try:
             if valid_response and isinstance(body, list):
                 try:
@@ -345,7 +397,7 @@ class LeagueCompetition(BaseCompetition):
                     raise exceptions.InvalidResults(self.last_result_block, self.last_result_n)
                 else:
                     try:
-                        await self.resource_result_process(data)
+                        await self.resource_result_process(data, from_cache)
                     except exceptions.NoResultError:
                         raise exceptions.InvalidResults(self.last_result_block, self.last_result_n)
             else:
@@ -355,72 +407,89 @@ class LeagueCompetition(BaseCompetition):
             await asyncio.sleep(3)
             await self.fetch_result(err.e_block_id, err.n)
 
-    async def history_callback(self, valid_response: bool, body: Any):
+    async def history_callback(self, valid_response: bool, body: Any, from_cache: bool = False):
         try:
             if valid_response and isinstance(body, list):
-                await self.resource_history_process(body)
+                await self.resource_history_process(body, from_cache)
             else:
                 raise exceptions.InvalidHistory(self.last_history_block, self.last_history_n)
 
         except exceptions.InvalidHistory as err:
             logger.warning('%r Invalid History Block: %r League: %d', self, err, self.league)
             await asyncio.sleep(3)
-            await self.fetch_history(err.e_block_id, err.n)
-
-    async def resource_history_process(self, data: List[Dict]):
+            if self.prefetching:
+                # Weeks of the lost response are requested again once the round completes
+                await self.resource_prefetch_process([])
+            else:
+                await self.fetch_history(err.e_block_id, err.n)
+
+    def process_history_block(self, week_result: Dict,
+                              from_cache: bool = False) -> Optional[Tuple[int, int, int, Dict, Dict, Dict]]:
+        events = week_result.get('events')
+        e_block_id = week_result.get('eBlockId')
+        event_data = week_result.get('data', {})
+        league = event_data.get('leagueId')
+        week = event_data.get('matchDay')
+        if league != self.league:
+            return None
+        logger.debug('%r History Block: %d League: %d Week: %d', self, e_block_id, league, week)
+        self.week_index.add(e_block_id, week)
+        results = {}
+        matches = {}
+        winning_ids = {}
+        result_ids = {}
+        for event_index, event in enumerate(events):
+            data = event.get('data')
+            participants = data.get('participants')
+            player_a = participants[0]
+            player_b = participants[1]
+            team_a = player_a.get('fifaCode')
+            team_b = player_b.get('fifaCode')
+            event_id = event.get('eventId')
+            result = event.get('result')
+            odds = []  # type: List[float]
+            odd_values = data.get('oddValues')  # type: List[str]
+            for odd in odd_values:
+                odds.append(float(odd))
+            matches[event_id] = {'A': team_a, 'B': team_b, 'odds': odds, 'index': event_index,
+                                 'participants': participants}
+            if result:
+                won = result.get('wonMarkets')
+                result_data = result.get('data')
+                half_lost = result_data.get('halfLostMarkets')
+                half_won = result_data.get('halfWonMarkets')
+                refund_stake = result_data.get('refundMarkets')
+                handicap_data = {'half_lost': half_lost, 'half_won': half_won, 'refund_stake': refund_stake}
+                won_markets = decode_won_markets(won)
+                if won_markets.score is None:
+                    continue
+                results[event_id] = {
+                    'id': event_id, 'A': team_a, 'B': team_b,
+                    'score': won_markets.score}
+                result_ids[event_id] = won_markets.won_ids
+                winning_ids[event_id] = handicap_data
+        self.league_games[week] = matches
+        cache = self.league_cache
+        # Blocks served by the cache are already stored, only fresh responses are put and published
+        if cache is not None and not from_cache:
+            kind = LeagueCache.HISTORY if results and len(results) == len(events) else LeagueCache.FIXTURES
+            cache.put(kind, self.competition_id, league, week, week_result)
+        return e_block_id, league, week, results, result_ids, winning_ids
+
+    async def resource_history_process(self, data: List[Dict], from_cache: bool = False):
+        if self.prefetching:
+            await self.resource_prefetch_process(data, from_cache)
+            return
         e_blocks = []
         for week_result in data:
-            events = week_result.get('events')
-            e_block_id = week_result.get('eBlockId')
-            event_data = week_result.get('data', {})
-            league = event_data.get('leagueId')
-            week = event_data.get('matchDay')
-            if league != self.league:
+            block = self.process_history_block(week_result, from_cache)
+            if block is None:
                 continue
+            e_block_id, league, week, results, result_ids, winning_ids = block
             e_blocks.append(e_block_id)
-            logger.debug('%r History Block: %d League: %d Week: %d', self, e_block_id, league, week)
-            self.blocks[e_block_id] = week
-            results = {}
-            matches = {}
-            winning_ids = {}
-            result_ids = {}
-            for event_index, event in enumerate(events):
-                data = event.get('data')
-                participants = data.get('participants')
-                player_a = participants[0]
-                player_b = participants[1]
-                team_a = player_a.get('fifaCode')
-                team_b = player_b.get('fifaCode')
-                event_id = event.get('eventId')
-                result = event.get('result')
-                odds = []  # type: List[float]
-                odd_values = data.get('oddValues')  # type: List[str]
-                for odd in odd_values:
-                    odds.append(float(odd))
-                matches[event_id] = {'A': team_a, 'B': team_b, 'odds': odds, 'index': event_index,
-                                     'participants': participants}
-                if result:
-                    won = result.get('wonMarkets')
-                    result_data = result.get('data')
-                    half_lost = result_data.get('halfLostMarkets')
-                    half_won = result_data.get('halfWonMarkets')
-                    refund_stake = result_data.get('refundMarkets')
-                    handicap_data = {'half_lost': half_lost, 'half_won': half_won, 'refund_stake': refund_stake}
-                    x = set(won)
-                    y = set(str(_) for _ in range(15, 43))
-                    r = list(x & y)
-                    z = r[0]
-                    score = Markets['Correct_Score'][z]['name'].split('_')
-                    results[event_id] = {
-                        'id': event_id, 'A': team_a, 'B': team_b,
-                        'score': (int(score[1]),
-                                  int(score[2]))}
-                    result_ids[event_id] = [int(_) for _ in won]
-                    winning_ids[event_id] = handicap_data
-            self.league_games[week] = matches
-
             if self.caching:
                 self.table.feed_result(e_block_id, league, week, results, result_ids, winning_ids)
+                self.week_index.resolve(week)
         if self.caching:
             self.previous_block_count += 1
             if self.previous_block_count < self.max_previous_block:
@@ -453,7 +522,104 @@ class LeagueCompetition(BaseCompetition):
                 self.required_weeks = self.get_required_weeks()
                 await self.dispatch_events()
 
-    async def resource_events_process(self, data: Dict):
+    # History prefetch
+    async def prefetch_history(self):
+        logger.debug('%r %r Prefetching league %d', self, self.user, self.league)
+        self.prefetching = True
+        self.prefetch_rounds = 0
+        self.phase = self.HISTORY
+        await self.prefetch_weeks(list(range(1, self.max_week + 1)))
+
+    async def prefetch_weeks(self, weeks: List[int]):
+        self.prefetch_rounds += 1
+        cache = self.league_cache
+        cached = []
+        waiting = []
+        if cache is not None:
+            fetch_weeks = []
+            # Played weeks are only served from blocks holding their results
+            acquired = await asyncio.gather(*[
+                cache.acquire((LeagueCache.HISTORY,) if week < self.week else
+                              (LeagueCache.HISTORY, LeagueCache.FIXTURES), self.competition_id, self.league, week)
+                for week in weeks])
+            for week, (block, future) in zip(weeks, acquired):
+                if block is not None:
+                    cached.append(block)
+                elif future is not None:
+                    waiting.append(future)
+                else:
+                    fetch_weeks.append(week)
+            weeks = fetch_weeks
+        requests = []
+        # Past weeks are read backwards from one block after the chunk, future weeks forwards from its
+        # first block. Chunks of 9 past weeks are covered whether or not the anchor block is included.
+        for chunk in self.chunk_weeks([week for week in weeks if week < self.week], 9):
+            requests.append((self.expected_block(chunk[-1]) + 1, -10))
+        for chunk in self.chunk_weeks([week for week in weeks if week >= self.week], 10):
+            requests.append((self.expected_block(chunk[0]), 10))
+        self.prefetch_pending = len(requests) + bool(cached) + bool(waiting)
+        if cached:
+            asyncio.create_task(self.receive(True, Resource.HISTORY, cached, from_cache=True))
+        if waiting:
+            asyncio.create_task(self.receive_in_flight(Resource.HISTORY, waiting))
+        # Requests go out together and competition streams spread them over the user's sockets
+        for e_block_id, n in requests:
+            await self.fetch_history(e_block_id, n)
+
+    async def resource_prefetch_process(self, data: List[Dict], from_cache: bool = False):
+        for week_result in data:
+            block = self.process_history_block(week_result, from_cache)
+            if block is None:
+                continue
+            e_block_id, league, week, results, result_ids, winning_ids = block
+            if week < self.week and results and not self.week_index.is_resolved(week):
+                self.table.feed_result(e_block_id, league, week, results, result_ids, winning_ids)
+                self.week_index.resolve(week)
+        if self.phase == self.HISTORY and \
+                all(self.week_index.is_resolved(week) for week in range(1, self.week)):
+            self.phase = self.FUTURE
+        self.prefetch_pending -= 1
+        if self.prefetch_pending > 0:
+            return
+        missing = self.get_prefetch_missing()
+        if missing and self.prefetch_rounds < settings.HISTORY_PREFETCH_ROUNDS:
+            logger.debug('%r Prefetch missing weeks %s', self, str(missing))
+            await self.prefetch_weeks(missing)
+        else:
+            await self.prefetch_complete()
+
+    async def prefetch_complete(self):
+        self.prefetching = False
+        self.cached = True
+        logger.debug('%r %r All events cached %d in %.3fs', self, self.user, self.league,
+                     time.time() - self.cache_start_time if self.cache_start_time else 0)
+        self.required_weeks = self.get_required_weeks()
+        await self.dispatch_events()
+
+    def expected_block(self, week: int) -> int:
+        # Blocks of a league are consecutive, the serial future pass relies on the same
+        return self.e_block_id + (week - self.week)
+
+    def get_prefetch_missing(self) -> List[int]:
+        missing = []
+        for week in range(1, self.max_week + 1):
+            if week not in self.league_games:
+                missing.append(week)
+            elif week < self.week and not self.week_index.is_resolved(week):
+                missing.append(week)
+        return missing
+
+    @staticmethod
+    def chunk_weeks(weeks: List[int], size: int) -> List[List[int]]:
+        chunks = []
+        for week in weeks:
+            if chunks and chunks[-1][-1] + 1 == week and len(chunks[-1]) < size:
+                chunks[-1].append(week)
+            else:
+                chunks.append([week])
+        return chunks
+
+    async def resource_events_process(self, data: Dict, from_cache: bool = False):
         e_block_id = data.get('eBlockId')
         event_data = data.get('data')
         if isinstance(e_block_id, int):
@@ -475,7 +641,10 @@ class LeagueCompetition(BaseCompetition):
                 self.e_block_id = e_block_id
 
                 logger.debug('%r Event Block: %d League: %d Week: %d', self, self.e_block_id, self.league, self.week)
-                if self.max_previous_block:
+                self.cache_start_time = time.time()
+                if settings.HISTORY_PREFETCH or self.league_cache is not None:
+                    await self.prefetch_history()
+                elif self.max_previous_block:
                     self.phase = self.HISTORY   # History phase
                     self.caching = True
                     await self.fetch_history(e_block_id, -10)
@@ -486,18 +655,15 @@ class LeagueCompetition(BaseCompetition):
                     await self.fetch_history(e_block_id, 10)
             elif self.phase == self.EVENTS_STATS:
                 events = data.get('events')
-                stats = {}
-                for event in events:
-                    event_id = event.get('eventId')
-                    _data = event.get('data')
-                    _stats = _data.get('stats')
-                    stats[event_id] = _stats
-                self.table.feed_stats(match_day, stats)
+                self.table.feed_stats(match_day, self.parse_events_stats(events))
+                cache = self.league_cache
+                if cache is not None and not from_cache:
+                    cache.put(LeagueCache.STATS, self.competition_id, league, match_day, events)
                 await self.dispatch_events()
         else:
             raise exceptions.InvalidEvents()
 
-    async def resource_result_process(self, data: Dict):
+    async def resource_result_process(self, data: Dict, from_cache: bool = False):
         e_block_id = data.get('eBlockId')
         week = self.get_week_by_block(e_block_id)
         logger.debug('%r Result Block: %d Week : %d', self, e_block_id, week)
@@ -519,21 +685,20 @@ class LeagueCompetition(BaseCompetition):
             event_data = week_games.get(event_id)
             team_a = event_data.get('A')
             team_b = event_data.get('B')
-            won = result.get('wonMarkets')
-            x = set(won)
-            y = set(str(_) for _ in range(15, 43))
-            r = list(x & y)
-            z = r[0]
-            score = Markets['Correct_Score'][z]['name'].split('_')
+            won_markets = decode_won_markets(result.get('wonMarkets'))
+            if won_markets.score is None:
+                raise exceptions.NoResultError()
             results[event_id] = {
                 'id': event_id, 'A': team_a, 'B': team_b,
-                'score': (int(score[1]),
-                          int(score[2]))}
-            # X is won list (wonMarketIds)
-            result_ids[event_id] = [int(_) for _ in won]
+                'score': won_markets.score}
+            result_ids[event_id] = won_markets.won_ids
             winning_ids[event_id] = handicap_data
 
+        cache = self.league_cache
+        if cache is not None and not from_cache:
+            cache.put(LeagueCache.RESULTS, self.competition_id, self.league, week, data)
         self.table.feed_result(e_block_id, self.league, week, results, result_ids, winning_ids)
+        self.week_index.resolve(week)
 
         if self.fetching_future:
             not_ready = self.table.check_weeks(self.required_weeks)
@@ -550,12 +715,12 @@ class LeagueCompetition(BaseCompetition):
                 weeks = [self.get_week_by_block(week) for week in self.result_blocks]
                 missing = self.table.check_weeks(weeks)
                 if missing:
-                    await self.fetch_result(missing[0], 1)
+                    await self.fetch_result(self.get_block_by_week(missing[0]), 1)
                 else:
                     for live_session_id in self.sessions:
-                        live_session = self.user.get_live_session(live_session_id)
-                        if live_session.player.status == players.Player.RUNNING:
-                            await live_session.player.on_result(self.competition_id)
+                        player = self.user.get_live_session(live_session_id).get_player(self.competition_id)
+                        if player.status == players.Player.RUNNING:
+                            await player.on_result(self.competition_id)
 
                     # Attempt to resolve tickets and dispatch events
                     await self.user.validate_competition_tickets(self.competition_id)
@@ -563,9 +728,9 @@ class LeagueCompetition(BaseCompetition):
             elif self.phase == self.RESULTS:
                 # Always notify players of results
                 for live_session_id in self.sessions:
-                    live_session = self.user.get_live_session(live_session_id)
-                    if live_session.player.status == players.Player.RUNNING:
-                        await live_session.player.on_result(self.competition_id)
+                    player = self.user.get_live_session(live_session_id).get_player(self.competition_id)
+                    if player.status == players.Player.RUNNING:
+                        await player.on_result(self.competition_id)
                 await self.dispatch_events()
 
     # API
@@ -586,7 +751,7 @@ class LeagueCompetition(BaseCompetition):
                 e_block_id, week = self.get_next_event()
                 if e_block_id > 0:
                     self.e_block_id = e_block_id
-                    if self.get_missing_stats(week):
+                    if self.get_missing_stats(week) and not await self.load_cached_stats(week):
                         self.phase = self.EVENTS_STATS
                         await self.next_block_event()
                         return
@@ -647,14 +812,14 @@ class LeagueCompetition(BaseCompetition):
             socket_id, xs = self.user.send(resource, payload, socket_id=self.socket, method=method)
         return xs
 
-    async def receive(self, valid_response: bool, resource: str, payload: Dict):
+    async def receive(self, valid_response: bool, resource: str, payload: Dict, from_cache: bool = False):
         try:
             func_name = f'{map_resource_to_name(resource)}_callback'
-            callback = getattr(self, func_name)  # type: Callable[[bool, Dict], Coroutine[Any]]
+            callback = getattr(self, func_name)  # type: Callable[[bool, Dict, bool], Coroutine[Any]]
         except AttributeError:
             pass
         else:
-            await callback(valid_response, payload)
+            await callback(valid_response, payload, from_cache)
 
     async def wss_login_data(self):
         return {
@@ -669,21 +834,29 @@ class LeagueCompetition(BaseCompetition):
         self.jackpot_ready = True
         for live_session_id in self.sessions:
             live_session = self.user.get_live_session(live_session_id)
-            live_session.player.setup_jackpot()
+            live_session.get_player(self.competition_id).setup_jackpot()
 
     def clear_jackpot(self):
         self.jackpot_ready = False
         for live_session_id in self.sessions:
             live_session = self.user.get_live_session(live_session_id)
-            live_session.player.clear_jackpot()
+            live_session.get_player(self.competition_id).clear_jackpot()
 
     # Tickets processing
     async def process_tickets(self, tickets: List):
+        if self.cache_start_time:
+            self.cold_start_latency = time.time() - self.cache_start_time
+            self.cache_start_time = None
+            logger.info('%r Cold start to first ticket %.3fs (prefetch=%s)', self, self.cold_start_latency,
+                        settings.HISTORY_PREFETCH)
         self.reset_tickets()
         for ticket in tickets:
             content = self.serialize_ticket(ticket)
             setattr(ticket, 'content', content)
-            await self.user.register_ticket(ticket)
+            ticket.compact = compact_details(content, self.competition_id, self.participants)
+        # Registered together, the inserts of the week share a key block and a flush instead of one wait each
+        await asyncio.gather(*[self.user.register_ticket(ticket) for ticket in tickets])
+        for ticket in tickets:
             live_session = self.user.get_live_session(ticket.live_session_id)
             live_session.ticket_maps.get(self.competition_id)[ticket.ticket_key] = False
             await self.user.ticket_manager.add_ticket(ticket)
@@ -737,46 +910,63 @@ class LeagueCompetition(BaseCompetition):
 
     async def on_ticket_resolve(self, ticket: Ticket):
         live_session = self.user.get_live_session(ticket.live_session_id)
-        await live_session.player.on_ticket(ticket)
+        await live_session.get_player(ticket.game_id).on_ticket(ticket)
 
     def reset_tickets(self):
         self.active_tickets.clear()
 
     # Get Weeks info
     def get_next_event(self) -> Tuple[int, int]:
-        a = set(range(1, self.max_week + 1))
-        b = set(self.table.event_block_map)
-        c = a - b
-        if c:
-            week = min(c)
+        week = self.week_index.next_unresolved()
+        if week:
             e_block_id = self.get_block_by_week(week)
-            if isinstance(e_block_id, int) and isinstance(week, int):
+            if isinstance(e_block_id, int):
                 return e_block_id, week
         return -1, -1
 
     def get_missing_blocks(self) -> List:
-        all_weeks = set(i for i in range(1, self.max_week + 1))
-        block_weeks = set(self.blocks.values())
-        return list(all_weeks - block_weeks)
+        return self.week_index.missing_weeks()
 
     def get_missing_stats(self, week: int):
         if self.table.get_week_stats(week):
             return False
         return True
 
+    @staticmethod
+    def parse_events_stats(events: List[Dict]) -> Dict[int, Dict]:
+        stats = {}
+        for event in events:
+            event_id = event.get('eventId')
+            _data = event.get('data')
+            _stats = _data.get('stats')
+            stats[event_id] = _stats
+        return stats
+
+    async def load_cached_stats(self, week: int) -> bool:
+        cache = self.league_cache
+        if cache is None:
+            return False
+        events = await cache.lookup((LeagueCache.STATS,), self.competition_id, self.league, week)
+        if events:
+            self.table.feed_stats(week, self.parse_events_stats(events))
+            return True
+        return False
+
+    def get_features(self, week: int) -> WeekFeatures:
+        return self.features.get(self.competition_id, self.league, week, self.table, self.league_games.get(week, {}))
+
     def get_block_by_week(self, week: int) -> Optional[int]:
-        a = {v: k for k, v, in self.blocks.items()}
-        return a.get(week)
+        return self.week_index.get_block(week)
 
     def get_week_by_block(self, e_block_id: int) -> Optional[int]:
-        return self.blocks.get(e_block_id)
+        return self.week_index.get_week(e_block_id)
 
     def get_required_weeks(self):
         used_weeks = []
         for live_session_id in self.sessions:
-            live_session = self.user.get_live_session(live_session_id)
-            live_session.player.get_required_weeks(self.competition_id)
-            used_weeks.extend(live_session.player.required_weeks(self.competition_id))
+            player = self.user.get_live_session(live_session_id).get_player(self.competition_id)
+            player.get_required_weeks(self.competition_id)
+            used_weeks.extend(player.required_weeks(self.competition_id))
         all_weeks = set(i for i in range(1, self.max_week + 1))
         return list(all_weeks - set(used_weeks))
 
@@ -785,10 +975,12 @@ class LeagueCompetition(BaseCompetition):
 
     def reset_league(self, league: int):
         self.league_games.clear()
-        self.blocks.clear()
+        self.week_index.clear()
+        self.prefetching = False
         self.cached = False
         self.required_weeks.clear()
         self.league = league
+        self.features.clear()
         self.table.clear_table()
         self.table.setup_league(league)
 
@@ -839,7 +1031,9 @@ class LeagueCompetition(BaseCompetition):
 
     # Save League
     async def on_league_completed(self):
-        if self.table.is_complete():
+        if self.table.is_complete() and settings.SEASON_ARCHIVE:
+            await self.archive_competition(self.competition_id, self.league)
+        elif self.table.is_complete():
             league_info = {}
             for week, week_data in self.league_games.items():
                 week_results = self.table.get_week_results(week)
@@ -851,15 +1045,27 @@ class LeagueCompetition(BaseCompetition):
                     team_b = event_data.get('B')
                     odds = event_data.get('odds')
                     r_ids = week_result_ids.get(event_id)
-                    half_score = list(set(r_ids) & {152, 153, 154})
+                    half_score = decode_won_markets(r_ids).half_time
                     event_result = week_results.get(event_id)
                     event_stats = week_stats.get(event_id)
                     score = list(event_result.get('score'))
                     week_info[event_id] = {'t_a': team_a, 't_b': team_b, 'stats': event_stats, 'odds': odds[:3],
-                                           'score': score, 'h_score': half_score[0]}
+                                           'score': score, 'h_score': half_score}
                 league_info[week] = week_info
             await self.store_competition(self.competition_id, self.league, league_info)
 
+    async def archive_competition(self, game_id: int, league: int):
+        archive = SeasonArchive(archive_directory(settings.ARCHIVE_DIR, self.user.provider.provider_name,
+                                                  self.user.settings.odd_settings_id), game_id)
+        if archive.has_league(league):
+            return
+        records = build_records(league, competition_rows(self.league_games, self.table.results_pool,
+                                                         self.table.results_ids_pool))
+        stats = {week: self.table.get_week_stats(week) for week in self.league_games if self.table.get_week_stats(week)}
+        loop = asyncio.get_event_loop()
+        if await loop.run_in_executor(self.user.provider.thread_executor, archive.append, league, records, stats):
+            logger.debug('%r {%d} archived league=%d records=%d', self, game_id, league, len(records))
+
     async def store_competition(self, game_id: int, league: int, data: Dict):
         await dump_data(settings.DUMP_DIR + "/" + self.user.provider.provider_name, self.user.username, self.competition_id,
                         league, data)
@@ -0,0 +1,137 @@
+"""
+Per week features shared by every player of a competition.
+
+Players of one competition forecast the same week from the same table, odds and
+stats. WeekFeatures derives that data on first use and keeps it for the other
+sessions, FeatureCache drops it when the league is reset or new results or
+stats reach the table.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+from .forecast import WeekSnapshot, week_snapshot
+from .markets import market_registry
+from .table import LeagueTable, StreakScan
+
+
+def head_to_head_counts(head_to_head: List[List[str]]) -> Tuple[int, int, int]:
+    """Home wins, away wins and draws of a `teamToTeam.headToHead` list"""
+    a = b = c = 0
+    for result in head_to_head:
+        home_goals = int(result[0])
+        away_goals = int(result[1])
+        if home_goals > away_goals:
+            a += 1
+        elif home_goals < away_goals:
+            b += 1
+        else:
+            c += 1
+    return a, b, c
+
+
+class WeekFeatures:
+    def __init__(self, competition_id: int, league: Optional[int], week: int, table: LeagueTable,
+                 week_games: Dict[int, Dict]):
+        self.competition_id = competition_id
+        self.league = league
+        self.week = week
+        self.table = table
+        self.revision = table.revision
+        self.week_games = week_games
+        self._positions: Optional[Dict[str, int]] = None
+        self._team_events: Optional[Dict[str, int]] = None
+        self._markets: Dict[str, Dict[int, Optional[float]]] = {}
+        self._head_to_head: Dict[int, Tuple[int, int, int]] = {}
+        self._snapshot: Optional[WeekSnapshot] = None
+
+    def __repr__(self):
+        return '[WeekFeatures:%d:%s:%d]' % (self.competition_id, self.league, self.week)
+
+    @property
+    def scan(self) -> StreakScan:
+        return self.table.scan(self.week)
+
+    @property
+    def positions(self) -> Dict[str, int]:
+        """Team -> table position"""
+        if self._positions is None:
+            self._positions = {team_data.get('team'): team_data.get('pos') for team_data in self.table.table}
+        return self._positions
+
+    @property
+    def team_events(self) -> Dict[str, int]:
+        """Team -> event id of the team this week"""
+        if self._team_events is None:
+            team_events = {}
+            for event_id, event_data in self.week_games.items():
+                team_events[event_data.get('A')] = event_id
+                team_events[event_data.get('B')] = event_id
+            self._team_events = team_events
+        return self._team_events
+
+    @property
+    def snapshot(self) -> WeekSnapshot:
+        """Picklable copy of the week for `Player.plan`"""
+        if self._snapshot is None:
+            self._snapshot = week_snapshot(self)
+        return self._snapshot
+
+    def form(self, team, n: int) -> Tuple[int, int]:
+        """Points and played count of `team` over the `n` weeks before this one"""
+        return self.scan.team_form(team, n)
+
+    def market(self, market: str) -> Dict[int, Optional[float]]:
+        """Event id -> odd of `market` for every event of the week"""
+        values = self._markets.get(market)
+        if values is None:
+            values = {event_id: market_registry.odd_value(market, event_data.get('odds'))
+                      for event_id, event_data in self.week_games.items()}
+            self._markets[market] = values
+        return values
+
+    def odd(self, event_id: int, market: str) -> Optional[float]:
+        return self.market(market).get(event_id)
+
+    def stats(self, event_id: int) -> Dict[str, Any]:
+        return self.table.get_week_stats(self.week).get(event_id) or {}
+
+    def head_to_head(self, event_id: int) -> Tuple[int, int, int]:
+        """Home wins, away wins and draws of the event's head to head results"""
+        counts = self._head_to_head.get(event_id)
+        if counts is None:
+            team_to_team = self.stats(event_id).get('teamToTeam') or {}
+            counts = head_to_head_counts(team_to_team.get('headToHead') or [])
+            self._head_to_head[event_id] = counts
+        return counts
+
+    def winner(self, event_id: int, draw: bool = False) -> Tuple[Any, Any]:
+        """`Player.pick_winner` of the event's head to head results"""
+        a, b, c = self.head_to_head(event_id)
+        if a + b + c < 5:
+            return None, None
+        if draw:
+            a += c
+            b += c
+        if a > b:
+            return 0, a
+        if b > a:
+            return 1, b
+        return 2, a
+
+
+class FeatureCache:
+    """WeekFeatures of a competition keyed by (league, week)"""
+
+    def __init__(self):
+        self.entries: Dict[Tuple[int, int], WeekFeatures] = {}
+
+    def get(self, competition_id: int, league: Optional[int], week: int, table: LeagueTable,
+            week_games: Dict[int, Dict]) -> WeekFeatures:
+        key = (league, week)
+        features = self.entries.get(key)
+        if features is None or features.revision != table.revision or features.week_games is not week_games:
+            features = WeekFeatures(competition_id, league, week, table, week_games)
+            self.entries[key] = features
+        return features
+
+    def clear(self):
+        self.entries.clear()
@@ -0,0 +1,167 @@
+"""
+Forecasts off the event loop.
+
+A player that sets `offload` splits its forecast in two. `Player.plan` is a pure
+static function from a WeekSnapshot to TicketSpecs and runs in the provider
+thread or process executor, the rest (stakes, tickets, player state) stays on
+the loop. Snapshots hold plain data only, so they pickle for the process pool,
+and are built once per week and shared by every session of the competition.
+
+The process pool gets `plan` by module and name with the fingerprint of its
+code. A worker holding another version of the module reloads it once. If the
+code still differs, as for an instance older than the reload, the plan runs on
+the loop instead.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import importlib
+import marshal
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, TYPE_CHECKING
+
+import numpy
+
+from vbet.core import settings
+from vbet.utils.log import get_logger
+from .markets import market_registry
+from .tickets import Bet, Event, Ticket
+
+if TYPE_CHECKING:
+    from .features import WeekFeatures
+
+logger = get_logger('forecast')
+
+THREAD = 'thread'
+PROCESS = 'process'
+
+
+class StalePlan(Exception):
+    """The worker process holds another version of the plan"""
+
+
+class WeekSnapshot(NamedTuple):
+    competition_id: int
+    league: Optional[int]
+    week: int
+    max_week: int
+    standings: List[str]                # Teams in table order
+    teams: List[str]                    # Rows of `points`
+    points: numpy.ndarray               # (teams x max_week) points, -1 for weeks not played
+    week_games: Dict[int, Dict]         # Event id -> A, B, odds
+    week_stats: Dict[int, Dict]
+
+    def form(self, team, n: int) -> Tuple[int, int]:
+        """Points and played count of `team` over the `n` weeks before the snapshot week"""
+        try:
+            index = self.teams.index(team)
+        except ValueError:
+            return 0, 0
+        start = min(max(self.week - n, 1), self.max_week + 1) - 1
+        end = min(max(self.week, 1), self.max_week + 1) - 1
+        window = self.points[index, start:end]
+        played = window >= 0
+        return int(window[played].sum()), int(played.sum())
+
+    def team_event(self, team) -> Optional[int]:
+        for event_id, event_data in self.week_games.items():
+            if event_data.get('A') == team or event_data.get('B') == team:
+                return event_id
+        return None
+
+
+class TicketSpec(NamedTuple):
+    bets: List[Tuple[int, int, int]]    # Event id, week, odd id
+    data: Optional[Dict] = None         # Handed back to `Player.apply_plan`
+
+
+def week_snapshot(features: WeekFeatures) -> WeekSnapshot:
+    table = features.table
+    teams, points = table.points_matrix()
+    week_games = {event_id: {'A': event_data.get('A'), 'B': event_data.get('B'), 'odds': event_data.get('odds')}
+                  for event_id, event_data in features.week_games.items()}
+    return WeekSnapshot(features.competition_id, features.league, features.week, table.max_week,
+                        [team_data.get('team') for team_data in table.table], list(teams), points, week_games,
+                        dict(table.get_week_stats(features.week)))
+
+
+def forecast_executor(provider) -> Optional[Executor]:
+    """Executor of FORECAST_EXECUTOR, None to plan on the loop"""
+    if provider is None:
+        return None
+    if settings.FORECAST_EXECUTOR == THREAD:
+        return provider.thread_executor
+    if settings.FORECAST_EXECUTOR == PROCESS:
+        return provider.process_executor
+    return None
+
+
+def plan_fingerprint(plan: Callable) -> str:
+    return hashlib.sha1(marshal.dumps(plan.__code__)).hexdigest()
+
+
+def _find_plan(module, qualname: str) -> Optional[Callable]:
+    plan = module
+    for name in qualname.split('.'):
+        plan = getattr(plan, name, None)
+    return plan
+
+
+def run_worker_plan(module_name: str, qualname: str, fingerprint: str, snapshot: WeekSnapshot,
+                    params: Dict) -> List[TicketSpec]:
+    """`plan` of the process pool, found by name and run only when its code matches the caller's"""
+    module = importlib.import_module(module_name)
+    plan = _find_plan(module, qualname)
+    if plan is None or plan_fingerprint(plan) != fingerprint:
+        # Reloaded by the provider since this worker imported it
+        plan = _find_plan(importlib.reload(module), qualname)
+        if plan is None or plan_fingerprint(plan) != fingerprint:
+            raise StalePlan(f'{module_name}.{qualname}')
+    return plan(snapshot, params)
+
+
+async def run_plan(executor: Optional[Executor], plan: Callable[[WeekSnapshot, Dict], List[TicketSpec]],
+                   snapshot: WeekSnapshot, params: Dict) -> List[TicketSpec]:
+    if executor is None:
+        return plan(snapshot, params)
+    loop = asyncio.get_event_loop()
+    if isinstance(executor, ProcessPoolExecutor):
+        try:
+            return await loop.run_in_executor(executor, run_worker_plan, plan.__module__, plan.__qualname__,
+                                              plan_fingerprint(plan), snapshot, params)
+        except StalePlan as exc:
+            logger.warning('Plan %s changed since the worker loaded it, planning on the loop', exc)
+            return plan(snapshot, params)
+    return await loop.run_in_executor(executor, plan, snapshot, params)
+
+
+def build_ticket(competition_id: int, league: int, player: str, spec: TicketSpec,
+                 league_games: Dict[int, Dict]) -> Optional[Ticket]:
+    """Ticket of the spec with zero stakes, None when a bet no longer matches the week events"""
+    ticket = Ticket(competition_id, player)
+    for event_id, week, odd_id in spec.bets:
+        event_data = league_games.get(week, {}).get(event_id)
+        info = market_registry.get(str(odd_id))
+        if not event_data or not info:
+            return None
+        event = Event(event_id, league, week, event_data.get('participants'))
+        event.add_bet(Bet(odd_id, info.market_id, float(event_data.get('odds')[info.odd_index]), info.odd_name, 0))
+        ticket.add_event(event)
+    return ticket
+
+
+def stake_ticket(ticket: Ticket, stake: float):
+    total_odd = 1
+    for event in ticket.events:
+        for bet in event.bets:
+            bet.stake = stake
+            total_odd *= bet.odd_value
+    win = round(stake * total_odd, 2)
+    ticket._stake = stake
+    ticket._min_winning = win
+    ticket._max_winning = win
+    ticket._total_won = 0
+    ticket._grouping = 1
+    ticket._winning_count = 1
+    ticket._system_count = 1
@@ -0,0 +1,222 @@
+import asyncio
+import json
+import math
+import struct
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from vbet.utils.log import get_logger
+
+if TYPE_CHECKING:
+    import aioredis
+
+logger = get_logger('league-cache')
+
+CacheKey = Tuple[int, int, int]
+
+# Publisher gid and odd settings id in front of every published block
+MESSAGE_HEADER = struct.Struct('!BI')
+
+
+def encode_block(kind: str, competition_id: int, league: int, week: int, data: Any) -> bytes:
+    payload = json.dumps([kind, competition_id, league, week, data], separators=(',', ':'))
+    return zlib.compress(payload.encode('utf-8'))
+
+
+def decode_block(blob: bytes) -> Tuple[str, int, int, int, Any]:
+    kind, competition_id, league, week, data = json.loads(zlib.decompress(blob).decode('utf-8'))
+    return kind, competition_id, league, week, data
+
+
+def encode_message(gid: int, odd_settings_id: int, blob: bytes) -> bytes:
+    return MESSAGE_HEADER.pack(gid, odd_settings_id) + blob
+
+
+def decode_message(message: bytes) -> Tuple[int, int, Tuple[str, int, int, int, Any]]:
+    try:
+        gid, odd_settings_id = MESSAGE_HEADER.unpack_from(message)
+        return gid, odd_settings_id, decode_block(message[MESSAGE_HEADER.size:])
+    except (struct.error, zlib.error) as exc:
+        raise ValueError('Invalid league message') from exc
+
+
+class LeagueCache:
+    """
+    Provider wide store of public league blocks keyed by (competition_id, league, week).
+
+    Competitions of every user on the provider read history, results and stats from
+    here and only hit the websocket on a miss. A miss is claimed by the first
+    competition asking for it, later competitions wait on the in flight fetch instead
+    of sending the same request again.
+    """
+    HISTORY = 'history'     # History blocks with results
+    FIXTURES = 'fixtures'   # History blocks of weeks not yet played
+    RESULTS = 'results'
+    STATS = 'stats'
+
+    entries: Dict[CacheKey, Dict[str, Any]]
+    in_flight: Dict[Tuple[str, int, int, int], Tuple[float, asyncio.Future]]
+    leagues: Dict[int, List[int]]
+
+    def __init__(self, max_leagues: int, wait_timeout: float):
+        self.max_leagues = max_leagues
+        self.wait_timeout = wait_timeout
+        self.entries = {}
+        self.in_flight = {}
+        self.leagues = {}
+        self.hits = 0
+        self.misses = 0
+
+    def lookup_local(self, kinds: Tuple[str, ...], competition_id: int, league: int, week: int) -> Optional[Any]:
+        """Data of the first of `kinds` held for the week"""
+        entry = self.entries.get((competition_id, league, week))
+        data = None
+        if entry:
+            for kind in kinds:
+                data = entry.get(kind)
+                if data is not None:
+                    break
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    async def lookup(self, kinds: Tuple[str, ...], competition_id: int, league: int, week: int) -> Optional[Any]:
+        return self.lookup_local(kinds, competition_id, league, week)
+
+    async def acquire(self, kinds: Tuple[str, ...], competition_id: int, league: int,
+                      week: int) -> Tuple[Optional[Any], Optional[asyncio.Future]]:
+        """
+        Cached data of the week, else the future of the fetch in flight for the last
+        of `kinds`. Returns (None, None) when the caller owns the fetch.
+        """
+        data = await self.lookup(kinds, competition_id, league, week)
+        if data is not None:
+            return data, None
+        return None, self.claim(kinds[-1], competition_id, league, week)
+
+    def put(self, kind: str, competition_id: int, league: int, week: int, data: Any):
+        self.track_league(competition_id, league)
+        entry = self.entries.setdefault((competition_id, league, week), {})
+        entry[kind] = data
+        self.resolve(kind, competition_id, league, week, data)
+        if kind == self.HISTORY:
+            self.resolve(self.FIXTURES, competition_id, league, week, data)
+
+    def claim(self, kind: str, competition_id: int, league: int, week: int) -> Optional[asyncio.Future]:
+        """
+        Register a fetch of the key. Returns None when the caller owns the fetch,
+        otherwise the future of the fetch already in flight.
+        """
+        key = (kind, competition_id, league, week)
+        now = time.time()
+        current = self.in_flight.get(key)
+        if current is not None:
+            claim_time, future = current
+            if not future.done() and now - claim_time < self.wait_timeout:
+                return future
+        self.in_flight[key] = (now, asyncio.get_event_loop().create_future())
+        return None
+
+    def resolve(self, kind: str, competition_id: int, league: int, week: int, data: Any):
+        current = self.in_flight.pop((kind, competition_id, league, week), None)
+        if current is not None and not current[1].done():
+            current[1].set_result(data)
+
+    async def wait(self, futures: List[asyncio.Future]) -> List[Any]:
+        """Results of in flight fetches completed within the wait timeout"""
+        if not futures:
+            return []
+        done, _ = await asyncio.wait([asyncio.shield(future) for future in futures], timeout=self.wait_timeout)
+        return [task.result() for task in done if not task.cancelled()]
+
+    def track_league(self, competition_id: int, league: int):
+        leagues = self.leagues.setdefault(competition_id, [])
+        if league in leagues:
+            return
+        leagues.append(league)
+        while len(leagues) > self.max_leagues:
+            self.drop_league(competition_id, leagues.pop(0))
+
+    def drop_league(self, competition_id: int, league: int):
+        for key in [key for key in self.entries if key[0] == competition_id and key[1] == league]:
+            del self.entries[key]
+        logger.debug('Dropped league %d competition %d', league, competition_id)
+
+    def clear(self):
+        self.entries.clear()
+        self.leagues.clear()
+        for _, future in self.in_flight.values():
+            future.cancel()
+        self.in_flight.clear()
+
+
+class SharedLeagueCache(LeagueCache):
+    """
+    LeagueCache shared by the provider workers of a backend through redis.
+
+    Blocks fetched by a worker are stored under a redis key and published on the
+    backend league channel. Misses are claimed across workers with a short lived
+    claim key, so only one worker fetches a block while the others wait for it to
+    be published.
+    """
+    redis: 'aioredis.Redis'
+
+    def __init__(self, max_leagues: int, wait_timeout: float, redis: 'aioredis.Redis', namespace: str,
+                 gid: int, odd_settings_id: int, ttl: int):
+        super().__init__(max_leagues, wait_timeout)
+        self.redis = redis
+        self.namespace = namespace
+        self.gid = gid
+        self.odd_settings_id = odd_settings_id
+        self.ttl = ttl
+
+    @staticmethod
+    def channel_name(namespace: str) -> str:
+        return f'{namespace}_league'
+
+    def key(self, kind: str, competition_id: int, league: int, week: int) -> str:
+        return f'{self.namespace}_league_{self.odd_settings_id}_{kind}_{competition_id}_{league}_{week}'
+
+    def put(self, kind: str, competition_id: int, league: int, week: int, data: Any, publish: bool = True):
+        # A block already held was taken from redis or the channel, its fetcher published it
+        held = kind in self.entries.get((competition_id, league, week), ())
+        super().put(kind, competition_id, league, week, data)
+        if publish and not held:
+            asyncio.create_task(self.publish(kind, competition_id, league, week, data))
+
+    async def publish(self, kind: str, competition_id: int, league: int, week: int, data: Any):
+        blob = encode_block(kind, competition_id, league, week, data)
+        pipe = self.redis.pipeline()
+        pipe.set(self.key(kind, competition_id, league, week), blob, expire=self.ttl)
+        pipe.publish(self.channel_name(self.namespace), encode_message(self.gid, self.odd_settings_id, blob))
+        await pipe.execute()
+
+    async def lookup(self, kinds: Tuple[str, ...], competition_id: int, league: int, week: int) -> Optional[Any]:
+        data = self.lookup_local(kinds, competition_id, league, week)
+        if data is None:
+            for kind in kinds:
+                blob = await self.redis.get(self.key(kind, competition_id, league, week))
+                if blob is not None:
+                    data = decode_block(blob)[4]
+                    super().put(kind, competition_id, league, week, data)
+                    break
+        return data
+
+    async def acquire(self, kinds: Tuple[str, ...], competition_id: int, league: int,
+                      week: int) -> Tuple[Optional[Any], Optional[asyncio.Future]]:
+        data, future = await super().acquire(kinds, competition_id, league, week)
+        if data is not None or future is not None:
+            return data, future
+        claimed = await self.redis.set(self.key(kinds[-1], competition_id, league, week) + '_claim', self.gid,
+                                       expire=math.ceil(self.wait_timeout), exist=self.redis.SET_IF_NOT_EXIST)
+        if claimed:
+            return None, None
+        # Another worker owns the fetch, its publish resolves the local claim
+        current = self.in_flight.get((kinds[-1], competition_id, league, week))
+        data = await self.lookup(kinds, competition_id, league, week)
+        if data is not None or current is None:
+            return data, None
+        return None, current[1]
@@ -1,3 +1,6 @@
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, NamedTuple, Optional, Tuple, Union
+
 Markets = {
 	'Match_Result': {'0': {'name': 'Home', 'key': '0'}, '1': {'name': 'Away', 'key': '1'},
 					 '2': {'name': 'Draw', 'key': '2'}},
@@ -128,3 +131,173 @@ Markets = {
 	'Over_Under_2_25': {'239': {'name': 'under2_25', 'key': '183'}, '240': {'name': 'over2_25', 'key': '184'}},
 	'Over_Under_2_75': {'241': {'name': 'under2_75', 'key': '185'}, '242': {'name': 'over2_75', 'key': '186'}}
 }
+
+
+CORRECT_SCORE = 'Correct_Score'
+HALF_TIME = 'First_Half'
+TOTAL_GOALS = 'Total_Goals'
+OVER_UNDER = 'Over_Under'
+HANDICAP = 'Handicap'
+
+
+class WonMarkets(NamedTuple):
+	score: Optional[Tuple[int, int]]
+	half_time: Optional[int]
+	total_goals: Optional[int]
+	totals: Tuple[Tuple[str, float], ...]
+	handicap: Tuple[Tuple[str, float], ...]
+	won_ids: FrozenSet[int]
+
+
+def _market_line(value: str) -> float:
+	# '1_75' -> 1.75, '2' -> 2.0
+	return float(value.replace('_', '.', 1))
+
+
+def _decode_outcome(market_type: str, odd_name: str) -> Optional[Tuple[str, Any]]:
+	if market_type == CORRECT_SCORE:
+		_, home, away = odd_name.split('_')
+		return CORRECT_SCORE, (int(home), int(away))
+	if market_type == HALF_TIME:
+		return HALF_TIME, odd_name.split('_')[1]
+	if market_type == TOTAL_GOALS:
+		return TOTAL_GOALS, int(odd_name.split('_')[1])
+	if market_type.startswith('Over_Under_'):
+		side = 'over' if odd_name.startswith('over') else 'under'
+		return OVER_UNDER, (side, _market_line(market_type[len('Over_Under_'):]))
+	if market_type.startswith('Handicap_'):
+		parts = odd_name.split('_', 2)
+		if len(parts) == 2:
+			return HANDICAP, (parts[0], 0.0)
+		sign = -1 if parts[1] == 'Minus' else 1
+		return HANDICAP, (parts[0], sign * _market_line(parts[2]))
+	return None
+
+
+def _build_outcomes() -> Mapping[int, Tuple[str, Any]]:
+	outcomes = {}
+	for market_type, market_data in Markets.items():
+		for odd_id, odd_data in market_data.items():
+			outcome = _decode_outcome(market_type, odd_data.get('name'))
+			if outcome:
+				outcomes[int(odd_id)] = outcome
+	return MappingProxyType(outcomes)
+
+
+# Odd id -> (market kind, decoded value), built once at import
+MarketOutcomes = _build_outcomes()
+
+# Match result -> won Double_Chance odd ids, both teams scored -> won GoalGoal_NoGoal odd id
+DOUBLE_CHANCE = {result: frozenset(int(odd_id) for odd_id, odd_data in Markets['Double_Chance'].items()
+								   if result in odd_data.get('name').split('_'))
+				 for result in ('Home', 'Away', 'Draw')}
+GOAL_GOAL = {odd_data.get('name') == 'gg': int(odd_id) for odd_id, odd_data in Markets['GoalGoal_NoGoal'].items()}
+
+
+def decode_won_markets(won_markets: Iterable) -> WonMarkets:
+	won_ids = frozenset(int(_) for _ in won_markets)
+	score = None
+	half_time = None
+	total_goals = None
+	totals = []
+	handicap = []
+	for odd_id in won_ids:
+		outcome = MarketOutcomes.get(odd_id)
+		if outcome is None:
+			continue
+		kind, value = outcome
+		if kind == CORRECT_SCORE:
+			score = value
+		elif kind == HALF_TIME:
+			half_time = odd_id
+		elif kind == TOTAL_GOALS:
+			total_goals = value
+		elif kind == OVER_UNDER:
+			totals.append(value)
+		else:
+			handicap.append(value)
+	return WonMarkets(score, half_time, total_goals, tuple(totals), tuple(handicap), won_ids)
+
+
+def score_won_ids(score: Tuple[int, int], half_time: Optional[int] = None) -> FrozenSet[int]:
+	"""
+	Won odd ids derivable from a final score: match result, double chance, goal
+	goal/no goal, correct score, total goals and half goal over/under lines, plus
+	the half time odd id when known.
+	"""
+	home, away = score
+	total = home + away
+	result = 'Home' if home > away else 'Away' if away > home else 'Draw'
+	won = {0 if home > away else 1 if away > home else 2, GOAL_GOAL[home > 0 and away > 0]}
+	won.update(DOUBLE_CHANCE[result])
+	for odd_id, (kind, value) in MarketOutcomes.items():
+		if kind == CORRECT_SCORE:
+			if value == (home, away):
+				won.add(odd_id)
+		elif kind == TOTAL_GOALS:
+			if value == min(total, 6):
+				won.add(odd_id)
+		elif kind == OVER_UNDER:
+			side, line = value
+			if line % 1 == 0.5 and (total > line) == (side == 'over'):
+				won.add(odd_id)
+	if half_time is not None:
+		won.add(half_time)
+	return frozenset(won)
+
+
+class MarketInfo(NamedTuple):
+	odd_id: int
+	market_id: str
+	odd_name: str
+	odd_index: int
+	partners: Tuple[int, ...]
+
+
+class MarketRegistry:
+	"""Constant time market lookups by odd id, odd name and odds vector index"""
+
+	def __init__(self, markets: Dict[str, Dict]):
+		self._by_id: Dict[Union[int, str], MarketInfo] = {}
+		self._by_name: Dict[str, MarketInfo] = {}
+		self._by_index: Dict[int, MarketInfo] = {}
+		self._groups: Dict[str, Tuple[MarketInfo, ...]] = {}
+		for market_id, market_data in markets.items():
+			odd_ids = tuple(int(_) for _ in market_data)
+			group = []
+			for key, odd_data in market_data.items():
+				odd_id = int(key)
+				info = MarketInfo(odd_id, market_id, odd_data.get('name'), int(odd_data.get('key')),
+								  tuple(_ for _ in odd_ids if _ != odd_id))
+				# Players pass odd ids both as int and str
+				self._by_id[odd_id] = info
+				self._by_id[key] = info
+				self._by_name[info.odd_name] = info
+				self._by_index[info.odd_index] = info
+				group.append(info)
+			self._groups[market_id] = tuple(group)
+
+	def get(self, odd_id: Union[int, str]) -> Optional[MarketInfo]:
+		return self._by_id.get(odd_id)
+
+	def by_name(self, odd_name: str) -> Optional[MarketInfo]:
+		return self._by_name.get(odd_name)
+
+	def by_index(self, odd_index: int) -> Optional[MarketInfo]:
+		return self._by_index.get(odd_index)
+
+	def group(self, market_id: str) -> Tuple[MarketInfo, ...]:
+		return self._groups.get(market_id, ())
+
+	def partners(self, odd_id: Union[int, str]) -> Tuple[int, ...]:
+		info = self._by_id.get(odd_id)
+		return info.partners if info else ()
+
+	def odd_value(self, odd_id: Union[int, str], odds: List) -> float:
+		info = self._by_id.get(odd_id)
+		if info:
+			return float(odds[info.odd_index])
+		return -1
+
+
+market_registry = MarketRegistry(Markets)
@@ -1,19 +1,19 @@
 """
-Import all players
+Players, imported on first use through the registry
 """
-from importlib import import_module
 from pathlib import Path
-from pkgutil import iter_modules
 
 from .base import Player
+from .registry import PlayerRegistry
 
-__all__ = []
-package_dir = Path(__file__).resolve().parent
-modules = []
-for (_, module_name, _) in iter_modules([package_dir]):
-    module = import_module(f"{__name__}.{module_name}")
-    name = getattr(module, 'NAME', None)
-    if name:
-        if name != 'player':
-            cls = getattr(module, 'CustomPlayer')
-            setattr(module, name.capitalize(), type(name.capitalize(), (cls,), {}))
+__all__ = ['Player', 'registry']
+
+registry = PlayerRegistry(__name__, Path(__file__).resolve().parent)
+
+
+def __getattr__(name: str):
+    # `getattr(players, name)` of a player module not loaded yet
+    module = registry.module(name) if not name.startswith('_') else None
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    return module
@@ -1,15 +1,17 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Any, List, Tuple, TYPE_CHECKING, Dict
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
 
 from vbet.core.mixin import StatusMap
-from vbet.game.markets import Markets
+from vbet.game.forecast import TicketSpec, WeekSnapshot, build_ticket, forecast_executor, run_plan, stake_ticket
+from vbet.game.markets import market_registry
 from vbet.game.tickets import Ticket
 from vbet.utils.log import get_logger
 
 if TYPE_CHECKING:
     from vbet.game.competition import LeagueCompetition
+    from vbet.game.features import WeekFeatures
     from vbet.game.session import LiveSession
 
 NAME = 'player'
@@ -34,6 +36,8 @@ class Player(StatusMap):
     future_weeks: List[int]
     is_random: bool
     game_map: Dict[int, bool]
+    offload: bool = False   # Forecast through the pure `plan`, off the loop when FORECAST_EXECUTOR is set
+    account_data: Optional[Dict] = None     # Session account when the session config names none
 
     def __init__(self, name: str = None, **kwargs):
         self.live_session = kwargs.get('live_session')
@@ -67,7 +71,10 @@ class Player(StatusMap):
         # competition = self.live_session.user.get_competition(competition_id)
         tickets = []  # type: List[Ticket]
         if self.can_forecast(competition_id):
-            tickets = await self.forecast(competition_id, week)
+            if self.offload:
+                tickets = await self.forecast_plan(competition_id, week)
+            else:
+                tickets = await self.forecast(competition_id, week)
         return tickets
 
     async def on_result(self, competition_id: int):
@@ -90,6 +97,44 @@ class Player(StatusMap):
     async def forecast(self, competition_id: int, week: int) -> List[Ticket]:
         return []
 
+    async def forecast_plan(self, competition_id: int, week: int) -> List[Ticket]:
+        snapshot = self.get_features(competition_id, week).snapshot
+        executor = forecast_executor(self.live_session.user.provider)
+        specs = await run_plan(executor, type(self).plan, snapshot, self.plan_params(competition_id))
+        if self.live_session.get_player(competition_id) is not self:
+            # The competition moved to a reloaded instance while planning
+            return []
+        return await self.apply_plan(competition_id, week, specs)
+
+    def plan_params(self, competition_id: int) -> Dict:
+        """Picklable player state `plan` needs"""
+        return {}
+
+    @staticmethod
+    def plan(snapshot: WeekSnapshot, params: Dict) -> List[TicketSpec]:
+        """Tickets of the week from the snapshot alone, may run in another thread or process"""
+        return []
+
+    async def apply_plan(self, competition_id: int, week: int, specs: List[TicketSpec]) -> List[Ticket]:
+        """Staked tickets of the specs, back on the loop"""
+        competition = self.live_session.user.get_competition(competition_id)
+        tickets = []
+        for spec in specs:
+            ticket = build_ticket(competition_id, competition.league, self.name, spec, competition.league_games)
+            if ticket is None:
+                continue
+            total_odd = 1
+            for event in ticket.events:
+                for bet in event.bets:
+                    total_odd *= bet.odd_value
+            stake_ticket(ticket, await self.live_session.account.get_stake(odd_value=total_odd))
+            tickets.append(ticket)
+        return tickets
+
+    def get_features(self, competition_id: int, week: int) -> WeekFeatures:
+        """Features of the week shared with every other player of the competition"""
+        return self.live_session.user.get_competition(competition_id).get_features(week)
+
     async def wss_login_data(self):
         return {
             'status': self.status,
@@ -171,19 +216,14 @@ class Player(StatusMap):
 
     @staticmethod
     def get_market_info(market: str) -> Tuple[Any, Any, Any]:
-        for market_type, market_data in Markets.items():
-            if market in market_data:
-                data = market_data.get(market)
-                if data:
-                    return market_type, data.get('name'), int(data.get('key'))
+        info = market_registry.get(market)
+        if info:
+            return info.market_id, info.odd_name, info.odd_index
         return None, None, None
 
     @staticmethod
     def get_market(market: str, odds: List[float]):
-        market_id, odd_name, odd_index = Player.get_market_info(market)
-        if market_id:
-            return float(odds[odd_index])
-        return -1
+        return market_registry.odd_value(market, odds)
 
     @staticmethod
     def is_sublist(a, b):
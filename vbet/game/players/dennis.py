@@ -1,5 +1,4 @@
 from typing import Dict
-import operator
 import secrets
 from collections import Counter
 
@@ -27,15 +26,12 @@ class CustomPlayer(Player):
         game_data = self.game_hash.get(competition_id, {})
         if not game_data:
             table = competition.table.table.copy()
+            scan = competition.table.scan(active_week)
             for top_player in table[len(table) - 3:]:
-                streak = top_player.get('streak')
-                t_streak = sorted(streak.items(), key=operator.itemgetter(0))
-                f_streak = t_streak[active_week - (self.match_past + 1):active_week - 1]
-                u_streak = [x[1] for x in f_streak if isinstance(x[1], int)]
-                if len(u_streak) >= self.match_past:
-                    if sum(u_streak) < 1:
-                        v_streak = t_streak[active_week: active_week + self.match_future]
-                        if len(v_streak) >= self.match_future:
+                points, played = scan.team_form(top_player.get('team'), self.match_past)
+                if played >= self.match_past:
+                    if points < 1:
+                        if scan.remaining() >= self.match_future:
                             logger.info('%r Possible event League : %d Week: %d', competition, competition.league,
                                         active_week)
                             game_data['team'] = top_player.get('team')
@@ -25,15 +25,12 @@ class CustomPlayer(Player):
         game_data = self.game_hash.get(competition_id, {})
         if not game_data:
             table = competition.table.table.copy()
+            scan = competition.table.scan(active_week)
             for top_player in table[len(table) - 2:]:
-                streak = top_player.get('streak')
-                t_streak = sorted(streak.items(), key=operator.itemgetter(0))
-                f_streak = t_streak[active_week - 6:active_week - 1]
-                u_streak = [x[1] for x in f_streak if isinstance(x[1], int)]
-                if len(u_streak) >= 5:
-                    if sum(u_streak) < 1:
-                        v_streak = t_streak[active_week: active_week + 9]
-                        if len(v_streak) >= 9:
+                points, played = scan.team_form(top_player.get('team'), 5)
+                if played >= 5:
+                    if points < 1:
+                        if scan.remaining() >= 9:
                             logger.info('%r Attempting match League : %d Week: %d', competition, competition.league,
                                         active_week)
                             game_data['team'] = top_player.get('team')
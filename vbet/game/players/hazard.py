@@ -3,7 +3,8 @@ from typing import Dict, List, Tuple
 import operator
 import sys
 import secrets
-from vbet.game.tickets import Bet, Event, Ticket
+from vbet.game.forecast import TicketSpec, WeekSnapshot
+from vbet.game.tickets import Ticket
 from vbet.utils.log import get_logger, async_exception_logger
 from .base import Player
 from collections import Counter
@@ -21,66 +22,30 @@ class CustomPlayer(Player):
         self.shutdown_event.set()
         self.game_hash = {key: {} for key in self.live_session.competitions.keys()}
 
+    offload = True
+
+    def plan_params(self, competition_id: int) -> Dict:
+        return {'team': self.game_hash.get(competition_id, {}).get('team')}
+
+    @staticmethod
+    def plan(snapshot: WeekSnapshot, params: Dict) -> List[TicketSpec]:
+        team = params.get('team')
+        if not team:
+            for table_team in snapshot.standings:
+                if snapshot.team_event(table_team) is not None:
+                    team = table_team
+        event_id = snapshot.team_event(team) if team else None
+        if event_id is None:
+            return []
+        return [TicketSpec([(event_id, snapshot.week, 51)], {'team': team})]
+
     @async_exception_logger('forecast')
-    async def forecast(self, competition_id, active_week: int):
-        competition = self.live_session.user.get_competition(competition_id)
-        league_games = competition.league_games  # type: Dict[int, Dict]
-        week_games = league_games.get(active_week)  # type: Dict[int, Dict]
-        week_stats = competition.table.get_week_stats(active_week)
+    async def apply_plan(self, competition_id: int, week: int, specs: List[TicketSpec]) -> List[Ticket]:
         game_data = self.game_hash.get(competition_id, {})
-        if not game_data:
-            table = competition.table.table  # type: List[Dict]
-            for team_data in table:
-                team = team_data.get('team')
-                for event_id, event_data in week_games.items():
-                    player_a = event_data.get('A')
-                    player_b = event_data.get('B')
-                    if player_a == team or player_b == team:
-                        if player_a == team:
-                            opponent = player_b
-                            odd_id = 51
-                        else:
-                            opponent = player_a
-                            odd_id = 51
-                        self.team = team
-                        game_data['team'] = team
-                        break
-        if not game_data:
-            return []
-        team = game_data.get('team')
-        ticket = Ticket(competition.competition_id, self.name)
-        for event_id, event_data in week_games.items():
-            odds = event_data.get('odds')
-            player_a = event_data.get('A')
-            player_b = event_data.get('B')
-            if player_a == team or player_b == team:
-                participants = event_data.get('participants')
-                event = Event(event_id, competition.league, active_week, participants)
-                ticket.add_event(event)
-                market_id, odd_name, odd_index = Player.get_market_info(str(odd_id))
-                odd_value = float(odds[odd_index])
-                bet = Bet(odd_id, market_id, odd_value, odd_name, 0)
-                event.add_bet(bet)
-                break
-            else:
-                continue
-        stake = await self.live_session.account.get_stake(odd_value=odd_value)
-        total_odd = 1
-        for event in ticket.events:
-            for bet in event.bets:
-                bet.stake = stake
-                total_odd *= bet.odd_value
-        win = round(stake * total_odd, 2)
-        min_win = win
-        max_win = win
-        ticket._stake = stake
-        ticket._min_winning = min_win
-        ticket._max_winning = max_win
-        ticket._total_won = 0
-        ticket._grouping = 1
-        ticket._winning_count = 1
-        ticket._system_count = 1
-        return [ticket]
+        for spec in specs:
+            self.team = spec.data.get('team')
+            game_data['team'] = self.team
+        return await super().apply_plan(competition_id, week, specs)
 
     async def on_new_league(self, competition_id: int):
         self.game_map[competition_id] = True
@@ -0,0 +1,145 @@
+"""
+Runtime registry of player classes.
+
+Player modules are imported the first time a session asks for them. Modules and
+strategies can be loaded, reloaded and unloaded while the provider runs, either
+directly or by publishing a command on the players channel:
+
+    {"action": "reload", "name": "alpha"}
+
+Every change bumps the player generation. Running sessions keep their instance
+and each of their competitions moves to an instance of the new class on its
+next `on_new_league`.
+"""
+import importlib
+import sys
+import types
+from pathlib import Path
+from pkgutil import iter_modules
+from typing import Dict, List, Optional, Type
+
+from vbet.utils.log import get_logger
+from .base import Player
+from .strategy import load_strategies, strategy_player
+
+logger = get_logger('player-registry')
+
+
+class PlayerRegistry:
+    LOAD = 'load'
+    RELOAD = 'reload'
+    UNLOAD = 'unload'
+
+    # Package modules that are not players
+    SUPPORT_MODULES = {'base', 'registry', 'strategy'}
+
+    classes: Dict[str, Type[Player]]
+    generations: Dict[str, int]
+    strategies: Optional[Dict[str, Dict]]
+
+    def __init__(self, package_name: str, package_dir: Path):
+        self.package_name = package_name
+        self.package_dir = package_dir
+        self.classes = {}
+        self.generations = {}
+        self.strategies = None
+
+    def __repr__(self):
+        return '[PlayerRegistry:%d]' % len(self.classes)
+
+    @property
+    def package(self) -> types.ModuleType:
+        return sys.modules[self.package_name]
+
+    def module_names(self) -> List[str]:
+        return [name for _, name, _ in iter_modules([str(self.package_dir)]) if name not in self.SUPPORT_MODULES]
+
+    def strategy_definitions(self, refresh: bool = False) -> Dict[str, Dict]:
+        if self.strategies is None or refresh:
+            self.strategies = load_strategies()
+        return self.strategies
+
+    def names(self) -> List[str]:
+        """Every available player, loaded or not"""
+        names = self.module_names()
+        names.extend(name for name in self.strategy_definitions() if name not in names)
+        return names
+
+    def generation(self, name: str) -> int:
+        return self.generations.get(name, 0)
+
+    def get(self, name: str) -> Type[Player]:
+        cls = self.classes.get(name)
+        if cls is None:
+            cls = self.load(name)
+        return cls
+
+    def current(self, name: str) -> Optional[Type[Player]]:
+        """Loaded class of the player, None when unloaded"""
+        return self.classes.get(name)
+
+    def module(self, name: str) -> Optional[types.ModuleType]:
+        if name not in self.classes:
+            try:
+                self.load(name)
+            except ValueError:
+                return None
+        return getattr(self.package, name, None)
+
+    def load(self, name: str, reload: bool = False) -> Type[Player]:
+        full_name = f'{self.package_name}.{name}'
+        if name in self.module_names():
+            module = sys.modules.get(full_name)
+            if module is None:
+                module = importlib.import_module(full_name)
+            elif reload:
+                module = importlib.reload(module)
+            if getattr(module, 'NAME', None) != name:
+                raise ValueError(f'Player module {name} has NAME {getattr(module, "NAME", None)}')
+            cls = type(name.capitalize(), (getattr(module, 'CustomPlayer'),), {'__module__': full_name})
+        else:
+            definition = self.strategy_definitions(refresh=reload).get(name)
+            if definition is None:
+                raise ValueError(f'Unknown player {name}')
+            module = types.ModuleType(full_name)
+            module.NAME = name
+            cls = strategy_player(name, definition)
+        setattr(module, name.capitalize(), cls)
+        setattr(self.package, name, module)
+        self.classes[name] = cls
+        self.generations[name] = self.generation(name) + 1
+        logger.info('%r Loaded player %s generation %d', self, name, self.generations[name])
+        return cls
+
+    def reload(self, name: str) -> Type[Player]:
+        return self.load(name, reload=True)
+
+    def unload(self, name: str):
+        """Forget the player, sessions keep the instances they hold"""
+        self.classes.pop(name, None)
+        self.generations[name] = self.generation(name) + 1
+        sys.modules.pop(f'{self.package_name}.{name}', None)
+        if name in self.package.__dict__:
+            delattr(self.package, name)
+        logger.info('%r Unloaded player %s', self, name)
+
+    def handle(self, command: Dict) -> bool:
+        """Apply a players channel command, False when it is invalid or fails"""
+        action = command.get('action')
+        name = command.get('name')
+        if not isinstance(name, str) or name in self.SUPPORT_MODULES:
+            return False
+        try:
+            if action == self.LOAD:
+                self.load(name)
+            elif action == self.RELOAD:
+                self.reload(name)
+            elif action == self.UNLOAD:
+                self.unload(name)
+            else:
+                return False
+        except Exception as exc:
+            # A broken module must not take the provider down, sessions keep the old class
+            logger.error('%r Player %s %s failed: %r', self, name, action, exc)
+            return False
+        return True
@@ -0,0 +1,286 @@
+"""
+Declarative table strategies.
+
+A strategy is a plain definition instead of a player module:
+
+    'leader_form': {
+        'select': {                                     # Every rule must hold
+            'rank': [1, 1],                             # Table positions, negatives count from the bottom
+            'form': {'weeks': 5, 'min': 13},            # Points over the last weeks, all of them played
+            'run': {'result': 'win', 'min': 3},         # Consecutive results ending last week
+            'count': {'result': 'draw', 'weeks': 6, 'max': 1},
+            'side': 'home',                             # Team plays home or away this week
+        },
+        'market': 'team',                               # team, opponent, draw or {'home': odd id, 'away': odd id}
+        'odds': [1.3, None],                            # Min and max odd of the market
+        'limit': 1,                                     # Tickets per week, best placed teams first
+        'weeks': [6, 36],                               # Weeks played, the others are fetched ahead
+        'remaining': 2,                                 # Weeks left in the season after the bet
+        'account': {'account_id': 2, 'options': {'stake': 10}},    # Staking when the session names none
+    }
+
+Definitions come from `Strategies` and the JSON files of STRATEGY_DIR. The
+players loader registers each one as a StrategyPlayer subclass, so sessions
+select them by name like any player module. Rules compile to masks over the
+week's streak scan, every strategy of a competition reuses the same arrays.
+"""
+import json
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy
+
+from vbet.core import settings
+from vbet.game.forecast import TicketSpec, WeekSnapshot
+from vbet.game.markets import market_registry
+from vbet.game.table import StreakScan
+from .base import Player
+
+Strategies = {
+    'leader_form': {
+        'select': {'rank': [1, 1], 'form': {'weeks': 5, 'min': 13}},
+        'market': 'team',
+        'odds': [1.3, None],
+        'remaining': 1,
+    },
+    'bottom_fade': {
+        'select': {'rank': [-3, -1], 'form': {'weeks': 5, 'max': 0}},
+        'market': 'opponent',
+        'odds': [1.2, None],
+        'limit': 1,
+        'remaining': 1,
+    },
+}
+
+RESULTS = {'win': StreakScan.WIN, 'draw': StreakScan.DRAW, 'loss': StreakScan.LOSS}
+MARKETS = {'team': ('0', '1'), 'opponent': ('1', '0'), 'draw': ('2', '2')}
+DEFINITION_KEYS = {'select', 'market', 'odds', 'limit', 'weeks', 'remaining', 'account'}
+SELECT_KEYS = {'rank', 'form', 'run', 'count', 'side'}
+
+Rule = Callable[['WeekArrays'], numpy.ndarray]
+
+
+class WeekArrays:
+    """Per team arrays of a snapshot, rows in `scan.teams` order"""
+
+    def __init__(self, snapshot: WeekSnapshot):
+        self.snapshot = snapshot
+        self.scan = StreakScan(snapshot.league, snapshot.week, snapshot.teams, snapshot.points)
+        size = len(snapshot.teams)
+        team_index = self.scan.team_index
+        self.rank = numpy.zeros(size, dtype=numpy.int16)
+        for pos, team in enumerate(snapshot.standings, 1):
+            if team in team_index:
+                self.rank[team_index[team]] = pos
+        self.ranked = len(snapshot.standings)
+        self.event = numpy.full(size, -1, dtype=numpy.int64)
+        self.home = numpy.zeros(size, dtype=bool)
+        self.odds: Dict[int, List[float]] = {}
+        for event_id, event_data in snapshot.week_games.items():
+            self.odds[event_id] = event_data.get('odds')
+            for team, home in ((event_data.get('A'), True), (event_data.get('B'), False)):
+                index = team_index.get(team)
+                if index is not None:
+                    self.event[index] = event_id
+                    self.home[index] = home
+        self._markets: Dict[Tuple[str, str], numpy.ndarray] = {}
+
+    def market_odds(self, home_odd: str, away_odd: str) -> numpy.ndarray:
+        """Odd of every team's market this week, nan for teams without an event"""
+        odds = self._markets.get((home_odd, away_odd))
+        if odds is None:
+            odds = numpy.full(len(self.event), numpy.nan)
+            for index in numpy.flatnonzero(self.event >= 0).tolist():
+                odd_id = home_odd if self.home[index] else away_odd
+                odds[index] = market_registry.odd_value(odd_id, self.odds[int(self.event[index])])
+            self._markets[(home_odd, away_odd)] = odds
+        return odds
+
+
+# Snapshots shared by the strategies of a week, the newest few are kept
+_week_arrays: Dict[int, WeekArrays] = {}
+_compiled: Dict[str, 'Strategy'] = {}
+
+
+def week_arrays(snapshot: WeekSnapshot) -> WeekArrays:
+    arrays = _week_arrays.get(id(snapshot))
+    if arrays is None or arrays.snapshot is not snapshot:
+        if len(_week_arrays) >= 16:
+            _week_arrays.clear()
+        arrays = WeekArrays(snapshot)
+        _week_arrays[id(snapshot)] = arrays
+    return arrays
+
+
+def bounds_rule(values: Callable[[WeekArrays], numpy.ndarray], lo: Optional[float], hi: Optional[float]) -> Rule:
+    def rule(arrays: WeekArrays) -> numpy.ndarray:
+        data = values(arrays)
+        mask = numpy.ones(len(data), dtype=bool)
+        if lo is not None:
+            mask &= data >= lo
+        if hi is not None:
+            mask &= data <= hi
+        return mask
+    return rule
+
+
+def result_id(name: str) -> int:
+    if name not in RESULTS:
+        raise ValueError(f'Unknown result {name}')
+    return RESULTS[name]
+
+
+def compile_rank(spec: List[int]) -> Rule:
+    first, last = spec
+
+    def rule(arrays: WeekArrays) -> numpy.ndarray:
+        lo = first if first > 0 else arrays.ranked + first + 1
+        hi = last if last > 0 else arrays.ranked + last + 1
+        return (arrays.rank >= lo) & (arrays.rank <= hi) & (arrays.rank > 0)
+    return rule
+
+
+def compile_form(spec: Dict) -> Rule:
+    weeks = spec['weeks']
+    points = bounds_rule(lambda arrays: arrays.scan.form(weeks)[0], spec.get('min'), spec.get('max'))
+    played = spec.get('played', weeks)
+    return lambda arrays: points(arrays) & (arrays.scan.form(weeks)[1] >= played)
+
+
+def compile_run(spec: Dict) -> Rule:
+    result = result_id(spec['result'])
+    return bounds_rule(lambda arrays: arrays.scan.run(result), spec.get('min'), spec.get('max'))
+
+
+def compile_count(spec: Dict) -> Rule:
+    result = result_id(spec['result'])
+    weeks = spec['weeks']
+    return bounds_rule(lambda arrays: arrays.scan.count(result, weeks), spec.get('min'), spec.get('max'))
+
+
+def compile_side(spec: str) -> Rule:
+    if spec not in ('home', 'away'):
+        raise ValueError(f'Unknown side {spec}')
+    home = spec == 'home'
+    return lambda arrays: arrays.home == home
+
+
+RULES = {'rank': compile_rank, 'form': compile_form, 'run': compile_run, 'count': compile_count,
+         'side': compile_side}
+
+
+class Strategy:
+    """Compiled definition, `evaluate` maps a week snapshot to ticket specs"""
+
+    def __init__(self, name: str, definition: Dict):
+        unknown = set(definition) - DEFINITION_KEYS
+        if unknown:
+            raise ValueError(f'Strategy {name}: unknown keys {sorted(unknown)}')
+        select = definition.get('select', {})
+        unknown = set(select) - SELECT_KEYS
+        if unknown:
+            raise ValueError(f'Strategy {name}: unknown select rules {sorted(unknown)}')
+        self.name = name
+        self.definition = definition
+        self.rules = [RULES[key](spec) for key, spec in select.items()]
+        market = definition.get('market', 'team')
+        if isinstance(market, dict):
+            self.market = (str(market['home']), str(market['away']))
+        elif market in MARKETS:
+            self.market = MARKETS[market]
+        else:
+            raise ValueError(f'Strategy {name}: unknown market {market}')
+        for odd_id in self.market:
+            if market_registry.get(odd_id) is None:
+                raise ValueError(f'Strategy {name}: unknown odd id {odd_id}')
+        self.min_odd, self.max_odd = definition.get('odds', [None, None])
+        self.limit = definition.get('limit', 1)
+        self.weeks = definition.get('weeks')
+        self.remaining = definition.get('remaining', 0)
+        self.account = definition.get('account')
+
+    def __repr__(self):
+        return '[Strategy:%s]' % self.name
+
+    def active(self, week: int, max_week: int) -> bool:
+        if self.weeks and not self.weeks[0] <= week <= self.weeks[1]:
+            return False
+        return max_week - week >= self.remaining
+
+    def required_weeks(self, max_week: int) -> List[int]:
+        first, last = self.weeks if self.weeks else (1, max_week)
+        return list(range(first, min(last, max_week) + 1))
+
+    def select(self, arrays: WeekArrays) -> numpy.ndarray:
+        """Team rows passing every rule, best placed first"""
+        mask = arrays.event >= 0
+        for rule in self.rules:
+            mask &= rule(arrays)
+        odds = arrays.market_odds(*self.market)
+        if self.min_odd is not None:
+            mask &= odds >= self.min_odd
+        if self.max_odd is not None:
+            mask &= odds <= self.max_odd
+        rows = numpy.flatnonzero(mask)
+        return rows[numpy.argsort(arrays.rank[rows], kind='stable')][:self.limit]
+
+    def evaluate(self, snapshot: WeekSnapshot) -> List[TicketSpec]:
+        if not self.active(snapshot.week, snapshot.max_week):
+            return []
+        arrays = week_arrays(snapshot)
+        specs = []
+        for index in self.select(arrays).tolist():
+            odd_id = self.market[0] if arrays.home[index] else self.market[1]
+            specs.append(TicketSpec([(int(arrays.event[index]), snapshot.week, int(odd_id))]))
+        return specs
+
+
+def compile_strategy(name: str, definition: Dict) -> Strategy:
+    strategy = _compiled.get(name)
+    if strategy is None or strategy.definition != definition:
+        strategy = Strategy(name, definition)
+        _compiled[name] = strategy
+    return strategy
+
+
+def run_strategy(snapshot: WeekSnapshot, params: Dict) -> List[TicketSpec]:
+    """`Player.plan` of every strategy, picklable for the process executor"""
+    return compile_strategy(params['name'], params['definition']).evaluate(snapshot)
+
+
+class StrategyPlayer(Player):
+    strategy: Strategy
+    offload = True
+    plan = staticmethod(run_strategy)
+
+    def __init__(self, **kwargs):
+        super().__init__(self.strategy.name, **kwargs)
+        self.account_data = self.strategy.account
+
+    def plan_params(self, competition_id: int) -> Dict:
+        return {'name': self.strategy.name, 'definition': self.strategy.definition}
+
+    def get_required_weeks(self, competition_id: int):
+        competition = self.live_session.user.get_competition(competition_id)
+        required_weeks = self.required_map.get(competition_id, [])
+        required_weeks.clear()
+        required_weeks.extend(self.strategy.required_weeks(competition.max_week))
+
+
+def load_strategies(directory: Optional[str] = None) -> Dict[str, Dict]:
+    """Built in definitions and those of `{directory}/{name}.json`"""
+    definitions = dict(Strategies)
+    directory = directory or settings.STRATEGY_DIR
+    if directory and os.path.isdir(directory):
+        for file_name in sorted(os.listdir(directory)):
+            name, ext = os.path.splitext(file_name)
+            if ext != '.json':
+                continue
+            with open(os.path.join(directory, file_name)) as f:
+                definitions[name] = json.load(f)
+    return definitions
+
+
+def strategy_player(name: str, definition: Dict) -> type:
+    strategy = compile_strategy(name, definition)
+    return type(name.capitalize(), (StrategyPlayer,), {'strategy': strategy})
@@ -1,5 +1,4 @@
 from typing import Dict
-import operator
 import secrets
 import asyncio
 from collections import Counter
@@ -32,47 +31,31 @@ class CustomPlayer(Player):
         league_games = competition.league_games  # type: Dict[int, Dict]
         week_games = league_games.get(active_week)  # type: Dict[int, Dict]
         game_data = self.game_hash.get(competition_id, {})
-        week_stats = competition.table.get_week_stats(active_week)
         if not game_data:
             table = competition.table.table
+            features = self.get_features(competition_id, active_week)
+            scan = features.scan
             for top_player in table:
-                streak = top_player.get('streak')
-                t_streak = sorted(streak.items(), key=operator.itemgetter(0))
-                f_streak = t_streak[active_week - (self.match_past + 1):active_week - 1]
-                u_streak = [x[1] for x in f_streak if isinstance(x[1], int)]
-                if len(u_streak) >= self.match_past:
-                    if sum(u_streak) == (3 * self.match_past):
-                        v_streak = t_streak[active_week: active_week + self.match_future]
+                points, played = scan.team_form(top_player.get('team'), self.match_past)
+                if played >= self.match_past:
+                    if points == (3 * self.match_past):
                         valid = True
-                        for event_id, event_data in week_games.items():
-                            player_a = event_data.get('A')
-                            player_b = event_data.get('B')
-                            if player_a == top_player.get('team') or player_b == top_player.get('team'):
-                                event_stats = week_stats.get(event_id)
-                                team_to_team = event_stats.get("teamToTeam")
-                                head_to_head = team_to_team.get("headToHead")
-                                u, v = self.pick_winner(head_to_head)
-                                if player_a == top_player.get('team'):
-                                    if u == 0 and v == 5:
-                                        valid = True
-                                else:
-                                    if u == 1 and v == 5:
-                                        valid = True
-                                odds = event_data.get('odds')
-                                if player_a == top_player.get('team'):
-                                    odd_id = 0
-                                else:
-                                    odd_id = 1
-                                market_id, odd_name, odd_index = Player.get_market_info(str(odd_id))
-                                odd_value = float(odds[odd_index])
-                                if odd_value < 1.4:
-                                    valid = False
-                                    break
-                                else:
-                                    break
+                        event_id = features.team_events.get(top_player.get('team'))
+                        if event_id is not None:
+                            u, v = features.winner(event_id)
+                            if week_games[event_id].get('A') == top_player.get('team'):
+                                if u == 0 and v == 5:
+                                    valid = True
+                                odd_id = 0
+                            else:
+                                if u == 1 and v == 5:
+                                    valid = True
+                                odd_id = 1
+                            if features.odd(event_id, str(odd_id)) < 1.4:
+                                valid = False
                         if not valid:
                             continue
-                        if len(v_streak) >= self.match_future:
+                        if scan.remaining() >= self.match_future:
                             game_data['team'] = top_player.get('team')
                             game_data['enabled'] = True
                             self.game_queue[competition_id] = True
@@ -26,12 +26,16 @@ class LiveSession(StatusMap):
     play_events: Dict[int, asyncio.Event]
     status: str
     demo: bool
-    account: SessionAccount
+    account: Optional[SessionAccount] = None
     session_id: int
     won: int
     stake: int
     competitions: Dict
     player: Optional[Player]
+    # Instance playing each competition, an older generation until the competition starts a new league
+    players: Dict[int, Player]
+    player_name: str
+    player_generation: int
     db_live_session: DbLiveSession
     ticket_maps: Dict[int, Dict[int, bool]]
     target_amount: int
@@ -52,17 +56,43 @@ class LiveSession(StatusMap):
         for competition_id in competitions:
             self.play_events[competition_id] = asyncio.Event()
         self.player = None
+        self.players = {}
         self.stake = 0
         self.won = 0
         self.target_amount = account_data.get('target_amount')
         self.setup_account(account_data)
 
     def set_player(self, player_name: str):
-        mod = getattr(players, player_name)
-        cls = getattr(mod, player_name.capitalize())  # type: Type[Player]
+        cls = players.registry.get(player_name)  # type: Type[Player]
+        self.player_name = player_name
+        self.player_generation = players.registry.generation(player_name)
         self.player = cls(live_session=self)
+        self.players = {competition_id: self.player for competition_id in self.competitions}
+        if self.account is None and self.player.account_data:
+            self.setup_account(self.player.account_data)
         self.player.start()
 
+    def get_player(self, competition_id: int) -> Player:
+        return self.players.get(competition_id, self.player)
+
+    def refresh_player(self):
+        """
+        Create the instance of the player class loaded since the session started, if any.
+        Competitions switch to it one by one, on their next `on_new_league`.
+        """
+        if players.registry.generation(self.player_name) == self.player_generation:
+            return
+        cls = players.registry.current(self.player_name)
+        if cls is None:
+            # Unloaded, keep playing the instance we hold
+            return
+        logger.info('[%d] Player %s reloaded', self.session_id, self.player_name)
+        status = self.player.status
+        self.player_generation = players.registry.generation(self.player_name)
+        self.player = cls(live_session=self)
+        if status == self.player.RUNNING:
+            self.player.start()
+
     def setup_account(self, account_data: Dict):
         target_account_id = account_data.get('account_id')
         options = account_data.get('options')
@@ -82,7 +112,9 @@ class LiveSession(StatusMap):
     def start(self):
         if self.status != self.RUNNING:
             self.status = self.RUNNING
-            asyncio.ensure_future(on_start_live_session(self.db_live_session))
+            db = self.user.provider.async_db
+            db_start = db.on_start_live_session if db else on_start_live_session
+            asyncio.ensure_future(db_start(self.db_live_session))
             for competition_id in self.competitions:
                 competition = self.user.get_competition(competition_id)
                 if competition.status != competition.RUNNING:
@@ -106,7 +138,7 @@ class LiveSession(StatusMap):
         await self.event_lock.acquire()
         # print(f"Acquiring lock {self.session_id} {competition_id}")
         self.ticket_maps.get(competition_id).clear()
-        tickets = await self.player.on_event(competition_id, week)
+        tickets = await self.get_player(competition_id).on_event(competition_id, week)
         self.play_events[competition_id] = asyncio.Event()
         if not tickets:
             self.play_events.get(competition_id).set()
@@ -119,4 +151,6 @@ class LiveSession(StatusMap):
         return self.play_events.get(competition_id), tickets
 
     async def on_new_league(self, competition_id: int):
+        self.refresh_player()
+        self.players[competition_id] = self.player
         await self.player.on_new_league(competition_id)
@@ -0,0 +1,76 @@
+"""
+Parallel parameter sweeps over archived seasons.
+
+Every (player, parameters) configuration is one job on a process pool, replaying
+all seasons in order through one session, so balance, player state and drawdown
+carry over from season to season. Workers load the season corpus once in the
+pool initializer and keep it resident, jobs only carry the player name and
+parameters.
+"""
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from vbet.core import settings
+from vbet.utils.log import get_logger
+from .backtest import (BacktestReport, Season, archive_season_count, archive_seasons, json_dump_paths,
+                       json_seasons, run_backtest)
+
+logger = get_logger('sweep')
+
+# Season corpus of the worker process, competition id -> seasons
+_corpus: Dict[int, List[Season]] = {}
+
+
+class SweepResult(NamedTuple):
+    player: str
+    params: Dict
+    report: BacktestReport
+
+
+def parameter_grid(grid: Dict[str, List]) -> List[Dict]:
+    """Every combination of the grid values, `{}` for an empty grid"""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*[grid[name] for name in names])]
+
+
+def load_corpus(directory: str, competitions: List[int], json_dumps: bool = False) -> Dict[int, List[Season]]:
+    loader = json_seasons if json_dumps else archive_seasons
+    return {competition_id: loader(directory, competition_id) for competition_id in competitions}
+
+
+def init_worker(directory: str, competitions: List[int], json_dumps: bool):
+    _corpus.clear()
+    _corpus.update(load_corpus(directory, competitions, json_dumps))
+
+
+def season_count(directory: str, competitions: List[int], json_dumps: bool = False) -> int:
+    """Rounds of the corpus, from the archive index or the dump file names without reading seasons"""
+    if json_dumps:
+        counts = [len(json_dump_paths(directory, competition_id)) for competition_id in competitions]
+    else:
+        counts = [archive_season_count(directory, competition_id) for competition_id in competitions]
+    return min(counts, default=0)
+
+
+def run_job(player_name: str, params: Dict, account_data: Dict) -> Tuple[str, Dict, BacktestReport]:
+    return player_name, params, run_backtest(player_name, _corpus, account_data, player_params=params)
+
+
+def run_sweep(grids: Dict[str, Dict[str, List]], directory: str, competitions: List[int], account_data: Dict,
+              json_dumps: bool = False, workers: Optional[int] = None) -> List[SweepResult]:
+    """
+    Backtest every parameter combination of `grids` (player name -> parameter ->
+    values) over the seasons of the corpus. Returns one result per configuration,
+    sorted by ROI.
+    """
+    jobs = [(player_name, params) for player_name, grid in grids.items() for params in parameter_grid(grid)]
+    logger.info('Sweep of %d configurations over %d seasons', len(jobs),
+                season_count(directory, competitions, json_dumps))
+    results: List[SweepResult] = []
+    with ProcessPoolExecutor(max_workers=workers or settings.PROCESS_POOL_WORKERS, initializer=init_worker,
+                             initargs=(directory, competitions, json_dumps)) as executor:
+        futures = [executor.submit(run_job, player_name, params, account_data) for player_name, params in jobs]
+        for future in as_completed(futures):
+            results.append(SweepResult(*future.result()))
+    return sorted(results, key=lambda result: result.report.roi, reverse=True)
@@ -1,67 +1,251 @@
+from collections.abc import Mapping
 from operator import itemgetter
-from typing import Dict, List, Optional
-from vbet.utils.executor import process_exec
-import multiprocessing
-
-
-def get_league_table(max_week: int, raw_table: Dict):
-    _table = {}
-    for team, team_data in raw_table.items():
-        points = 0
-        gf = 0
-        ga = 0
-        won = 0
-        lost = 0
-        draw = 0
-        streak = {_: 'x' for _ in range(1, max_week + 1)}
-        week_values = sorted(team_data.items(), key=itemgetter(0))
-        for week_info in week_values:
-            week = week_info[0]
-            week_data = week_info[1]
-            p = week_data[0]
-            points += p
-            streak[week] = p
-            gf += week_data[1]
-            ga += week_data[2]
-            if p == 3:
-                won += 1
-            elif p == 1:
-                draw += 1
-            else:
-                lost += 1
-        _table[team] = {'team': team, 'pos': 0, 'points': points, 'won': won, 'draw': draw, 'lost': lost,
-                        'gf': gf, 'ga': ga, 'gd': gf - ga, 'streak': streak}
-    # Sort
-    data = list(_ for _ in _table.values())
-    i = 0
-    while i < len(data):
-        o = 0
-        while o < len(data):
-            data_1 = data[i]
-            data_2 = data[o]
-            points_1 = data_1['points']
-            points_2 = data_2['points']
-            if points_2 < points_1:
-                data[i] = data_2
-                data[o] = data_1
-            elif points_1 == points_2:
-                gd_1 = data_1['gd']
-                gd_2 = data_2['gd']
-                if gd_2 > gd_1:
-                    data[i] = data_2
-                    data[o] = data_1
-            o += 1
-        i += 1
-    for pos, team_data in enumerate(data):
-        team_data['pos'] = pos + 1
-    _table = {}
-    for td in data:
-        _table[td.get('team')] = td
-    return _table, data
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy
+
+
+def standings_key(team_data: Dict) -> Tuple[int, int, int]:
+    # Points, goal difference then goals scored, all descending
+    return -team_data['points'], -team_data['gd'], -team_data['gf']
+
+
+class TeamWeeks(Mapping):
+    """Read only `week -> [points, gf, ga, opponent, home_flag]` view of one team row"""
+
+    def __init__(self, store: 'SeasonStore', index: int):
+        self.store = store
+        self.index = index
+
+    def __getitem__(self, week: int) -> List:
+        week_data = self.store.get_row_week(self.index, week)
+        if week_data is None:
+            raise KeyError(week)
+        return week_data
+
+    def __iter__(self) -> Iterator[int]:
+        played = numpy.flatnonzero(self.store.points[self.index] >= 0)
+        return iter((played + 1).tolist())
+
+    def __len__(self) -> int:
+        return int(numpy.count_nonzero(self.store.points[self.index] >= 0))
+
+
+class TeamStreak(Mapping):
+    """Read only `week -> points | 'x'` view of one team row"""
+
+    def __init__(self, store: 'SeasonStore', index: int):
+        self.store = store
+        self.index = index
+
+    def __getitem__(self, week: int):
+        if not isinstance(week, int) or not 1 <= week <= self.store.max_week:
+            raise KeyError(week)
+        p = int(self.store.points[self.index, week - 1])
+        return p if p >= 0 else 'x'
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(1, self.store.max_week + 1))
+
+    def __len__(self) -> int:
+        return self.store.max_week
+
+    def items(self):
+        return [(week, p if p >= 0 else 'x') for week, p in enumerate(self.store.points[self.index].tolist(), 1)]
+
+
+class RawTable(Mapping):
+    """Read only `team -> TeamWeeks` view, compatible with the dict `raw_table`"""
+
+    def __init__(self, store: 'SeasonStore'):
+        self.store = store
+
+    def __getitem__(self, team) -> TeamWeeks:
+        index = self.store.team_index.get(team)
+        if index is None or not self.store.points[index].max() >= 0:
+            raise KeyError(team)
+        return TeamWeeks(self.store, index)
+
+    def __iter__(self):
+        played = numpy.flatnonzero((self.store.points >= 0).any(axis=1))
+        return iter([self.store.teams[i] for i in played.tolist()])
+
+    def __len__(self) -> int:
+        return int(numpy.count_nonzero((self.store.points >= 0).any(axis=1)))
+
+
+class SeasonStore:
+    """
+    Columnar season data, one (teams x max_week) matrix per field.
+
+    Weeks are 1-based for callers and stored at column `week - 1`. Unplayed
+    weeks hold `NO_RESULT` in the points matrix.
+    """
+    NO_RESULT = -1
+
+    def __init__(self, max_week: int, teams: List[str]):
+        self.max_week = max_week
+        self.teams = list(teams)
+        self.team_index = {team: index for index, team in enumerate(self.teams)}
+        shape = (len(self.teams), max_week)
+        self.points = numpy.full(shape, self.NO_RESULT, dtype=numpy.int8)
+        self.goals_for = numpy.zeros(shape, dtype=numpy.int8)
+        self.goals_against = numpy.zeros(shape, dtype=numpy.int8)
+        self.opponent = numpy.full(shape, -1, dtype=numpy.int16)
+        self.home = numpy.zeros(shape, dtype=numpy.int8)
+
+    def clear(self):
+        self.points.fill(self.NO_RESULT)
+        self.goals_for.fill(0)
+        self.goals_against.fill(0)
+        self.opponent.fill(-1)
+        self.home.fill(0)
+
+    # Dict compatible accessors
+    def set_week(self, team, week: int, week_data: List):
+        index = self.team_index[team]
+        col = week - 1
+        self.points[index, col] = week_data[0]
+        self.goals_for[index, col] = week_data[1]
+        self.goals_against[index, col] = week_data[2]
+        self.opponent[index, col] = self.team_index[week_data[3]]
+        self.home[index, col] = week_data[4]
+
+    def get_week(self, team, week: int) -> Optional[List]:
+        index = self.team_index.get(team)
+        if index is None:
+            return None
+        return self.get_row_week(index, week)
+
+    def get_row_week(self, index: int, week: int) -> Optional[List]:
+        if not isinstance(week, int) or not 1 <= week <= self.max_week:
+            return None
+        col = week - 1
+        p = int(self.points[index, col])
+        if p < 0:
+            return None
+        return [p, int(self.goals_for[index, col]), int(self.goals_against[index, col]),
+                self.teams[self.opponent[index, col]], int(self.home[index, col])]
+
+    def raw_table(self) -> RawTable:
+        return RawTable(self)
+
+    def streak(self, team) -> TeamStreak:
+        return TeamStreak(self, self.team_index[team])
+
+    # Vectorized accessors
+    def played(self) -> numpy.ndarray:
+        return self.points >= 0
+
+    def totals(self) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        played = self.played()
+        points = numpy.where(played, self.points, 0).sum(axis=1, dtype=numpy.int16)
+        gf = numpy.where(played, self.goals_for, 0).sum(axis=1, dtype=numpy.int16)
+        ga = numpy.where(played, self.goals_against, 0).sum(axis=1, dtype=numpy.int16)
+        return points, gf, ga
+
+    def standings(self) -> numpy.ndarray:
+        """Team indices ordered by points, goal difference then goals scored"""
+        points, gf, ga = self.totals()
+        return numpy.lexsort((-gf, -(gf - ga), -points))
+
+    def streak_slice(self, start_week: int, end_week: int) -> numpy.ndarray:
+        """Points of every team for weeks `start_week` up to, not including, `end_week`"""
+        start = max(start_week, 1) - 1
+        end = min(end_week, self.max_week + 1) - 1
+        return self.points[:, start:end]
+
+    def form(self, week: int, n: int) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """Points and played count of every team over the `n` weeks before `week`"""
+        window = self.streak_slice(week - n, week)
+        played = window >= 0
+        return numpy.where(played, window, 0).sum(axis=1), played.sum(axis=1)
+
+
+class StreakScan:
+    """
+    Points of every team frozen at `week`, for table pattern queries.
+
+    Windows cover the `n` weeks before `week`, the week being forecast is never
+    included. Per team results are numpy arrays in `teams` order, `team_*`
+    accessors return one team's value.
+    """
+    WIN = 3
+    DRAW = 1
+    LOSS = 0
+
+    def __init__(self, league: Optional[int], week: int, teams: List[str], points: numpy.ndarray):
+        self.league = league
+        self.week = week
+        self.teams = teams
+        self.team_index = {team: index for index, team in enumerate(teams)}
+        self.points = points
+        self.max_week = points.shape[1]
+        self._forms: Dict[int, Tuple[numpy.ndarray, numpy.ndarray]] = {}
+        self._runs: Dict[int, numpy.ndarray] = {}
+
+    def window(self, n: int) -> numpy.ndarray:
+        """(teams x n) points of the `n` weeks before `week`, unplayed weeks hold -1"""
+        start = min(max(self.week - n, 1), self.max_week + 1) - 1
+        end = min(max(self.week, 1), self.max_week + 1) - 1
+        return self.points[:, start:end]
+
+    def form(self, n: int) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """Points and played count of every team over the last `n` weeks"""
+        form = self._forms.get(n)
+        if form is None:
+            window = self.window(n)
+            played = window >= 0
+            form = numpy.where(played, window, 0).sum(axis=1), played.sum(axis=1)
+            self._forms[n] = form
+        return form
+
+    def count(self, result: int, n: int) -> numpy.ndarray:
+        """Number of `result` (WIN, DRAW or LOSS) of every team in the last `n` weeks"""
+        return (self.window(n) == result).sum(axis=1)
+
+    def run(self, result: int) -> numpy.ndarray:
+        """Length of the run of `result` of every team ending the week before `week`"""
+        run = self._runs.get(result)
+        if run is None:
+            # Weeks from the most recent backwards, the run stops at the first other result
+            other = self.window(self.max_week)[:, ::-1] != result
+            run = numpy.where(other.any(axis=1), other.argmax(axis=1), other.shape[1])
+            self._runs[result] = run
+        return run
+
+    def remaining(self) -> int:
+        """Weeks left in the season after `week`"""
+        return max(self.max_week - self.week, 0)
+
+    def select(self, mask: numpy.ndarray) -> List[str]:
+        return [self.teams[i] for i in numpy.flatnonzero(mask).tolist()]
+
+    def teams_with_run(self, result: int, n: int) -> List[str]:
+        """Teams with at least `n` consecutive `result` ending the week before `week`"""
+        return self.select(self.run(result) >= n)
+
+    def teams_with_count(self, result: int, k: int, n: int) -> List[str]:
+        """Teams with at least `k` of `result` in the last `n` weeks"""
+        return self.select(self.count(result, n) >= k)
+
+    def team_form(self, team, n: int) -> Tuple[int, int]:
+        """Points and played count of `team` over the last `n` weeks"""
+        index = self.team_index.get(team)
+        if index is None:
+            return 0, 0
+        points, played = self.form(n)
+        return int(points[index]), int(played[index])
+
+    def team_run(self, team, result: int) -> int:
+        index = self.team_index.get(team)
+        if index is None:
+            return 0
+        return int(self.run(result)[index])
 
 
 class LeagueTable:
-    def __init__(self, max_week):
+    def __init__(self, max_week, array_store: bool = False):
         self.league: Optional[int] = None
         self.week: Optional[int] = 1
         self.max_week: int = max_week
@@ -73,6 +257,10 @@ class LeagueTable:
         self.raw_table: Dict[str, Dict] = {}
         self.event_block_map: Dict[int: int] = {}
         self.league_stats: Dict[int: Dict[int, Dict]] = {}
+        self.array_store: bool = array_store
+        self.store: Optional[SeasonStore] = None
+        self.scans: Dict[Tuple[int, int], StreakScan] = {}
+        self.revision: int = 0
 
     @property
     def table(self):
@@ -90,14 +278,13 @@ class LeagueTable:
             self.results_ids_pool[week] = results_ids
             self.winning_ids_pool[week] = winning_ids
             self.parse_week(week, results)
-            # from vbet.core.vbet import Vbet
-            # future = process_exec(Vbet.process_executor, get_league_table, self.max_week, self.raw_table)
-            future = get_league_table(self.max_week, self.raw_table)
-            if future:
-                self.ready_table, self._table = future
+            self.sort_table()
+            self.scans.clear()
+            self.revision += 1
 
     def feed_stats(self, week: int, stats: Dict):
         self.league_stats[week] = stats
+        self.revision += 1
 
     def get_last_matches(self, team_id):
         return sorted(self.raw_table.get(team_id).items(), key=itemgetter(0), reverse=True)
@@ -113,8 +300,6 @@ class LeagueTable:
             team_a = event.get('A')
             team_b = event.get('B')
             score = event.get('score')
-            t = self.raw_table.setdefault(team_a, {})
-            s = self.raw_table.setdefault(team_b, {})
             home = score[0]
             away = score[1]
             if home == away:
@@ -126,24 +311,105 @@ class LeagueTable:
             else:
                 x = 0
                 y = 3
-            t[week] = [x, home, away, team_b, 0]
-            s[week] = [y, away, home, team_a, 1]
+            self.update_team(team_a, week, [x, home, away, team_b, 0])
+            self.update_team(team_b, week, [y, away, home, team_a, 1])
+
+    def update_team(self, team, week: int, week_data: List):
+        entry = self.get_team_entry(team)
+        if self.store is not None:
+            previous = self.store.get_week(team, week)
+            self.store.set_week(team, week, week_data)
+        else:
+            team_data = self.raw_table.setdefault(team, {})
+            previous = team_data.get(week)
+            team_data[week] = week_data
+            entry['streak'][week] = week_data[0]
+        if previous:
+            # Week fed again, drop the old result before applying the new one
+            self.apply_week(entry, previous, -1)
+        self.apply_week(entry, week_data, 1)
+
+    def get_team_entry(self, team) -> Dict:
+        entry = self.ready_table.get(team)
+        if entry is None:
+            if self.store is not None:
+                streak = self.store.streak(team)
+            else:
+                streak = {_: 'x' for _ in range(1, self.max_week + 1)}
+            entry = {'team': team, 'pos': len(self._table) + 1, 'points': 0, 'won': 0, 'draw': 0, 'lost': 0,
+                     'gf': 0, 'ga': 0, 'gd': 0, 'streak': streak}
+            self.ready_table[team] = entry
+            self._table.append(entry)
+        return entry
+
+    @staticmethod
+    def apply_week(entry: Dict, week_data: List, sign: int):
+        p = week_data[0]
+        entry['points'] += sign * p
+        entry['gf'] += sign * week_data[1]
+        entry['ga'] += sign * week_data[2]
+        entry['gd'] = entry['gf'] - entry['ga']
+        if p == 3:
+            entry['won'] += sign
+        elif p == 1:
+            entry['draw'] += sign
+        else:
+            entry['lost'] += sign
+
+    def sort_table(self):
+        if self.store is not None:
+            teams = self.store.teams
+            order = self.store.standings().tolist()
+            self._table[:] = [self.ready_table[teams[i]] for i in order if teams[i] in self.ready_table]
+        else:
+            self._table.sort(key=standings_key)
+        for pos, team_data in enumerate(self._table):
+            team_data['pos'] = pos + 1
 
     def clear_table(self):
         self.results_pool.clear()
         self.results_ids_pool.clear()
         self.winning_ids_pool.clear()
         self._table.clear()
-        self.raw_table.clear()
+        if self.store is not None:
+            self.store.clear()
+        else:
+            self.raw_table.clear()
         self.ready_table.clear()
         self.event_block_map.clear()
         self.league_stats .clear()
+        self.scans.clear()
+        self.revision += 1
 
     def setup_league(self, league: int):
         self.league = league
 
-    def setup_participants(self, participants):
-        pass
+    def setup_participants(self, participants: List[str]):
+        if self.array_store:
+            self.store = SeasonStore(self.max_week, participants)
+            self.raw_table = self.store.raw_table()
+
+    def points_matrix(self) -> Tuple[List[str], numpy.ndarray]:
+        """Teams and their (teams x max_week) points, -1 for weeks not played"""
+        if self.store is not None:
+            return self.store.teams, self.store.points.copy()
+        teams = list(self.ready_table)
+        points = numpy.full((len(teams), self.max_week), SeasonStore.NO_RESULT, dtype=numpy.int8)
+        for index, team in enumerate(teams):
+            for week, p in self.ready_table[team]['streak'].items():
+                if isinstance(p, int) and 1 <= week <= self.max_week:
+                    points[index, week - 1] = p
+        return teams, points
+
+    def scan(self, week: int) -> StreakScan:
+        """Streak queries over every team as of `week`, shared until the next result is fed"""
+        key = (self.league, week)
+        scan = self.scans.get(key)
+        if scan is None:
+            teams, points = self.points_matrix()
+            scan = StreakScan(self.league, week, teams, points)
+            self.scans[key] = scan
+        return scan
 
     def get_raw_team_data(self, team) -> Optional[Dict]:
         return self.raw_table.get(team)
@@ -0,0 +1,147 @@
+"""
+Compact ticket details for the Tickets table.
+
+`serialize_ticket` content repeats the participants dicts and the market names
+of every bet. Rows store this form instead:
+
+    {'v': 2, 'c': competition id, 'k': ticket type,
+     's': [[grouping, system count, stake, min winning, max winning, min bonus, max bonus, winning count,
+            limit max payout], ...],
+     'e': [[event id, league, week, event ndx, [home, away], event time, ext id, banker, game type,
+            final outcome, [[odd id, odd value, stake], ...]], ...]}
+
+Teams are [id, fifaCode] references to the competition participant templates,
+bets drop the market id and odd name the market registry gives back. A team or
+bet that does not match is kept whole. Expanded with the templates of the
+competition, a row gives back the original content; without them, or once the
+competition changed its teams, a team comes back as its id and fifaCode only.
+Rows written before this format are returned as they are, version 1 rows held
+template indexes.
+"""
+from typing import Dict, List, Optional
+
+from vbet.game.markets import market_registry
+
+VERSION = 2
+
+VERSIONS = (1, VERSION)
+
+BET_STATUS = 'OPEN'
+BET_PROFIT_TYPE = 'NONE'
+EVENT_CLASS = 'FootballTicketEventData'
+
+
+def is_compact(details: Dict) -> bool:
+    return isinstance(details, dict) and details.get('v') in VERSIONS
+
+
+def compact_team(team: Dict, templates: Dict[str, Dict]):
+    if templates.get(team.get('fifaCode')) == team:
+        return [team.get('id'), team.get('fifaCode')]
+    return team
+
+
+def compact_bet(bet: Dict):
+    info = market_registry.get(bet['oddId'])
+    if info and info.market_id == bet['marketId'] and info.odd_name == bet['oddName'] and \
+            bet['status'] == BET_STATUS and bet['profitType'] == BET_PROFIT_TYPE:
+        return [bet['oddId'], bet['oddValue'], bet['stake']]
+    return bet
+
+
+def compact_details(content: Dict, competition_id: int, participants: List[Dict]) -> Dict:
+    templates = {team.get('fifaCode'): team for team in participants}
+    events = []
+    for event in content['events']:
+        data = event['data']
+        if data.get('classType') != EVENT_CLASS or event['playlistId'] != competition_id:
+            # Not produced by serialize_ticket, keep the whole ticket
+            return content
+        events.append([
+            event['eventId'], data['leagueId'], data['matchDay'], data['eventNdx'],
+            [compact_team(team, templates) for team in data['participants']],
+            event['eventTime'], event['extId'], event['isBanker'], event['gameType']['val'], event['finalOutcome'],
+            [compact_bet(bet) for bet in event['bets']]
+        ])
+    system_bets = []
+    for system_bet in content['systemBets']:
+        winning = system_bet['winningData']
+        system_bets.append([system_bet['grouping'], system_bet['systemCount'], system_bet['stake'],
+                            winning['minWinning'], winning['maxWinning'], winning['minBonus'],
+                            winning['maxBonus'], winning['winningCount'], winning['limitMaxPayout']])
+    return {'v': VERSION, 'c': competition_id, 'k': content['ticketType'], 's': system_bets, 'e': events}
+
+
+def expand_bet(bet) -> Dict:
+    if isinstance(bet, dict):
+        return bet
+    odd_id, odd_value, stake = bet
+    info = market_registry.get(odd_id)
+    return {
+        'marketId': info.market_id,
+        'oddId': odd_id,
+        'oddName': info.odd_name,
+        'oddValue': odd_value,
+        'status': BET_STATUS,
+        'profitType': BET_PROFIT_TYPE,
+        'stake': stake
+    }
+
+
+def expand_team(team, participants: Optional[List[Dict]]) -> Dict:
+    if isinstance(team, dict):
+        return team
+    if isinstance(team, int):
+        # Version 1 template index
+        return participants[team] if participants and team < len(participants) else {'teamIndex': team}
+    team_id, fifa_code = team
+    for template in participants or ():
+        if template.get('fifaCode') == fifa_code and template.get('id') == team_id:
+            return template
+    # Competition templates not loaded in this process, or replaced since
+    return {'id': team_id, 'fifaCode': fifa_code}
+
+
+def expand_details(details: Dict, participants: Optional[Dict[int, List[Dict]]] = None) -> Dict:
+    """Full `serialize_ticket` content of a stored row, `participants` by competition id"""
+    if not is_compact(details):
+        return details
+    competition_id = details['c']
+    templates = (participants or {}).get(competition_id)
+    events = []
+    for event_id, league, week, event_ndx, teams, event_time, ext_id, banker, game_type, outcome, bets \
+            in details['e']:
+        events.append({
+            'eventId': event_id,
+            'gameType': {'val': game_type},
+            'playlistId': competition_id,
+            'eventTime': event_time,
+            'extId': ext_id,
+            'isBanker': banker,
+            'finalOutcome': outcome,
+            'bets': [expand_bet(bet) for bet in bets],
+            'data': {
+                'classType': EVENT_CLASS,
+                'participants': [expand_team(team, templates) for team in teams],
+                'leagueId': league,
+                'matchDay': week,
+                'eventNdx': event_ndx
+            }
+        })
+    system_bets = []
+    for grouping, system_count, stake, min_winning, max_winning, min_bonus, max_bonus, winning_count, limit \
+            in details['s']:
+        system_bets.append({
+            'grouping': grouping,
+            'systemCount': system_count,
+            'stake': stake,
+            'winningData': {
+                'limitMaxPayout': limit,
+                'minWinning': min_winning,
+                'maxWinning': max_winning,
+                'minBonus': min_bonus,
+                'maxBonus': max_bonus,
+                'winningCount': winning_count
+            }
+        })
+    return {'events': events, 'systemBets': system_bets, 'ticketType': details['k']}
@@ -2,11 +2,13 @@ from __future__ import annotations
 
 import asyncio
 import enum
+import heapq
+import itertools
 import time
 from operator import attrgetter
-from typing import Any, Dict, List, Optional, Type, TYPE_CHECKING, Tuple
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Set, Type, TYPE_CHECKING, Tuple
 
-from vbet.core.orm import save_ticket, update_ticket
+from vbet.core.orm import ticket_body, update_ticket
 from vbet.utils.log import async_exception_logger, get_logger
 from vbet.utils.parser import Resource
 
@@ -14,9 +16,13 @@ if TYPE_CHECKING:
     from vbet.game.user import User
     from vweb.vclient.models import Tickets, LiveSession
     from vbet.core.socket_manager import Socket
+    from vbet.core.persister import TicketPersister
 
 logger = get_logger('tickets')
 
+# Creation order of tickets, ties between equal priorities go to the oldest
+ticket_sequence = itertools.count()
+
 
 class TicketStatus(enum.IntEnum):
     READY = 0
@@ -104,12 +110,18 @@ class Ticket:
         self.demo = True
         self.db_ticket: Optional[Tickets] = None
         self.db_live_session: Optional[LiveSession] = None
+        self.persister: Optional[TicketPersister] = None
         self.ticket_key: Optional[int] = None
         self.player: str = player
         self.content: Optional[Dict] = None
+        # Stored form of content, see ticket_codec
+        self.compact: Optional[Dict] = None
         self.events: List[Event] = []
         self.priority: int = 0
-        self.status: TicketStatus = TicketStatus.READY
+        self.sequence: int = next(ticket_sequence)
+        # Called with (ticket, previous status) on every status change
+        self.state_listener: Optional[Callable[[Ticket, TicketStatus], None]] = None
+        self._status: TicketStatus = TicketStatus.READY
         self.sent: bool = False
         self.resolved: bool = False
         self.socket_id: Optional[int] = None
@@ -142,6 +154,17 @@ class Ticket:
         events_str = "\n".join(events)
         return f'Ticket : {self.mode} State : {self.status} Stake : {self.stake} \n{events_str}'
 
+    @property
+    def status(self) -> TicketStatus:
+        return self._status
+
+    @status.setter
+    def status(self, status: TicketStatus):
+        previous = self._status
+        self._status = status
+        if status != previous and self.state_listener:
+            self.state_listener(self, previous)
+
     @property
     def mode(self):
         if len(self.events) == 1:
@@ -299,10 +322,64 @@ class Ticket:
     def on_void(self):
         self.db_ticket.ticket_status = 'VOID'
 
+    def payload(self) -> Dict:
+        """Web session payload, built from the objects in memory"""
+        return {self.db_ticket.ticket_key: ticket_body(self.db_ticket, self.db_live_session.data, self.content)}
+
     async def save(self):
         self.db_ticket.ticket_status = self.ticket_status
         self.db_ticket.status = self.status
-        await update_ticket(self.db_ticket)
+        if self.persister:
+            self.persister.update(self.db_ticket)
+        else:
+            await update_ticket(self.db_ticket)
+
+
+class TicketQueue:
+    """
+    Ready tickets ordered by priority, highest first, then creation order.
+
+    Entries are dropped lazily: a ticket removed or no longer READY is skipped
+    when it reaches the top of the heap.
+    """
+
+    def __init__(self):
+        self.heap: List[Tuple[int, int, Ticket]] = []
+        self.queued: Dict[Tuple[int, int], Ticket] = {}
+
+    def __len__(self):
+        return len(self.queued)
+
+    @staticmethod
+    def key(ticket: Ticket) -> Tuple[int, int]:
+        return ticket.game_id, ticket.ticket_key
+
+    def push(self, ticket: Ticket):
+        key = self.key(ticket)
+        if self.queued.get(key) is ticket:
+            return
+        self.queued[key] = ticket
+        heapq.heappush(self.heap, (-ticket.priority, ticket.sequence, ticket))
+
+    def discard(self, ticket: Ticket):
+        key = self.key(ticket)
+        if self.queued.get(key) is ticket:
+            del self.queued[key]
+
+    def pop(self) -> Optional[Ticket]:
+        while self.heap:
+            _, _, ticket = heapq.heappop(self.heap)
+            key = self.key(ticket)
+            if self.queued.get(key) is not ticket:
+                continue
+            del self.queued[key]
+            if ticket.status == TicketStatus.READY:
+                return ticket
+        return None
+
+    def clear(self):
+        self.heap.clear()
+        self.queued.clear()
 
 
 class TicketManager:
@@ -310,9 +387,19 @@ class TicketManager:
     JACKPOT_BEFORE = 0
     JACKPOT_AFTER = 1
     JACKPOT_NIL = 2
+    SENT_TIMEOUT = 5  # Seconds without a response before a sent ticket is looked up
+    PAYOUT_RETRY = 3.5  # Seconds between payout lookups of a won ticket
 
     user: User
     active_tickets: Dict[int, Dict[int, Ticket]]
+    ready_tickets: TicketQueue
+    timers: Dict[int, asyncio.TimerHandle]
+    # Follow ups started by the lifecycle callbacks, referenced until done
+    tasks: Set[asyncio.Task]
+    # Indexes of active_tickets for response correlation
+    tickets_by_id: Dict[int, Ticket]
+    sent_tickets: Dict[Tuple[int, int], Ticket]
+    session_tickets: Dict[int, Dict[int, Ticket]]
     last_ticket_time: float
     buffer_tickets: bool
     socket_event: asyncio.Event
@@ -323,14 +410,18 @@ class TicketManager:
     ticket_sender_task: asyncio.Task
     _ticket_wait: asyncio.Event
     sockets: List[int]
-    socket_map: Dict[int, Dict[int, int]]
     min_sockets: int
     jackpot_resume: int
-    t_lock: asyncio.Lock
 
     def __init__(self, user: User):
         self.user = user
         self.active_tickets = {}
+        self.ready_tickets = TicketQueue()
+        self.timers = {}
+        self.tasks = set()
+        self.tickets_by_id = {}
+        self.sent_tickets = {}
+        self.session_tickets = {}
         self.last_ticket_time = time.time() - self.DEFAULT_TICKET_INTERVAL
         self.buffer_tickets = True  # Await response of last ticket before sending next
         self.send_lock = asyncio.Lock()
@@ -342,12 +433,10 @@ class TicketManager:
         self.socket_event = asyncio.Event()
         self.sockets = []
         self.streams = []
-        self.socket_map = {}
         self.min_sockets = 1
         self.active_game_id = 0
         self.active_ticket_key = 0
         self.jackpot_resume = self.JACKPOT_NIL
-        self.t_lock = asyncio.Lock()
         self.listener_flag = True
 
     @async_exception_logger('listener')
@@ -356,11 +445,7 @@ class TicketManager:
         while self.listener_flag:
             await self.pool_event.wait()
             async with self.pool_lock:
-                ticket = None
-                for game_id, competition_tickets in self.active_tickets.items():
-                    for ticket_key, t in competition_tickets.items():
-                        if t.status == TicketStatus.READY:
-                            ticket = t
+                ticket = self.ready_tickets.pop()
                 if ticket:
                     print(ticket.ticket_key, ticket.game_id, ticket.status)
                     self.active_game_id, self.active_ticket_key = ticket.game_id, ticket.ticket_key
@@ -380,10 +465,11 @@ class TicketManager:
         await self.send_ticket(ticket)
 
     async def register_ticket(self, ticket: Ticket) -> int:
-        async with self.t_lock:
-            ticket_key = await save_ticket(self.user.provider, self.user.db_user, self.user.db_provider, ticket)
-            ticket.ticket_key = ticket_key
-            return ticket_key
+        persister = self.user.provider.ticket_persister
+        ticket_key = await persister.insert(ticket, self.user.db_user, self.user.db_provider)
+        ticket.persister = persister
+        ticket.ticket_key = ticket_key
+        return ticket_key
 
     async def send_ticket(self, ticket: Ticket):
         async with self.send_lock:
@@ -414,9 +500,7 @@ class TicketManager:
         socket_id, xs = self.user.send(Resource.TICKETS, body=ticket_data, method='POST', socket_id=socket.socket_id)
         ticket.status = TicketStatus.SENT
         ticket.sent_notify(xs, socket.socket_id)
-        socket_map = self.socket_map.get(socket.socket_id, {})
-        socket_map[ticket.xs] = ticket.game_id
-        self.socket_map[socket.socket_id] = socket_map
+        self.sent_tickets[(ticket.socket_id, ticket.xs)] = ticket
         if not self.user.jackpot_ready:
             self.user.send(Resource.SYNC, body={}, socket_id=socket.socket_id)
 
@@ -437,6 +521,8 @@ class TicketManager:
 
     async def ticket_success(self, ticket: Ticket):
         ticket.status = TicketStatus.SUCCESS
+        if ticket.ticket_id:
+            self.tickets_by_id[ticket.ticket_id] = ticket
         live_session = self.user.get_live_session(ticket.live_session_id)
         live_session.ticket_maps.get(ticket.game_id)[ticket.ticket_key] = True
         self.user.tickets_complete(ticket.game_id, ticket.live_session_id)
@@ -459,6 +545,7 @@ class TicketManager:
 
         # Put in queue if in retry
         if ticket.status == TicketStatus.READY:
+            self.ready_tickets.push(ticket)
             if not self.pool_event.is_set():
                 self.pool_event.set()
 
@@ -472,14 +559,98 @@ class TicketManager:
         async with self.pool_lock:
             competition_tickets = self.active_tickets.setdefault(ticket.game_id, {})
             competition_tickets[ticket.ticket_key] = ticket
+            self.session_tickets.setdefault(ticket.live_session_id, {})[ticket.sequence] = ticket
+            ticket.state_listener = self.ticket_state
+            if ticket.status == TicketStatus.READY:
+                self.ready_tickets.push(ticket)
             if not self.pool_event.is_set():
                 self.pool_event.set()
 
+    @async_exception_logger('tickets')
     async def remove_ticket(self, ticket: Ticket):
         async with self.pool_lock:
             competition_tickets = self.active_tickets.get(ticket.game_id, {})
-            if competition_tickets:
+            if competition_tickets.get(ticket.ticket_key) is ticket:
                 competition_tickets.pop(ticket.ticket_key)
+            self.unindex_ticket(ticket)
+
+    def unindex_ticket(self, ticket: Ticket):
+        self.ready_tickets.discard(ticket)
+        self.cancel_timer(ticket)
+        if self.tickets_by_id.get(ticket.ticket_id) is ticket:
+            del self.tickets_by_id[ticket.ticket_id]
+        if self.sent_tickets.get((ticket.socket_id, ticket.xs)) is ticket:
+            del self.sent_tickets[(ticket.socket_id, ticket.xs)]
+        session_tickets = self.session_tickets.get(ticket.live_session_id)
+        if session_tickets is not None:
+            session_tickets.pop(ticket.sequence, None)
+            if not session_tickets:
+                del self.session_tickets[ticket.live_session_id]
+
+    def is_active(self, ticket: Ticket) -> bool:
+        return self.active_tickets.get(ticket.game_id, {}).get(ticket.ticket_key) is ticket
+
+    # Ticket lifecycle, each status change schedules its own follow up
+    def ticket_state(self, ticket: Ticket, previous: TicketStatus):
+        self.cancel_timer(ticket)
+        if ticket.status == TicketStatus.SENT:
+            self.set_timer(ticket, self.SENT_TIMEOUT, self.sent_timeout)
+        elif ticket.status == TicketStatus.VOID:
+            self.spawn(self.void_ticket(ticket))
+        elif ticket.status == TicketStatus.DISCARD:
+            self.spawn(self.remove_ticket(ticket))
+
+    def spawn(self, coro: Coroutine):
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def set_timer(self, ticket: Ticket, delay: float, callback: Callable[[Ticket], None]):
+        self.cancel_timer(ticket)
+        loop = asyncio.get_event_loop()
+        self.timers[ticket.sequence] = loop.call_at(loop.time() + delay, callback, ticket)
+
+    def cancel_timer(self, ticket: Ticket):
+        timer = self.timers.pop(ticket.sequence, None)
+        if timer:
+            timer.cancel()
+
+    def sent_timeout(self, ticket: Ticket):
+        self.timers.pop(ticket.sequence, None)
+        if ticket.status == TicketStatus.SENT and self.is_active(ticket):
+            self.spawn(self.find_lost_ticket(ticket))
+            self.set_timer(ticket, self.SENT_TIMEOUT, self.sent_timeout)
+
+    def payout_timeout(self, ticket: Ticket):
+        self.timers.pop(ticket.sequence, None)
+        if ticket.status == TicketStatus.SUCCESS and ticket.resolved and self.is_active(ticket):
+            self.spawn(self.find_payout(ticket))
+            self.set_timer(ticket, self.PAYOUT_RETRY, self.payout_timeout)
+
+    @async_exception_logger('tickets')
+    async def void_ticket(self, ticket: Ticket):
+        # Tickets dropped by reset_competition_tickets are not saved
+        if ticket.status == TicketStatus.VOID and self.is_active(ticket):
+            ticket.on_void()
+            await ticket.save()
+            await self.remove_ticket(ticket)
+
+    @async_exception_logger('tickets')
+    async def find_lost_ticket(self, ticket: Ticket):
+        logger.warning('%r Ticket Sent But status unknown :  %r', self.user, ticket)
+        payload = self.user.resource_ticket_by_id(2)
+        socket = await self.get_available_socket()
+        socket, xs = self.user.send(Resource.TICKETS_FIND_BY_ID, payload, socket_id=socket.socket_id)
+        self.user.ticket_check[xs] = (ticket.game_id, ticket.ticket_key)
+        logger.warning('%r Please validate lost ticket %d %f xs : %d', self.user, ticket.ticket_id,
+                       ticket.total_won, xs)
+
+    @async_exception_logger('tickets')
+    async def find_payout(self, ticket: Ticket):
+        payload = self.user.resource_ticket_by_id(1, ticket.ticket_id)
+        socket = await self.get_available_socket()
+        socket, xs = self.user.send(Resource.TICKETS_FIND_BY_ID, payload, socket_id=socket.socket_id)
+        logger.warning('%r Please validate ticket %d %f xs : %d', self.user, ticket.ticket_id, ticket.total_won, xs)
 
     async def find_ticket(self, game_id: int, ticket_key: int) -> Optional[Ticket]:
         competition_tickets = self.active_tickets.get(game_id, {})
@@ -488,29 +659,20 @@ class TicketManager:
             return ticket
 
     async def find_ticket_by_xs(self, socket_id, xs: int) -> Optional[Ticket]:
+        # Each send gets a single response, the entry is consumed
         async with self.send_lock:
-            socket_map = self.socket_map.get(socket_id, {})
-            try:
-                game_id = socket_map.pop(xs)
-                if socket_map:
-                    self.socket_map[socket_id] = socket_map
-                else:
-                    self.socket_map.pop(socket_id)
-            except KeyError:
-                pass
-            else:
+            ticket = self.sent_tickets.pop((socket_id, xs), None)
+            if ticket:
                 if not self._ticket_wait.is_set():
                     self._ticket_wait.set()
-                competition_tickets = self.active_tickets.get(game_id, {})
-                for ticket_key, ticket in competition_tickets.items():
-                    if ticket.xs == xs and ticket.socket_id == socket_id:
-                        return ticket
+                if self.is_active(ticket):
+                    return ticket
 
     def find_ticket_by_id(self, ticket_id: int) -> Optional[Ticket]:
-        for competition_tickets in self.active_tickets.values():
-            for ticket in competition_tickets.values():
-                if ticket.ticket_id == ticket_id:
-                    return ticket
+        return self.tickets_by_id.get(ticket_id)
+
+    def find_session_tickets(self, live_session_id: int) -> List[Ticket]:
+        return list(self.session_tickets.get(live_session_id, {}).values())
 
     async def check_pending_tickets(self, game_id: int):
         competition_tickets = self.active_tickets.get(game_id)
@@ -533,13 +695,15 @@ class TicketManager:
         competition_tickets = self.active_tickets.get(game_id, {})
         for ticket_key, ticket in competition_tickets.items():
             ticket.status = TicketStatus.VOID
+            self.unindex_ticket(ticket)
         self.active_tickets[game_id] = {}
 
     async def validate_competition_tickets(self, game_id: int):
         competition_tickets = self.active_tickets.get(game_id, {})
         if competition_tickets:
             results, winning_ids = self.user.get_competition_results(game_id)
-            for ticket in competition_tickets.values():
+            # Settled tickets leave the pool while we iterate
+            for ticket in list(competition_tickets.values()):
                 if ticket.status == TicketStatus.SUCCESS and not ticket.resolved:
                     validation_data = ticket.can_resolve(results, winning_ids)
                     if validation_data:
@@ -547,6 +711,9 @@ class TicketManager:
                         ticket.resolved = True
                         ticket.db_ticket.resolved = ticket.resolved
                         await self.user.resolved_competition_ticket(ticket)
+                        if ticket.status == TicketStatus.SUCCESS:
+                            # Won live ticket, looked up until the payout discards it
+                            self.set_timer(ticket, self.PAYOUT_RETRY, self.payout_timeout)
                         if ticket.demo:
                             credit = await self.user.account_manager.demo_credit
                         else:
@@ -572,17 +739,7 @@ class TicketManager:
                         bet_str = f'(stake={stake_str}, won={won_str}, total={total_stake_str})'
                         logger.info('[%d] %r [%s:%d:%d] %s  %s', game_id, self.user, ticket.player,
                                     ticket.live_session_id, ticket.ticket_key,  account_str, bet_str)
-                        body = {ticket.db_ticket.ticket_key: {
-                            'data': {
-                                'player': ticket.db_ticket.live_session.data,
-                                'status': ticket.db_ticket.status,
-                                'ticket_id': ticket.db_ticket.ticket_id,
-                                'ticket_key': ticket.db_ticket.ticket_key,
-                                'ticket_status': ticket.db_ticket.ticket_status,
-                                'won_data': ticket.db_ticket.won_data,
-                                'time_created': ticket.db_ticket.time_created.isoformat()
-                            },
-                            'ticket': ticket.db_ticket.details}}
+                        body = ticket.payload()
                         for session_key in self.user.ws_sessions.keys():
                             self.user.provider.send_to_session(self.user.username, session_key, "ticket_resolve", body)
                             body2 = {}
@@ -669,3 +826,8 @@ class TicketManager:
     def exit(self):
         self.close_sockets()
         self.ticket_sender_task.cancel()
+        for timer in self.timers.values():
+            timer.cancel()
+        self.timers.clear()
+        for task in self.tasks:
+            task.cancel()
@@ -243,7 +243,8 @@ class User(StatusMap):
         ticket: Union[Ticket, None]
         ticket = await self.ticket_manager.find_ticket_by_xs(game_id, xs)
         if not ticket:
-            print(f'{game_id}, {xs}, {valid_response}, {self.ticket_manager.socket_map}')
+            logger.debug('[%d] %r Ticket response without a sent ticket (xs=%d, valid=%s)',
+                         game_id, self, xs, valid_response)
         else:
             # logger.debug('%r (comp_id=%d, player=%s) ticket response \n%s',
             #              self, ticket.game_id, ticket.player, ticket)
@@ -314,17 +315,7 @@ class User(StatusMap):
                                     won_jackpot = won_data.get('wonJackpot')
                                     tick.db_ticket.won_data = {'won': won_amount, 'stake': tick.stake, 'wonJackpot': won_jackpot}
                                     await tick.save()
-                                    body = {tick.db_ticket.ticket_key: {
-                                        'data': {
-                                            'player': tick.db_ticket.live_session.data,
-                                            'status': tick.db_ticket.status,
-                                            'ticket_id': tick.db_ticket.ticket_id,
-                                            'ticket_key': tick.db_ticket.ticket_key,
-                                            'ticket_status': tick.db_ticket.ticket_status,
-                                            'won_data': tick.db_ticket.won_data,
-                                            'time_created': tick.db_ticket.time_created.isoformat()
-                                        },
-                                        'ticket': tick.db_ticket.details}}
+                                    body = tick.payload()
                                     for session_key in self.ws_sessions.keys():
                                         self.provider.send_to_session(self.username, session_key, "ticket_resolve", body)
                                         body2 = {}
@@ -396,17 +387,7 @@ class User(StatusMap):
     # Tickets
     async def register_ticket(self, ticket: Ticket):
         await self.ticket_manager.register_ticket(ticket)
-        body = {ticket.db_ticket.ticket_key: {
-            'data': {
-                'player': ticket.db_ticket.live_session.data,
-                'status': ticket.db_ticket.status,
-                'ticket_id': ticket.db_ticket.ticket_id,
-                'ticket_key': ticket.db_ticket.ticket_key,
-                'ticket_status': ticket.db_ticket.ticket_status,
-                'won_data': ticket.db_ticket.won_data,
-                'time_created': ticket.db_ticket.time_created.isoformat()
-            },
-            'ticket': ticket.db_ticket.details}}
+        body = ticket.payload()
         asyncio.create_task(self.send_ticket_session(body))
 
     async def send_ticket_session(self, ticket_data: Dict):
@@ -526,7 +507,12 @@ class User(StatusMap):
         }
 
     async def wss_tickets_data(self, ticket_key: int, n: int):
-        return await load_tickets(self.provider, self.db_provider, self.db_user, ticket_key, n)
+        participants = {competition_id: competition.participants
+                        for competition_id, competition in self.competitions.items()}
+        session_data = {session_id: live_session.db_live_session.data
+                        for session_id, live_session in self.live_sessions.items()}
+        return await load_tickets(self.provider, self.db_provider, self.db_user, ticket_key, n, participants,
+                                  session_data)
 
     # API
     def create_competition(self, game_id: int, mode: str, participants: List[Dict]) -> LeagueCompetition:
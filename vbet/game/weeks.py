@@ -0,0 +1,75 @@
+from typing import Dict, Iterator, List, Optional
+
+
+class WeekIndex:
+    """
+    Two way week <-> eBlockId index of a league.
+
+    Weeks with a known block and weeks with a fed result are tracked as int
+    bitsets where bit `week - 1` stands for `week`.
+    """
+    max_week: int
+    full_mask: int
+    known: int
+    resolved: int
+    week_blocks: Dict[int, int]
+    block_weeks: Dict[int, int]
+
+    def __init__(self, max_week: int):
+        self.max_week = max_week
+        self.full_mask = (1 << max_week) - 1
+        self.known = 0
+        self.resolved = 0
+        self.week_blocks = {}
+        self.block_weeks = {}
+
+    def __len__(self):
+        return len(self.block_weeks)
+
+    def __bool__(self):
+        return bool(self.block_weeks)
+
+    def add(self, e_block_id: int, week: int):
+        old_block = self.week_blocks.get(week)
+        if old_block is not None and old_block != e_block_id:
+            self.block_weeks.pop(old_block, None)
+        self.week_blocks[week] = e_block_id
+        self.block_weeks[e_block_id] = week
+        self.known |= 1 << (week - 1)
+
+    def resolve(self, week: int):
+        self.resolved |= 1 << (week - 1)
+
+    def clear(self):
+        self.known = 0
+        self.resolved = 0
+        self.week_blocks.clear()
+        self.block_weeks.clear()
+
+    def get_block(self, week: int) -> Optional[int]:
+        return self.week_blocks.get(week)
+
+    def get_week(self, e_block_id: int) -> Optional[int]:
+        return self.block_weeks.get(e_block_id)
+
+    def is_resolved(self, week: int) -> bool:
+        return bool(self.resolved >> (week - 1) & 1)
+
+    def next_unresolved(self) -> Optional[int]:
+        pending = ~self.resolved & self.full_mask
+        if pending:
+            return (pending & -pending).bit_length()
+        return None
+
+    def missing_weeks(self) -> List[int]:
+        return list(self.iter_weeks(~self.known & self.full_mask))
+
+    def unresolved_weeks(self) -> List[int]:
+        return list(self.iter_weeks(~self.resolved & self.full_mask))
+
+    @staticmethod
+    def iter_weeks(bits: int) -> Iterator[int]:
+        while bits:
+            low = bits & -bits
+            yield low.bit_length()
+            bits ^= low
@@ -91,6 +91,15 @@ class InvalidHistory(VError):
         return f'{self.e_block_id} | {self.n}'
 
 
+class InvalidArchive(VError):
+    def __init__(self, path: str, reason: str):
+        self.path: str = path
+        self.reason: str = reason
+
+    def __str__(self):
+        return f'Invalid season archive {self.path}: {self.reason}'
+
+
 class NoResultError(ValueError):
     def __init__(self):
         pass
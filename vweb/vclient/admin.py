@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
-from vweb.vclient.models import Token, User, Providers, ProviderConfig, ProviderInstalled, Tickets, LiveSession
+from vweb.vclient.models import Token, User, Providers, ProviderConfig, ProviderInstalled, Tickets, LiveSession, \
+    ArchivedTickets
 
 
 class CustomUserAdmin(UserAdmin):
@@ -18,4 +19,5 @@ admin.site.register(Providers)
 admin.site.register(ProviderConfig)
 admin.site.register(ProviderInstalled)
 admin.site.register(Tickets)
+admin.site.register(ArchivedTickets)
 admin.site.register(LiveSession)
\ No newline at end of file
@@ -272,14 +272,8 @@ class LiveSession(models.Model):
         app_label = "vclient"
 
 
-class Tickets(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="tickets",
-                             verbose_name="Tickets")
-    provider = models.ForeignKey(Providers, related_name="tickets", on_delete=models.CASCADE,
-                                 verbose_name="Provider")
-    live_session = models.ForeignKey(LiveSession, related_name="tickets", on_delete=models.CASCADE,
-                                     verbose_name="Live Session", blank=True)
-    ticket_key = models.AutoField(_("Ticket Key"), primary_key=True)
+class TicketColumns(models.Model):
+    """Columns shared by open and archived tickets"""
     time_created = models.DateTimeField(auto_now_add=True)
     demo = models.BooleanField(_("Demo"), default=True)
     resolved = models.BooleanField(_("Resolved"), default=False)
@@ -295,10 +289,48 @@ class Tickets(models.Model):
     payment_data = models.JSONField(_("Payment Data"), default=get_default_won_data)
     server_hash = models.CharField(_("Server Hash"), default='', max_length=10)
     ip = models.CharField(_("Ip"), default='', max_length=15)
+
+    class Meta:
+        abstract = True
+
+
+class Tickets(TicketColumns):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="tickets",
+                             verbose_name="Tickets")
+    provider = models.ForeignKey(Providers, related_name="tickets", on_delete=models.CASCADE,
+                                 verbose_name="Provider")
+    live_session = models.ForeignKey(LiveSession, related_name="tickets", on_delete=models.CASCADE,
+                                     verbose_name="Live Session", blank=True)
+    ticket_key = models.AutoField(_("Ticket Key"), primary_key=True)
+    objects = models.Manager()
+
+    class Meta:
+        app_label = "vclient"
+        indexes = [
+            # History pages, newest first
+            models.Index(fields=['user', '-ticket_key'], name='tickets_user_key_idx'),
+            # Open tickets of a provider account, resolved rows are left out
+            models.Index(fields=['user', 'provider'], condition=models.Q(resolved=False),
+                         name='tickets_user_open_idx'),
+        ]
+
+
+class ArchivedTickets(TicketColumns):
+    """Resolved tickets moved out of Tickets by `vtickets archive`, same keys and columns"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_tickets",
+                             verbose_name="Tickets")
+    provider = models.ForeignKey(Providers, related_name="archived_tickets", on_delete=models.CASCADE,
+                                 verbose_name="Provider")
+    live_session = models.ForeignKey(LiveSession, related_name="archived_tickets", on_delete=models.CASCADE,
+                                     verbose_name="Live Session", blank=True)
+    ticket_key = models.IntegerField(_("Ticket Key"), primary_key=True)
     objects = models.Manager()
 
     class Meta:
         app_label = "vclient"
+        indexes = [
+            models.Index(fields=['user', '-ticket_key'], name='archived_user_key_idx'),
+        ]
 
 
 class Pins(models.Model):